@@ -0,0 +1,442 @@
+"""
+Local fake GitLab REST server with synthetic repositories
+
+Serves the subset of the GitLab v4 API used by gitlab_statistics.py:
+authentication, user search, project lookup and listing, group project
+listing, branches, paginated commit lists (with and without stats), commit
+details and commit diffs.
+
+Commits are never stored. Every commit is derived from its position on a
+branch, and commit dates grow linearly with that position, so a
+``since``/``until`` filter maps to an index range with plain arithmetic.
+Datasets with millions of commits therefore need no memory and no
+generation time.
+
+Run standalone with ``python benchmarks/fake_gitlab.py --commits 100000``
+or use ``SyntheticDataset`` and ``start_server`` from another script.
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+PERIOD_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PERIOD_DAYS = 365
+FILE_NAMES = ("src/app/main.py", "src/lib/util.py", "tests/test_main.py", "docs/index.md",
+              "vendor/pkg/bundle.js", "package-lock.json")
+
+
+class SyntheticDataset:
+    """
+    Deterministic synthetic GitLab data
+
+    ``commits`` commits are spread over ``projects`` projects in group
+    ``bench``. Branch ``main`` of each project holds its share of commits.
+    Every other branch shares the older half of ``main`` and adds
+    ``branch_commits`` commits of its own. A further ``stale_branches``
+    branches per project point at commits from before the period, and
+    ``dormant_projects`` projects have had no activity for years.
+    """
+
+    def __init__(self, commits=1000, projects=4, branches=3, branch_commits=None, authors=20,
+                 stale_branches=0, dormant_projects=0):
+        self.projects = max(1, projects)
+        self.commits_per_project = max(1, commits // self.projects)
+        self.branches = max(1, branches)
+        if branch_commits is None:
+            branch_commits = max(1, self.commits_per_project // 10)
+        self.branch_commits = branch_commits
+        self.authors = [(f"Developer {index:03d}", f"dev{index:03d}@example.com") for index in range(authors)]
+        self.stale_branches = stale_branches
+        self.dormant_projects = dormant_projects
+        self.interval = PERIOD_DAYS * 86400 / max(self.commits_per_project, 1)
+
+    @property
+    def total_commits(self):
+        """Number of distinct commits in the active projects"""
+        return self.projects * (self.commits_per_project + (self.branches - 1) * self.branch_commits)
+
+    def tracked_users(self, count=5):
+        """Names of the first ``count`` authors"""
+        return [name for name, _ in self.authors[:count]]
+
+    def project_paths(self):
+        return [self.project(project_id)["path_with_namespace"] for project_id in range(1, self.projects + 1)]
+
+    # Users
+
+    def user(self, index):
+        """GitLab account of author ``index``; its username is neither the author name nor the email's local part"""
+        name, email = self.authors[index]
+        return {"id": index + 2, "username": f"user{index:03d}", "name": name, "state": "active",
+                "public_email": email}
+
+    def search_users(self, term):
+        """Accounts whose name, username or public email contains ``term``, like ``GET /users?search=``"""
+        term = (term or "").lower()
+        users = [self.user(index) for index in range(len(self.authors))]
+        return [user for user in users
+                if not term or any(term in user[key].lower() for key in ("name", "username", "public_email"))]
+
+    # Projects and branches
+
+    def project(self, project_id):
+        if not 1 <= project_id <= self.projects + self.dormant_projects:
+            return None
+        dormant = project_id > self.projects
+        name = f"dormant{project_id:04d}" if dormant else f"project{project_id:04d}"
+        namespace = "bench/archive" if dormant else "bench"
+        last_activity = datetime(2020, 1, 1, tzinfo=timezone.utc) if dormant else self.commit_date(self.commits_per_project - 1)
+        return {
+            "id": project_id,
+            "name": name,
+            "path": name,
+            "path_with_namespace": f"{namespace}/{name}",
+            "http_url_to_repo": f"http://localhost/{namespace}/{name}.git",
+            "last_activity_at": _iso(last_activity),
+            "default_branch": "main",
+        }
+
+    def find_project(self, key):
+        key = unquote(key)
+        if key.isdigit():
+            return self.project(int(key))
+        for project_id in range(1, self.projects + self.dormant_projects + 1):
+            project = self.project(project_id)
+            if project["path_with_namespace"] == key:
+                return project
+        return None
+
+    def branch_names(self, project_id):
+        if project_id > self.projects:
+            return ["main"]
+        names = ["main"] + [f"feature-{index}" for index in range(1, self.branches)]
+        return names + [f"stale/{index:05d}" for index in range(self.stale_branches)]
+
+    def branch(self, project_id, name):
+        length = self.branch_length(project_id, name)
+        if length is None:
+            return None
+        head = self.branch_commit(project_id, name, length - 1)
+        return {"name": name, "merged": False, "protected": name == "main", "default": name == "main",
+                "commit": {"id": head["id"], "short_id": head["short_id"],
+                           "committed_date": head["committed_date"], "title": head["title"]}}
+
+    def branch_length(self, project_id, name):
+        if project_id > self.projects:
+            return 1 if name == "main" else None
+        if name == "main":
+            return self.commits_per_project
+        match = re.fullmatch(r"feature-(\d+)", name)
+        if match and 1 <= int(match.group(1)) < self.branches:
+            return self.commits_per_project // 2 + self.branch_commits
+        match = re.fullmatch(r"stale/(\d+)", name)
+        if match and int(match.group(1)) < self.stale_branches:
+            return 1
+        return None
+
+    # Commits
+
+    def commit_date(self, position):
+        return PERIOD_START + timedelta(seconds=position * self.interval)
+
+    def branch_commit(self, project_id, name, position):
+        """Return the commit at ``position`` (0 = oldest) of a branch"""
+        if project_id > self.projects or name.startswith("stale/"):
+            return self.commit(project_id, 0xffff, 0)
+        if name == "main" or position < self.commits_per_project // 2:
+            return self.commit(project_id, 0, position)
+        tag = int(name.split("-")[1])
+        return self.commit(project_id, tag, position)
+
+    def commit(self, project_id, tag, position):
+        author_name, author_email = self.authors[(position * 7 + tag + project_id) % len(self.authors)]
+        if tag == 0xffff:
+            committed = datetime(2019, 6, 1, tzinfo=timezone.utc)
+        else:
+            committed = self.commit_date(position)
+        additions = 1 + (position * 37 + tag * 11) % 120
+        deletions = (position * 13 + tag) % 40
+        if position % 97 == 0:
+            # Occasional large vendored update
+            additions += 5000
+        sha = f"{project_id:06x}{tag:04x}{position:030x}"
+        date = _iso(committed)
+        return {
+            "id": sha,
+            "short_id": sha[:8],
+            "title": f"Change {position}",
+            "message": f"Change {position}",
+            "author_name": author_name,
+            "author_email": author_email,
+            "authored_date": date,
+            "committer_name": author_name,
+            "committer_email": author_email,
+            "committed_date": date,
+            "created_at": date,
+            "parent_ids": [],
+            "stats": {"additions": additions, "deletions": deletions, "total": additions + deletions},
+        }
+
+    def commit_by_sha(self, project_id, sha):
+        if not re.fullmatch(r"[0-9a-f]{40}", sha) or int(sha[:6], 16) != project_id:
+            return None
+        tag, position = int(sha[6:10], 16), int(sha[10:], 16)
+        if tag == 0xffff:
+            return self.commit(project_id, tag, 0) if position == 0 else None
+        if tag == 0:
+            return self.commit(project_id, tag, position) if position < self.commits_per_project else None
+        if not 1 <= tag < self.branches or not self.commits_per_project // 2 <= position < \
+                self.commits_per_project // 2 + self.branch_commits:
+            return None
+        return self.commit(project_id, tag, position)
+
+    def commit_range(self, project_id, name, since=None, until=None):
+        """Return the position range of a branch's commits inside [since, until]"""
+        length = self.branch_length(project_id, name)
+        if length is None:
+            return None
+        if project_id > self.projects or name.startswith("stale/"):
+            date = self.branch_commit(project_id, name, 0)["committed_date"]
+            inside = (since is None or date >= _iso(since)) and (until is None or date <= _iso(until))
+            return range(0, 1 if inside else 0)
+        first, last = 0, length
+        if since is not None:
+            first = max(first, math.ceil((since - PERIOD_START).total_seconds() / self.interval))
+        if until is not None:
+            last = min(last, math.floor((until - PERIOD_START).total_seconds() / self.interval) + 1)
+        return range(first, max(first, last))
+
+    def diff(self, commit):
+        """Per-file diff entries whose line counts add up to the commit stats"""
+        additions, deletions = commit["stats"]["additions"], commit["stats"]["deletions"]
+        position = int(commit["id"][10:], 16)
+        names = FILE_NAMES[:4] if additions < 5000 else FILE_NAMES
+        entries = []
+        for index, path in enumerate(names):
+            added = additions // len(names) + (additions % len(names) if index == 0 else 0)
+            deleted = deletions // len(names) + (deletions % len(names) if index == 0 else 0)
+            entry = {"old_path": path, "new_path": path, "a_mode": "100644", "b_mode": "100644",
+                     "new_file": False, "renamed_file": False, "deleted_file": False,
+                     "diff": "@@ -1 +1 @@\n" + "+line\n" * added + "-line\n" * deleted}
+            if path == "package-lock.json" and position % 2 == 0:
+                entry.update(diff="", too_large=True, collapsed=True)
+            entries.append(entry)
+        return entries
+
+
+def _iso(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%S.000+00:00")
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class RequestStats:
+    """Thread-safe request counter of the fake server"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+            return self.count
+
+
+def make_handler(dataset, latency=0.0, rate_limit=None, stats=None):
+    """
+    Build the request handler class for a dataset
+
+    Args:
+        dataset (SyntheticDataset): Data to serve
+        latency (float): Seconds to wait before answering each request
+        rate_limit (int): Optional per-minute limit advertised with
+            ``RateLimit-*`` headers; exceeding it returns 429
+        stats (RequestStats): Optional shared request counter
+    """
+    stats = stats or RequestStats()
+    window = {"start": time.time(), "used": 0}
+    window_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def rate_limit_headers(self):
+            if not rate_limit:
+                return {}, False
+            with window_lock:
+                now = time.time()
+                if now - window["start"] >= 60:
+                    window.update(start=now, used=0)
+                window["used"] += 1
+                remaining = rate_limit - window["used"]
+                reset = int(window["start"] + 60)
+            headers = {"RateLimit-Limit": str(rate_limit), "RateLimit-Remaining": str(max(0, remaining)),
+                       "RateLimit-Reset": str(reset)}
+            if remaining < 0:
+                headers["Retry-After"] = str(max(1, reset - int(now)))
+            return headers, remaining < 0
+
+        def paginate(self, total, item_at, query, path, headers):
+            page = max(1, int(query.get("page", ["1"])[0]))
+            per_page = min(100, max(1, int(query.get("per_page", ["20"])[0])))
+            start = (page - 1) * per_page
+            items = [item_at(index) for index in range(start, min(total, start + per_page))]
+            headers.update({"X-Page": str(page), "X-Per-Page": str(per_page),
+                            "X-Total": str(total), "X-Total-Pages": str(max(1, math.ceil(total / per_page)))})
+            if start + per_page < total:
+                next_query = {key: values[0] for key, values in query.items()}
+                next_query["page"] = page + 1
+                headers["X-Next-Page"] = str(page + 1)
+                headers["Link"] = f'<http://{self.headers["Host"]}{path}?{urlencode(next_query)}>; rel="next"'
+            self.send_json(200, items, headers)
+
+        def do_GET(self):
+            stats.add()
+            if latency:
+                time.sleep(latency)
+            headers, limited = self.rate_limit_headers()
+            if limited:
+                return self.send_json(429, {"message": "429 Too Many Requests"}, headers)
+            raw_path = urlsplit(self.path).path
+            query = parse_qs(urlsplit(self.path).query)
+            path = raw_path[len("/api/v4"):] if raw_path.startswith("/api/v4") else raw_path
+
+            if path == "/user":
+                return self.send_json(200, {"id": 1, "username": "bench", "name": "Benchmark"}, headers)
+            if path == "/users":
+                users = dataset.search_users(query.get("search", [None])[0])
+                return self.paginate(len(users), lambda index: users[index], query, raw_path, headers)
+            if path == "/projects":
+                term = query.get("search", [None])[0]
+                ids = [project_id for project_id in range(1, dataset.projects + dataset.dormant_projects + 1)
+                       if not term or term in dataset.project(project_id)["path_with_namespace"]]
+                return self.paginate(len(ids), lambda index: dataset.project(ids[index]), query, raw_path, headers)
+
+            match = re.fullmatch(r"/groups/([^/]+)/projects", path)
+            if match:
+                group = unquote(match.group(1))
+                if group not in ("bench", "bench/archive"):
+                    return self.send_json(404, {"message": "404 Group Not Found"}, headers)
+                subgroups = query.get("include_subgroups", ["false"])[0].lower() == "true"
+                ids = [project_id for project_id in range(1, dataset.projects + dataset.dormant_projects + 1)
+                       if dataset.project(project_id)["path_with_namespace"].startswith(group + "/")
+                       and (subgroups or dataset.project(project_id)["path_with_namespace"].rsplit("/", 1)[0] == group)]
+                if query.get("order_by", [None])[0] == "last_activity_at":
+                    ids.sort(key=lambda project_id: dataset.project(project_id)["last_activity_at"],
+                             reverse=query.get("sort", ["desc"])[0] == "desc")
+                return self.paginate(len(ids), lambda index: dataset.project(ids[index]), query, raw_path, headers)
+
+            match = re.fullmatch(r"/projects/([^/]+)(/.*)?", path)
+            if not match:
+                return self.send_json(404, {"message": "404 Not Found"}, headers)
+            project = dataset.find_project(match.group(1))
+            if project is None:
+                return self.send_json(404, {"message": "404 Project Not Found"}, headers)
+            project_id, rest = project["id"], match.group(2) or ""
+
+            if rest == "":
+                return self.send_json(200, project, headers)
+            if rest == "/repository/branches":
+                names = dataset.branch_names(project_id)
+                if query.get("sort", [None])[0] == "updated_desc":
+                    names = sorted(names, key=lambda name: dataset.branch(project_id, name)["commit"]["committed_date"],
+                                   reverse=True)
+                return self.paginate(len(names), lambda index: dataset.branch(project_id, names[index]),
+                                     query, raw_path, headers)
+            if rest == "/repository/commits":
+                name = query.get("ref_name", ["main"])[0]
+                positions = dataset.commit_range(project_id, name, _parse_time(query.get("since", [None])[0]),
+                                                 _parse_time(query.get("until", [None])[0]))
+                if positions is None:
+                    return self.send_json(404, {"message": "404 Branch Not Found"}, headers)
+                with_stats = query.get("with_stats", ["false"])[0].lower() == "true"
+
+                def commit_at(index):
+                    # Newest first, like GitLab
+                    commit = dataset.branch_commit(project_id, name, positions[len(positions) - 1 - index])
+                    if not with_stats:
+                        commit = {key: value for key, value in commit.items() if key != "stats"}
+                    return commit
+                return self.paginate(len(positions), commit_at, query, raw_path, headers)
+
+            match = re.fullmatch(r"/repository/commits/([^/]+)(/diff)?", rest)
+            if match:
+                commit = dataset.commit_by_sha(project_id, match.group(1))
+                if commit is None:
+                    return self.send_json(404, {"message": "404 Commit Not Found"}, headers)
+                if match.group(2):
+                    entries = dataset.diff(commit)
+                    return self.paginate(len(entries), lambda index: entries[index], query, raw_path, headers)
+                return self.send_json(200, commit, headers)
+            return self.send_json(404, {"message": "404 Not Found"}, headers)
+
+    Handler.stats = stats
+    return Handler
+
+
+def start_server(dataset, port=0, latency=0.0, rate_limit=None):
+    """
+    Start the fake server in a background thread
+
+    Returns:
+        tuple: (server, url, stats) - call ``server.shutdown()`` to stop it
+    """
+    handler = make_handler(dataset, latency, rate_limit)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", handler.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 GitLab 服务器 (合成数据)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--commits", type=int, default=1000, help="提交总数")
+    parser.add_argument("--projects", type=int, default=4, help="项目数")
+    parser.add_argument("--branches", type=int, default=3, help="每个项目的活跃分支数")
+    parser.add_argument("--stale-branches", type=int, default=0, help="每个项目的过期分支数")
+    parser.add_argument("--dormant-projects", type=int, default=0, help="长期不活跃的项目数")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的模拟延迟 (毫秒)")
+    parser.add_argument("--rate-limit", type=int, help="每分钟请求上限 (返回 RateLimit-* 响应头)")
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(args.commits, args.projects, args.branches, stale_branches=args.stale_branches,
+                               dormant_projects=args.dormant_projects)
+    server, url, _ = start_server(dataset, args.port, args.latency_ms / 1000, args.rate_limit)
+    print(f"模拟 GitLab 已启动: {url}")
+    print(f"仓库: {', '.join(dataset.project_paths())}")
+    print(f"用户: {', '.join(dataset.tracked_users())}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
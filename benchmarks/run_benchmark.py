@@ -0,0 +1,175 @@
+"""
+End-to-end benchmark of gitlab_statistics.py against the local fake GitLab
+
+For every dataset size a synthetic GitLab is started in this process, and
+the tool runs as a subprocess in batch mode with a fresh cache directory
+and ``--metrics-file``. The report includes wall time, throughput (scanned
+commits per second), the number of API requests, the peak resident memory
+of the tool process and its phase timings.
+
+Examples:
+
+    python benchmarks/run_benchmark.py --sizes 10,1000,100000
+    python benchmarks/run_benchmark.py --sizes 1000000 --latency-ms 20 --warm
+    python benchmarks/run_benchmark.py --output after.json --baseline before.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_gitlab import SyntheticDataset, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "gitlab_statistics.py")
+
+CONFIG_TEMPLATE = '''GITLAB_URL = {url!r}
+GITLAB_TOKEN = "benchmark-token"
+DEFAULT_START_DATE = "2024-01-01"
+DEFAULT_END_DATE = "2025-01-01"
+DEFAULT_REPOSITORIES = {repositories!r}
+DEFAULT_USERS = {users!r}
+DEFAULT_MAX_BRANCHES = {max_branches}
+DEFAULT_FUZZY_MATCH = True
+CACHE_DIR = {cache_dir!r}
+MAX_CONCURRENCY = {max_concurrency}
+USER_NAME_MAPPINGS = {{}}
+'''
+
+
+def run_tool(work_dir, extra_args):
+    """
+    Run the tool once and measure it
+
+    Returns:
+        dict: exit code, wall seconds, peak RSS in MB and the metrics summary
+    """
+    metrics_file = os.path.join(work_dir, "metrics.json")
+    if os.path.exists(metrics_file):
+        os.remove(metrics_file)
+    command = [sys.executable, SCRIPT, "--batch", "--output", os.path.join(work_dir, "report.xlsx"),
+               "--metrics-file", metrics_file] + list(extra_args)
+    env = dict(os.environ, PYTHONPATH=work_dir)
+    started = time.perf_counter()
+    with open(os.path.join(work_dir, "output.log"), "ab") as log:
+        process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    metrics = {}
+    if os.path.exists(metrics_file):
+        with open(metrics_file, encoding="utf-8") as f:
+            metrics = json.load(f)
+    return {"exit_code": process.returncode, "wall_seconds": round(wall, 3),
+            "peak_rss_mb": round(peak_mb, 1), "metrics": metrics}
+
+
+def benchmark_size(size, args):
+    """Benchmark one dataset size (cold run, and warm run with --warm)"""
+    dataset = SyntheticDataset(size, projects=min(args.projects, size), branches=args.branches,
+                               stale_branches=args.stale_branches)
+    server, url, server_stats = start_server(dataset, latency=args.latency_ms / 1000)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="gitlab-bench-") as work_dir:
+            with open(os.path.join(work_dir, "config.py"), "w", encoding="utf-8") as f:
+                f.write(CONFIG_TEMPLATE.format(
+                    url=url,
+                    repositories=",".join(dataset.project_paths()),
+                    users=",".join(dataset.tracked_users()),
+                    max_branches=args.branches,
+                    cache_dir=os.path.join(work_dir, "cache"),
+                    max_concurrency=args.max_concurrency,
+                ))
+            runs = ["cold", "warm"] if args.warm else ["cold"]
+            for run in runs:
+                requests_before = server_stats.count
+                result = run_tool(work_dir, args.tool_args)
+                counters = result["metrics"].get("counters", {})
+                scanned = counters.get("commits_scanned", 0)
+                result.update({
+                    "size": size,
+                    "run": run,
+                    "distinct_commits": dataset.total_commits,
+                    "commits_scanned": scanned,
+                    "requests": server_stats.count - requests_before,
+                    "commits_per_second": round(scanned / result["wall_seconds"], 1) if result["wall_seconds"] else None,
+                    "phases": result["metrics"].get("phases", {}),
+                })
+                del result["metrics"]
+                results.append(result)
+                if result["exit_code"] not in (0, 3):
+                    with open(os.path.join(work_dir, "output.log"), encoding="utf-8", errors="replace") as log:
+                        print(log.read()[-2000:])
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def print_report(results, baseline=None):
+    baseline_index = {(r["size"], r["run"]): r for r in baseline or []}
+    header = f"{'提交数':>10} {'运行':>5} {'退出码':>5} {'请求数':>8} {'耗时(s)':>9} {'提交/秒':>10} {'峰值内存(MB)':>12}"
+    if baseline_index:
+        header += f" {'耗时对比':>9}"
+    print(header)
+    for result in results:
+        line = (f"{result['size']:>10} {result['run']:>5} {result['exit_code']:>5} {result['requests']:>8} "
+                f"{result['wall_seconds']:>9.2f} {result['commits_per_second'] or 0:>10.0f} {result['peak_rss_mb']:>12.1f}")
+        previous = baseline_index.get((result["size"], result["run"]))
+        if previous:
+            line += f" {result['wall_seconds'] / previous['wall_seconds']:>8.2f}x"
+        print(line)
+    print("\n各阶段耗时 (秒):")
+    for result in results:
+        phases = ", ".join(f"{name} {seconds:.2f}" for name, seconds in result["phases"].items())
+        print(f"  {result['size']:>10} {result['run']:>5}: {phases}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GitLab 代码统计工具的离线性能基准测试")
+    parser.add_argument("--sizes", default="10,1000,100000",
+                        help="数据集规模 (每个项目主分支提交数之和)，用逗号分隔 (默认: 10,1000,100000)")
+    parser.add_argument("--projects", type=int, default=4, help="项目数 (默认: 4)")
+    parser.add_argument("--branches", type=int, default=3, help="每个项目统计的分支数 (默认: 3)")
+    parser.add_argument("--stale-branches", type=int, default=0, help="每个项目的过期分支数 (默认: 0)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="模拟的每个请求的延迟，单位毫秒 (默认: 0)")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="工具的最大并发请求数 (默认: 8)")
+    parser.add_argument("--warm", action="store_true", help="冷启动后再用同一缓存目录运行一次")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前 --output 写入的结果对比耗时")
+    parser.add_argument("tool_args", nargs="*", help="传给 gitlab_statistics.py 的其他参数 (放在 -- 之后)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = []
+    for size in sizes:
+        print(f"正在测试 {size} 个提交...", flush=True)
+        results.extend(benchmark_size(size, args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print()
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "arguments": vars(args), "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+    return 0 if all(result["exit_code"] in (0, 3) for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
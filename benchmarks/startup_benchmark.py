@@ -0,0 +1,105 @@
+"""
+Start-up time benchmark of gitlab_statistics.py
+
+Measures the wall time of short invocations that never reach GitLab:
+
+- ``--help``
+- ``--batch`` with an invalid date (argument validation, exit code 2)
+- ``import gitlab_statistics`` as a library
+
+Each case runs ``--runs`` times in a fresh interpreter against a temporary
+config.py; the median and the fastest run are reported. ``--baseline REV``
+runs the same cases against the script of an earlier git revision, e.g.
+
+    python benchmarks/startup_benchmark.py --baseline HEAD~1
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "gitlab_statistics.py")
+
+CONFIG = '''GITLAB_URL = "http://127.0.0.1:9"
+GITLAB_TOKEN = "benchmark-token"
+'''
+
+IMPORT_CODE = '''import importlib.util, sys
+spec = importlib.util.spec_from_file_location("gitlab_statistics", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+'''
+
+
+def cases(script):
+    return [
+        ("--help", [sys.executable, script, "--help"]),
+        ("参数错误", [sys.executable, script, "--batch", "--start-date", "bad"]),
+        ("import", [sys.executable, "-c", IMPORT_CODE, script]),
+    ]
+
+
+def measure(command, work_dir, runs):
+    """Return the wall times in seconds of ``runs`` executions"""
+    env = dict(os.environ, PYTHONPATH=work_dir)
+    # Let the untimed first run cache the bytecode of imported modules
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def extract_revision(revision, work_dir):
+    """Write gitlab_statistics.py of a git revision into ``work_dir``"""
+    source = subprocess.run(["git", "show", f"{revision}:gitlab_statistics.py"], cwd=ROOT,
+                            capture_output=True, check=True).stdout
+    path = os.path.join(work_dir, f"gitlab_statistics_{revision.replace('/', '_').replace('~', '_')}.py")
+    with open(path, "wb") as f:
+        f.write(source)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GitLab 代码统计工具的启动时间基准测试")
+    parser.add_argument("--runs", type=int, default=10, help="每个场景的运行次数 (默认: 10)")
+    parser.add_argument("--baseline", metavar="REV", help="同时测试该 git 版本的脚本并对比")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="gitlab-startup-") as work_dir:
+        with open(os.path.join(work_dir, "config.py"), "w", encoding="utf-8") as f:
+            f.write(CONFIG)
+        scripts = [("当前版本", SCRIPT)]
+        if args.baseline:
+            scripts.insert(0, (args.baseline, extract_revision(args.baseline, work_dir)))
+
+        results = {}
+        for label, script in scripts:
+            for name, command in cases(script):
+                # One untimed run warms the file system cache
+                measure(command, work_dir, 1)
+                results[(label, name)] = measure(command, work_dir, args.runs)
+
+    print(f"{'版本':<12} {'场景':<10} {'中位数(ms)':>10} {'最快(ms)':>10}")
+    for (label, name), times in results.items():
+        print(f"{label:<12} {name:<10} {statistics.median(times) * 1000:>10.0f} {min(times) * 1000:>10.0f}")
+    if args.baseline:
+        print()
+        for name, _ in cases(SCRIPT):
+            before = statistics.median(results[(args.baseline, name)])
+            after = statistics.median(results[("当前版本", name)])
+            print(f"{name}: {before * 1000:.0f} ms -> {after * 1000:.0f} ms ({before / after:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
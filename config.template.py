@@ -3,6 +3,21 @@
 GITLAB_URL = "http://your-gitlab-server.com"
 GITLAB_TOKEN = "your_access_token_here"
 
+# 额外的访问令牌 (令牌池)。设置后按项目分片，在多个进程中并行统计，每个进程使用一个令牌，
+# 统计速度不再受单个令牌的限流额度限制。也可以通过环境变量 GITLAB_TOKENS (逗号分隔) 设置
+GITLAB_TOKENS = []
+
+# 其他需要一起统计的 GitLab 实例，报告中这些实例的仓库路径前会加上 "名称:"
+# 每个实例可以设置 tokens (令牌列表) 或 token_env (保存逗号分隔令牌的环境变量名)，例如:
+# GITLAB_INSTANCES = [
+#     {"name": "cn", "url": "https://gitlab-cn.example.com", "token_env": "GITLAB_CN_TOKENS",
+#      "repositories": "team/app,team/lib", "groups": "platform"},
+# ]
+GITLAB_INSTANCES = []
+
+# 分片统计时每个令牌对应的分片数，分片越多各进程的负载越均衡
+SHARDS_PER_TOKEN = 4
+
 # 默认参数配置
 # 日期范围
 DEFAULT_START_DATE = "2025-01-01"
@@ -11,6 +26,9 @@ DEFAULT_END_DATE = "2025-04-26"
 # 仓库路径，使用逗号分隔的字符串
 DEFAULT_REPOSITORIES = "group/project1,group/project2"
 
+# 组路径，使用逗号分隔的字符串；会统计组及其子组下在开始日期之后有活动的所有项目
+DEFAULT_GROUPS = ""
+
 # 用户名，使用逗号分隔的字符串
 DEFAULT_USERS = "user1,user2,user3"
 
@@ -29,10 +47,119 @@ DEFAULT_OUTPUT_FILE = "gitlab_statistics.xlsx"
 # 1或0: 不做任何缩放
 SCALE_FACTOR = 1
 
+# 并发请求数: 仓库解析、分支列表和提交获取在线程池中并行执行的最大线程数
+MAX_CONCURRENCY = 8
+
+# 同时获取提交的分支数上限，默认等于 MAX_CONCURRENCY；提交按页交给统计线程，
+# 每个分支最多预先缓存 BRANCH_READ_AHEAD_PAGES 页 (每页 100 个提交)，
+# 调小这两个值可降低内存占用，但会减少并行获取的分支数
+MAX_BRANCHES_IN_FLIGHT = None
+BRANCH_READ_AHEAD_PAGES = 256
+
+# HTTP 请求设置
+# 请求超时时间 (秒)
+HTTP_TIMEOUT = 60
+# 遇到 429 或 5xx 响应、连接错误时的最大重试次数
+HTTP_MAX_RETRIES = 5
+# 重试退避的基础等待时间和最大等待时间 (秒)，实际等待时间带随机抖动
+# 服务器返回的 Retry-After 也不会超过最大等待时间
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 30
+
+# 提交列表结果中缺少统计信息时，每批单独获取提交详情的最大数量
+DETAIL_FETCH_BATCH_SIZE = 20
+
+# 本地缓存目录，提交统计信息会缓存在该目录下的 SQLite 数据库中
+CACHE_DIR = ".cache"
+
+# 是否默认启用增量模式: 仅获取各分支上次统计之后的新提交，更早的提交从缓存读取
+INCREMENTAL = False
+
+# 是否在统计前列出所有可用仓库 (大型 GitLab 实例上会很慢，默认关闭)
+LIST_ALL_PROJECTS = False
+
+# 本地仓库索引 (仓库完整路径 -> ID) 的有效期，单位为秒
+PROJECT_INDEX_TTL = 86400
+
+# 各仓库活跃分支列表的缓存有效期，单位为秒，0 表示不缓存
+BRANCH_CACHE_TTL = 600
+
+# 服务模式 (--serve) 的监听地址和端口
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+
+# GitLab Webhook 的 Secret token，服务模式只接受 X-Gitlab-Token 与之相同的推送事件
+# 未设置时拒绝所有 Webhook 请求 (除非使用 --insecure-webhooks 启动)
+# 也可以通过环境变量 GITLAB_WEBHOOK_SECRET 设置
+WEBHOOK_SECRET = None
+
+# 是否在统计过程中写入检查点 (CACHE_DIR/checkpoints)，中断后可以使用 --resume 继续统计，默认关闭
+# (也可以使用 --checkpoint 开启；--resume 总会写入检查点)
+# 检查点记录每个提交，文件大小与提交数据相当，统计时间约增加 15%；同时使用 --parquet-dir 时
+# 每个分支的 Parquet 文件先写入临时文件，分支完成后再改名
+CHECKPOINT_ENABLED = False
+
+# 默认统计后端
+# "api": 通过 GitLab REST API 获取提交统计
+# "git": 将仓库拉取到本地缓存目录 (CACHE_DIR/repos) 后解析 git log --numstat，适合大型仓库
+DEFAULT_BACKEND = "api"
+
+# 按文件统计: 获取提交的 diff，按路径汇总变更行数 (API 后端会额外请求每个提交的 diff，结果缓存在 CACHE_DIR 中)
+FILE_STATS = False
+
+# 文件过滤规则 (glob 模式，* 可以匹配 /)，设置后自动启用按文件统计
+# FILE_INCLUDE_PATTERNS 为空表示统计所有文件
+FILE_INCLUDE_PATTERNS = []
+FILE_EXCLUDE_PATTERNS = []  # 例如 ["vendor/**", "*.lock", "package-lock.json"]
+
+# 超大提交阈值: 变更行数 (增加+删除，按文件统计时为过滤后的行数) 超过该值的提交不计入统计，None 表示不限制
+MAX_COMMIT_LINES = None
+
+# 路径统计表按目录汇总的层级，0 表示按文件汇总
+PATH_DEPTH = 2
+
+# 按文件统计时每批获取 diff 的提交数，限制同时在处理中的 diff 数量
+DIFF_FETCH_BATCH_SIZE = 50
+
+# 分时段统计粒度: "day" / "week" / "month"，None 表示不输出分时段统计表
+DEFAULT_TIME_BUCKET = None
+
+# 是否额外输出用户 x 仓库的变更行数透视表 ("仓库透视" 工作表)
+REPO_PIVOT = False
+
+# Excel 写入方式: "pandas" 使用 pandas.ExcelWriter；"streaming" 使用 openpyxl 只写模式逐行写入，
+# 不为每个单元格创建对象，写入路径统计等大表时更快、内存更少 (报表数据仍在内存中汇总)
+EXCEL_ENGINE = "pandas"
+
+# 运行指标 (JSON) 输出文件，None 表示不输出
+METRICS_FILE = None
+
+# 原始提交记录的 Parquet 导出目录 (需要安装 pyarrow)，None 表示不导出
+# 数据集按项目和月份分区: <目录>/project=<仓库路径>/month=<YYYY-MM>/*.parquet
+PARQUET_OUTPUT_DIR = None
+
+# Parquet 导出时每个文件块缓存的最大行数，数值越小内存占用越低
+PARQUET_CHUNK_SIZE = 50000
+
+# 是否使用作者身份表 (CACHE_DIR/identities.sqlite3) 按提交作者邮箱匹配用户，默认关闭
+# 开启后每个用户的 GitLab 账号查询一次 (IDENTITY_TTL 内不再查询)，并写入身份表；
+# 邮箱用户名部分与用户名相同的作者也会被匹配。使用 --no-cache 时不使用身份表
+IDENTITY_RESOLUTION = False
+
+# GitLab 账号查询结果的有效期 (秒)，过期后重新查询
+IDENTITY_TTL = 7 * 24 * 3600
+
 # 用户名映射表，用于匹配提交作者名与用户名
 # 格式: "提交作者名": "映射的用户名"
 USER_NAME_MAPPINGS = {
     "author1": "user1",
     "author2": "user2",
     # 可以添加更多映射关系
-} 
\ No newline at end of file
+} 
+
+# 邮箱映射表，用于按提交作者邮箱匹配用户名 (优先级低于作者身份表、用户名映射和精确匹配，高于模糊匹配)
+# 格式: "提交作者邮箱": "映射的用户名"
+USER_EMAIL_MAPPINGS = {
+    "author1@example.com": "user1",
+    # 可以添加更多映射关系
+}
@@ -1,24 +1,102 @@
-import gitlab
-import pandas as pd
-from datetime import datetime
+import argparse
+import base64
+import csv
+import importlib
+from datetime import datetime, timezone
 import os
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import fnmatch
+import hashlib
+import hmac
 import re
 import sys
 import math
+import queue
+import random
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import itertools
+import json
+import urllib.parse
+import cProfile
+from types import SimpleNamespace
 
-# 尝试导入配置文件
-try:
-    import config
+class _LazyModule:
+    """
+    Stand-in for a heavy module that is imported on first attribute access
+
+    pandas, numpy, python-gitlab and requests (with urllib3) take most of the
+    start-up time, yet ``--help``, argument errors and the phases before the
+    first request or report do not need them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+gitlab = _LazyModule("gitlab")
+requests = _LazyModule("requests")
+gitlab_objects = _LazyModule("gitlab.v4.objects")
+np = _LazyModule("numpy")
+pd = _LazyModule("pandas")
+
+class ConfigError(Exception):
+    """The configuration file is missing or incomplete"""
+
+# Active configuration, set by load_config(). Until then every optional
+# setting falls back to its default, so the module can be imported as a
+# library without a config.py.
+config = SimpleNamespace()
+
+def load_config(source='config', required=True):
+    """
+    Load the configuration and make it the active one
+
+    Args:
+        source: Name of the configuration module to import (default
+            ``config``, i.e. config.py on the import path), or an object
+            with the settings as attributes
+        required: If False, a missing module leaves every setting at its
+            default and GITLAB_URL/GITLAB_TOKEN may be absent (they are
+            then expected from the command line and the environment)
+
+    Returns:
+        The configuration module or object
+
+    Raises:
+        ConfigError: If ``required`` and the module cannot be found or lacks
+            GITLAB_URL or GITLAB_TOKEN
+    """
+    global config
+    if isinstance(source, str):
+        try:
+            module = importlib.import_module(source)
+        except ImportError as e:
+            if e.name != source:
+                raise
+            if not required:
+                config = SimpleNamespace()
+                return config
+            raise ConfigError("找不到配置文件 (config.py)\n"
+                              "请创建配置文件，可以复制 config.template.py 为 config.py 并填写相应参数")
+    else:
+        module = source
     # 检查配置文件是否包含必要的参数
-    if not hasattr(config, 'GITLAB_URL') or not hasattr(config, 'GITLAB_TOKEN'):
-        print("错误: 配置文件中缺少 GITLAB_URL 或 GITLAB_TOKEN 参数")
-        print("请确保您已正确设置 config.py 文件")
-        sys.exit(1)
-except ImportError:
-    print("错误: 找不到配置文件 (config.py)")
-    print("请创建配置文件，可以复制 config.template.py 为 config.py 并填写相应参数")
-    sys.exit(1)
+    if required and (not hasattr(module, 'GITLAB_URL') or not hasattr(module, 'GITLAB_TOKEN')):
+        raise ConfigError("配置文件中缺少 GITLAB_URL 或 GITLAB_TOKEN 参数\n请确保您已正确设置 config.py 文件")
+    config = module
+    return module
 
 def apply_scale_factor(value, scale_factor):
     """
@@ -66,7 +144,12 @@ def get_user_input():
     print("例如: 'group/subgroup/project-name'")
     print("如果不确定完整路径，可以输入项目的部分名称，系统会自动搜索匹配的项目")
     repos_input = input(f"仓库路径 (用逗号分隔, 默认: {default_repos}): ") or default_repos
-    repo_paths = [r.strip() for r in repos_input.split(',')]
+    repo_paths = [r.strip() for r in repos_input.split(',') if r.strip()]
+    
+    # 组路径
+    default_groups = getattr(config, 'DEFAULT_GROUPS', "")
+    groups_input = input(f"组路径 (统计组及其子组下所有活跃项目，用逗号分隔, 默认: {default_groups or '无'}): ") or default_groups
+    group_paths = [g.strip() for g in groups_input.split(',') if g.strip()]
     
     # 用户名
     default_users = getattr(config, 'DEFAULT_USERS', "")
@@ -108,6 +191,7 @@ def get_user_input():
         "start_date": start_date,
         "end_date": end_date,
         "repo_paths": repo_paths,
+        "group_paths": group_paths,
         "user_names": user_names,
         "fuzzy_match": fuzzy_match,
         "max_branches": max_branches,
@@ -115,16 +199,25 @@ def get_user_input():
         "scale_factor": scale_factor
     }
 
-def list_available_projects(gl, search_term=None):
+def list_available_projects(gl, search_term=None, project_index=None):
     """
     List available projects in GitLab
     
     Args:
         gl (gitlab.Gitlab): GitLab connection
         search_term (str): Optional search term
+        project_index (ProjectIndex): Optional local project index to query
+            instead of the GitLab API
     """
     try:
-        if search_term:
+        if project_index is not None:
+            project_index.ensure()
+            projects = project_index.search(search_term) if search_term else project_index.projects
+            if search_term:
+                print(f"\n===== 搜索 '{search_term}' 的结果 =====")
+            else:
+                print("\n===== 可用的仓库列表 =====")
+        elif search_term:
             projects = gl.projects.list(search=search_term)
             print(f"\n===== 搜索 '{search_term}' 的结果 =====")
         else:
@@ -150,10 +243,148 @@ def list_available_projects(gl, search_term=None):
     except Exception as e:
         print(f"列出项目时出错: {e}")
 
+def _clean_name(name):
+    """Normalise a name for fuzzy comparison: drop spaces and lower-case it"""
+    return name.replace(' ', '').lower()
+
+class AuthorMatcher:
+    """
+    Match commit authors to the tracked user names
+
+    All lookup tables are built once per run, and every result is memoised,
+    so each distinct author is matched only once across all repositories.
+    The precedence is:
+
+    1. ``identities`` (keyed by lower-cased author email, see
+       ``IdentityStore``); an email that belongs to a user who is not
+       tracked matches nobody, so the rules below cannot mis-attribute it
+    2. ``USER_NAME_MAPPINGS`` (keyed by lower-cased author name)
+    3. Exact author name
+    4. ``USER_EMAIL_MAPPINGS`` (keyed by lower-cased author email), then,
+       with ``email_local_part`` (set when identity resolution is on), an
+       email local part equal to a normalised user name
+    5. Fuzzy match (if enabled): the first user in ``user_names`` order whose
+       normalised name contains or is contained in the author name, or
+       shares its first character (both at least two characters long)
+
+    Rules 2, 3 and 5 are the ones of the original linear scan.
+    """
+
+    def __init__(self, user_names, fuzzy_match=True, name_mappings=None, email_mappings=None, identities=None,
+                 email_local_part=False):
+        self.user_names = list(user_names)
+        self.fuzzy_match = fuzzy_match
+        self.email_local_part = email_local_part
+        self.name_mappings = name_mappings if name_mappings is not None else getattr(config, 'USER_NAME_MAPPINGS', {})
+        if email_mappings is None:
+            email_mappings = getattr(config, 'USER_EMAIL_MAPPINGS', {})
+        self.email_mappings = {email.lower(): user for email, user in email_mappings.items()}
+        self.identities = identities or {}
+        self._user_set = set(self.user_names)
+        # Author name -> matched user, for the summary printed after a run
+        self.author_matches = {}
+        # Lower-cased email -> (author name, user, rule), for IdentityStore.record_matches
+        self.identity_matches = {}
+        self._memo = {}
+
+        # Every index maps to the position of the first user it belongs to
+        self._by_clean_name = {}
+        self._by_substring = {}
+        self._by_first_char = {}
+        for index, user_name in enumerate(self.user_names):
+            clean_user = _clean_name(user_name)
+            self._by_clean_name.setdefault(clean_user, index)
+            for start in range(len(clean_user) + 1):
+                for end in range(start, len(clean_user) + 1):
+                    self._by_substring.setdefault(clean_user[start:end], index)
+            if len(clean_user) >= 2:
+                self._by_first_char.setdefault(clean_user[0], index)
+        self._user_name_lengths = sorted(set(len(name) for name in self._by_clean_name))
+
+    def match(self, author_name, author_email=None):
+        """
+        Return the tracked user an author belongs to, or None
+
+        Args:
+            author_name (str): Author name from commit
+            author_email (str): Optional author email from commit
+        """
+        key = (author_name, author_email)
+        if key not in self._memo:
+            matched_user, rule = self._match(author_name, author_email)
+            self._memo[key] = matched_user
+            if matched_user:
+                self.author_matches.setdefault(author_name, matched_user)
+            if author_email and rule != "identity":
+                self.identity_matches.setdefault(author_email.lower(), (author_name, matched_user, rule))
+        return self._memo[key]
+
+    def _match(self, author_name, author_email):
+        """Return (matched user or None, name of the rule that decided it)"""
+        email = author_email.lower() if author_email else None
+        if email in self.identities:
+            user = self.identities[email]
+            return (user if user in self._user_set else None), "identity"
+
+        # 检查是否在配置的映射中
+        mapped_name = self.name_mappings.get(author_name.lower())
+        if mapped_name in self._user_set:
+            return mapped_name, "name_mapping"
+
+        # Exact match
+        if author_name in self._user_set:
+            return author_name, "name"
+
+        # Email match
+        if email:
+            mapped_name = self.email_mappings.get(email)
+            if mapped_name in self._user_set:
+                return mapped_name, "email_mapping"
+            if self.email_local_part:
+                index = self._by_clean_name.get(email.split('@')[0])
+                if index is not None:
+                    return self.user_names[index], "email"
+
+        if self.fuzzy_match:
+            matched_user = self._fuzzy_match(_clean_name(author_name))
+            if matched_user:
+                return matched_user, "fuzzy"
+        return None, "unmatched"
+
+    def _fuzzy_match(self, clean_author):
+        candidates = []
+
+        # Case 1: Author name contains user name
+        for length in self._user_name_lengths:
+            for start in range(len(clean_author) - length + 1):
+                index = self._by_clean_name.get(clean_author[start:start + length])
+                if index is not None:
+                    candidates.append(index)
+
+        # Case 2: User name contains author name
+        index = self._by_substring.get(clean_author)
+        if index is not None:
+            candidates.append(index)
+
+        # Case 3: First character match for Chinese names
+        if len(clean_author) >= 2:
+            index = self._by_first_char.get(clean_author[0])
+            if index is not None:
+                candidates.append(index)
+
+        return self.user_names[min(candidates)] if candidates else None
+
+# (user names, fuzzy_match) -> (config the matcher was built from, AuthorMatcher)
+_name_matchers = {}
+
 def is_name_match(author_name, user_names, fuzzy_match=True):
     """
     Check if author name matches any of the user names
     
+    The ``AuthorMatcher`` of each user list is built once and reused, so
+    repeated calls cost a memoised lookup; it is rebuilt when another
+    configuration is loaded.
+    
     Args:
         author_name (str): Author name from commit
         user_names (list): List of user names to match
@@ -162,447 +393,4824 @@ def is_name_match(author_name, user_names, fuzzy_match=True):
     Returns:
         tuple: (bool, str) - (is_match, matched_user_name)
     """
-    # 使用配置文件中的用户名映射
-    name_mappings = getattr(config, 'USER_NAME_MAPPINGS', {})
-    
-    # 检查是否在配置的映射中
-    if author_name.lower() in name_mappings:
-        mapped_name = name_mappings[author_name.lower()]
-        if mapped_name in user_names:
-            return True, mapped_name
-    
-    # Exact match
-    if author_name in user_names:
-        return True, author_name
-    
-    # Fuzzy match
-    if fuzzy_match:
-        # Try if author name contains user name or user name contains author name
-        for user_name in user_names:
-            # Remove spaces for comparison
-            clean_author = author_name.replace(' ', '').lower()
-            clean_user = user_name.replace(' ', '').lower()
-            
-            # Case 1: Author name contains user name
-            if clean_user in clean_author:
-                return True, user_name
-                
-            # Case 2: User name contains author name
-            if clean_author in clean_user:
-                return True, user_name
-                
-            # Case 3: First character match for Chinese names
-            if len(clean_user) >= 2 and len(clean_author) >= 2:
-                # For Chinese names, often only the last character (given name) is different
-                if clean_user[0] == clean_author[0]:  # First character match
-                    return True, user_name
-    
-    return False, None
+    key = (tuple(user_names), fuzzy_match)
+    built_for, matcher = _name_matchers.get(key, (None, None))
+    if matcher is None or built_for is not config:
+        matcher = AuthorMatcher(user_names, fuzzy_match)
+        _name_matchers[key] = (config, matcher)
+    matched_user = matcher.match(author_name)
+    return matched_user is not None, matched_user
 
-def get_commit_statistics(gitlab_url, gitlab_token, repo_paths, user_names, start_date, end_date, fuzzy_match=True, max_branches=5):
+class ApiRequestCounter:
     """
-    Get commit statistics from GitLab repositories
-    
-    Args:
-        gitlab_url (str): GitLab server URL
-        gitlab_token (str): GitLab access token
-        repo_paths (list): List of repository paths to analyze
-        user_names (list): List of user names to track
-        start_date (str): Start date in format 'YYYY-MM-DD'
-        end_date (str): End date in format 'YYYY-MM-DD'
-        fuzzy_match (bool): Whether to use fuzzy matching for user names
-        max_branches (int): Maximum number of active branches to analyze
-    
-    Returns:
-        dict: Statistics per user and repository
+    Count the HTTP requests issued through a GitLab session
+
+    Registered as a ``requests`` response hook, so every API call made by
+    python-gitlab (including pagination requests) is counted. The counter is
+    shared by all worker threads of a run.
     """
-    # Connect to GitLab
-    try:
-        gl = gitlab.Gitlab(gitlab_url, private_token=gitlab_token)
-        gl.auth()
-        print(f"成功连接到 GitLab，当前用户: {gl.user.name}")
-    except Exception as e:
-        print(f"连接 GitLab 失败: {e}")
-        return None
-    
-    # Convert dates to ISO format for GitLab API
-    try:
-        start_date_iso = datetime.strptime(start_date, '%Y-%m-%d').isoformat()
-        end_date_iso = datetime.strptime(end_date, '%Y-%m-%d').isoformat()
-    except ValueError as e:
-        print(f"日期格式错误: {e}")
-        return None
-    
-    # List all available projects to help users find correct paths
-    print("\n正在获取可用的仓库列表，这可能需要一些时间...")
-    list_available_projects(gl)
-    
-    # Ask if user wants to continue or update repo paths
-    update_repos = input("\n要更新仓库路径吗? (y/n，默认: n): ").lower() == 'y'
-    if update_repos:
-        repos_input = input("请输入新的仓库路径 (用逗号分隔): ")
-        repo_paths = [r.strip() for r in repos_input.split(',')]
-        print(f"已更新仓库路径: {repo_paths}")
-    
-    # Initialize statistics dictionary
-    stats = {user: {"total_commits": 0, "total_additions": 0, "total_deletions": 0, "repos": {}} for user in user_names}
-    
-    # Store name mappings for consistent author identification
-    name_mappings = {}
-    
-    # Process each repository
-    for repo_path in repo_paths:
-        print(f"\n处理仓库: {repo_path}")
-        
-        # Find the project by path
-        try:
-            # Remove leading slash if present
-            if repo_path.startswith('/'):
-                repo_path = repo_path[1:]
-                
-            # Try exact match first
-            project = None
-            try:
-                # Try to get the project directly by path
-                project = gl.projects.get(repo_path)
-                print(f"已找到仓库: {project.path_with_namespace} (ID: {project.id})")
-            except gitlab.exceptions.GitlabGetError:
-                # If direct get fails, search for it
-                print(f"直接路径未找到，正在搜索 '{repo_path}'...")
-                projects = gl.projects.list(search=repo_path)
-                
-                if not projects:
-                    print(f"未找到匹配 '{repo_path}' 的仓库")
-                    
-                    # Try to search more broadly if nothing is found
-                    parts = repo_path.split('/')
-                    if len(parts) > 1:
-                        project_name = parts[-1]
-                        print(f"尝试搜索项目名 '{project_name}'...")
-                        projects = gl.projects.list(search=project_name)
-                
-                if projects:
-                    print(f"搜索结果:")
-                    for i, p in enumerate(projects[:10]):
-                        print(f"{i+1}. {p.path_with_namespace} (ID: {p.id})")
-                    
-                    if len(projects) == 1:
-                        project = projects[0]
-                        print(f"自动选择唯一匹配的项目: {project.path_with_namespace}")
-                    else:
-                        try:
-                            choice = input("请选择项目编号 (输入数字或直接回车跳过): ")
-                            if choice.strip():
-                                idx = int(choice) - 1
-                                if 0 <= idx < len(projects):
-                                    project = projects[idx]
-                                    print(f"已选择: {project.path_with_namespace}")
-                                else:
-                                    print("选择无效，跳过此仓库")
-                            else:
-                                print("未选择，跳过此仓库")
-                        except (ValueError, IndexError):
-                            print("选择无效，跳过此仓库")
-            
-            if not project:
-                print(f"跳过仓库: {repo_path}")
-                continue
-            
-            # Update repo_path to the actual path_with_namespace
-            repo_path = project.path_with_namespace
-                
-        except Exception as e:
-            print(f"查找仓库 {repo_path} 时出错: {e}")
-            continue
-        
-        # Get branches sorted by last activity
-        try:
-            branches = project.branches.list(all=True)
-            # Sort branches by last commit date if available
-            active_branches = sorted(branches, key=lambda b: b.commit.get('committed_date', ''), reverse=True)
-            
-            # Limit to max_branches
-            active_branches = active_branches[:max_branches]
-            branch_names = [b.name for b in active_branches]
-            print(f"分析 {len(branch_names)} 个分支: {', '.join(branch_names)}")
-            
-        except Exception as e:
-            print(f"获取仓库 {repo_path} 的分支时出错: {e}")
-            continue
-        
-        # Initialize repo stats for each user
-        for user in user_names:
-            stats[user]["repos"][repo_path] = {
-                "commits": 0,
-                "additions": 0,
-                "deletions": 0,
-                "branches": {}
-            }
-        
-        # Process each branch
-        for branch in active_branches:
-            branch_name = branch.name
-            print(f"分析分支: {branch_name}")
-            
-            # Initialize branch stats for each user
-            for user in user_names:
-                stats[user]["repos"][repo_path]["branches"][branch_name] = {
-                    "commits": 0,
-                    "additions": 0,
-                    "deletions": 0
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, response, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+        return response
+
+class RunMetrics:
+    """
+    Structured timing and request metrics of one run
+
+    - Wall time per phase, measured in the main thread with ``phase()``
+    - Request count, error count and a latency histogram per API endpoint;
+      registered as a ``requests`` response hook like ``ApiRequestCounter``
+      and safe to call from worker threads (retried attempts count
+      separately)
+    - Cache hit rates and plain counters
+
+    ``summary()`` returns everything as a JSON-serialisable dict.
+    """
+
+    # Upper bounds of the latency histogram buckets, in milliseconds
+    LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    ENDPOINT_PATTERNS = (
+        (re.compile(r'/projects/[^/]+'), '/projects/:id'),
+        (re.compile(r'/groups/[^/]+'), '/groups/:id'),
+        (re.compile(r'/commits/[0-9a-fA-F]{7,40}'), '/commits/:sha'),
+    )
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.parameters = {}
+        self.phases = {}
+        self.counters = {}
+        self.caches = {}
+        self.endpoints = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    class _Phase:
+        def __init__(self, metrics, name):
+            self.metrics = metrics
+            self.name = name
+
+        def __enter__(self):
+            self.start = time.perf_counter()
+            return self
+
+        def __exit__(self, *exc_info):
+            self.metrics.add_phase_time(self.name, time.perf_counter() - self.start)
+            return False
+
+    def phase(self, name):
+        """Context manager adding the elapsed wall time to phase ``name``"""
+        return self._Phase(self, name)
+
+    def add_phase_time(self, name, seconds):
+        """Add ``seconds`` of wall time to phase ``name``"""
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        """Add ``value`` to counter ``name``"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_cache(self, name, hits, misses):
+        """Record the hits and misses of a cache"""
+        with self._lock:
+            self.caches[name] = {"hits": hits, "misses": misses}
+
+    @classmethod
+    def endpoint(cls, url):
+        """Normalise a request URL to an endpoint template"""
+        path = urllib.parse.urlsplit(url).path
+        path = path.split('/api/v4', 1)[-1] or '/'
+        for pattern, replacement in cls.ENDPOINT_PATTERNS:
+            path = pattern.sub(replacement, path)
+        return path
+
+    def __call__(self, response, *args, **kwargs):
+        endpoint = f"{response.request.method} {self.endpoint(response.request.url)}"
+        latency_ms = response.elapsed.total_seconds() * 1000
+        bucket = next((i for i, bound in enumerate(self.LATENCY_BUCKETS_MS) if latency_ms <= bound),
+                      len(self.LATENCY_BUCKETS_MS))
+        with self._lock:
+            entry = self.endpoints.get(endpoint)
+            if entry is None:
+                entry = self.endpoints[endpoint] = {
+                    "requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "histogram": [0] * (len(self.LATENCY_BUCKETS_MS) + 1)
                 }
-            
-            # Get commits in date range
-            try:
-                commits = project.commits.list(
-                    ref_name=branch_name,
-                    since=start_date_iso,
-                    until=end_date_iso,
-                    all=True
-                )
-                
-                print(f"  找到 {len(commits)} 个提交")
-                
-                # Process each commit
-                unique_authors = set()
-                user_commit_count = {user: 0 for user in user_names}
-                
-                for commit in commits:
-                    # Get commit details
-                    try:
-                        commit_detail = project.commits.get(commit.id)
-                        author_name = commit_detail.author_name
-                        unique_authors.add(author_name)
-                        
-                        # Use cached mapping if available
-                        if author_name in name_mappings:
-                            matched_user = name_mappings[author_name]
-                        else:
-                            # Check if this is a user we're tracking
-                            is_match, matched_user = is_name_match(author_name, user_names, fuzzy_match)
-                            # Cache the result
-                            name_mappings[author_name] = matched_user
-                        
-                        if matched_user:
-                            user_commit_count[matched_user] += 1
-                            # Get commit stats
-                            stats[matched_user]["total_commits"] += 1
-                            stats[matched_user]["repos"][repo_path]["commits"] += 1
-                            stats[matched_user]["repos"][repo_path]["branches"][branch_name]["commits"] += 1
-                            
-                            # Get line changes
-                            additions = commit_detail.stats.get('additions', 0)
-                            deletions = commit_detail.stats.get('deletions', 0)
-                            
-                            # Update statistics
-                            stats[matched_user]["total_additions"] += additions
-                            stats[matched_user]["total_deletions"] += deletions
-                            stats[matched_user]["repos"][repo_path]["additions"] += additions
-                            stats[matched_user]["repos"][repo_path]["deletions"] += deletions
-                            stats[matched_user]["repos"][repo_path]["branches"][branch_name]["additions"] += additions
-                            stats[matched_user]["repos"][repo_path]["branches"][branch_name]["deletions"] += deletions
-                            
-                    except Exception as e:
-                        print(f"处理提交 {commit.id} 时出错: {e}")
-                        continue
-                
-                # Print summary of authors found
-                if unique_authors:
-                    print(f"  提交作者: {', '.join(unique_authors)}")
-                    
-                    # Print matched users
-                    matched_users = [user for user in user_names if user_commit_count[user] > 0]
-                    if matched_users:
-                        print(f"  匹配的用户: {', '.join(matched_users)}")
-                        for user in matched_users:
-                            print(f"    - {user}: {user_commit_count[user]} 个提交")
-                    else:
-                        print(f"  警告: 没有找到匹配的用户。请检查用户名是否正确。")
-                        print(f"  您指定的用户: {', '.join(user_names)}")
-                        print(f"  实际的提交作者: {', '.join(unique_authors)}")
-                        if fuzzy_match:
-                            print("  提示: 已启用模糊匹配，但仍未找到匹配。尝试调整用户名以匹配提交者名称。")
-                else:
-                    print("  没有找到任何提交作者信息")
-                        
-            except Exception as e:
-                print(f"获取分支 {branch_name} 的提交时出错: {e}")
-                continue
-    
-    # Print name mappings if fuzzy matching was used
-    if fuzzy_match and name_mappings:
-        mapped_authors = [author for author, user in name_mappings.items() if user]
-        if mapped_authors:
-            print("\n===== 用户名匹配结果 =====")
-            for author in mapped_authors:
-                print(f"提交作者 '{author}' -> 匹配到用户 '{name_mappings[author]}'")
-    
-    return stats
+            entry["requests"] += 1
+            entry["errors"] += response.status_code >= 400
+            entry["total_ms"] += latency_ms
+            entry["max_ms"] = max(entry["max_ms"], latency_ms)
+            entry["histogram"][bucket] += 1
+        return response
+
+    def summary(self, **extra):
+        """
+        Return the run summary
+
+        Args:
+            **extra: Additional top-level fields (run parameters, exit code)
+        """
+        labels = [f"<={bound}ms" for bound in self.LATENCY_BUCKETS_MS] + [f">{self.LATENCY_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            endpoints = {
+                name: {
+                    "requests": entry["requests"],
+                    "errors": entry["errors"],
+                    "mean_ms": round(entry["total_ms"] / entry["requests"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "histogram": dict(zip(labels, entry["histogram"])),
+                }
+                for name, entry in sorted(self.endpoints.items())
+            }
+            caches = {
+                name: dict(values, hit_rate=round(values["hits"] / (values["hits"] + values["misses"]), 4)
+                           if values["hits"] + values["misses"] else None)
+                for name, values in self.caches.items()
+            }
+            return {
+                "started_at": self.started_at.isoformat(),
+                "wall_seconds": round(time.perf_counter() - self._start, 3),
+                **extra,
+                "parameters": dict(self.parameters),
+                "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                "counters": dict(self.counters),
+                "api": {
+                    "requests": sum(entry["requests"] for entry in endpoints.values()),
+                    "endpoints": endpoints,
+                },
+                "caches": caches,
+            }
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def merge(self, other):
+        """
+        Add the phases, counters, cache hits and endpoint latencies of another
+        run, e.g. a shard scanned in a worker process
+        """
+        with self._lock:
+            for name, seconds in other.phases.items():
+                self.phases[name] = self.phases.get(name, 0.0) + seconds
+            for name, value in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, values in other.caches.items():
+                totals = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+                totals["hits"] += values["hits"]
+                totals["misses"] += values["misses"]
+            for name, entry in other.endpoints.items():
+                totals = self.endpoints.get(name)
+                if totals is None:
+                    self.endpoints[name] = dict(entry, histogram=list(entry["histogram"]))
+                    continue
+                totals["requests"] += entry["requests"]
+                totals["errors"] += entry["errors"]
+                totals["total_ms"] += entry["total_ms"]
+                totals["max_ms"] = max(totals["max_ms"], entry["max_ms"])
+                totals["histogram"] = [a + b for a, b in zip(totals["histogram"], entry["histogram"])]
 
-def export_to_excel(stats, output_file="gitlab_statistics.xlsx", scale_factor=1):
+    def write(self, path, **extra):
+        """Write the summary as JSON"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(**extra), f, ensure_ascii=False, indent=2)
+
+class _RateLimiting:
     """
-    Export statistics to Excel
-    
-    Args:
-        stats (dict): Statistics dictionary
-        output_file (str): Output Excel file name
-        scale_factor (float): Scale factor for statistics
+    requests session tuned for parallel GitLab scans (``RateLimitedSession``)
+
+    - A keep-alive connection pool sized for the worker threads
+    - Adaptive throttling driven by GitLab's ``RateLimit-*`` headers: when the
+      remaining budget of the current window drops below
+      ``slow_down_ratio`` of the limit, requests are spread evenly over the
+      rest of the window, and all threads pause until the reset time when it
+      is exhausted
+    - Retries with jittered exponential backoff on 429 and 5xx responses and
+      on connection errors, honouring ``Retry-After`` up to ``backoff_max``;
+      only idempotent requests are retried
+
+    The pacing state is shared by every thread using the session. The class
+    is mixed into ``requests.Session`` on first use, see
+    ``_rate_limited_session_class``, so importing this module does not import
+    requests.
     """
-    # Create user summary dataframe
-    user_data = []
-    for user, user_stats in stats.items():
-        # Apply scaling to all numeric values
-        total_commits = apply_scale_factor(user_stats["total_commits"], scale_factor)
-        total_additions = apply_scale_factor(user_stats["total_additions"], scale_factor)
-        total_deletions = apply_scale_factor(user_stats["total_deletions"], scale_factor)
-        total_changes = apply_scale_factor(total_additions + total_deletions, scale_factor)
-        
-        user_data.append({
-            "用户": user,
-            "总提交次数": total_commits,
-            "总增加行数": total_additions,
-            "总删除行数": total_deletions,
-            "总变更行数": total_changes
-        })
-    
-    user_df = pd.DataFrame(user_data)
-    
-    # Create repository details dataframe
-    repo_data = []
-    for user, user_stats in stats.items():
-        for repo, repo_stats in user_stats["repos"].items():
-            if repo_stats["commits"] > 0:  # Only include repos with commits
-                # Apply scaling to all numeric values
-                commits = apply_scale_factor(repo_stats["commits"], scale_factor)
-                additions = apply_scale_factor(repo_stats["additions"], scale_factor)
-                deletions = apply_scale_factor(repo_stats["deletions"], scale_factor)
-                changes = apply_scale_factor(additions + deletions, scale_factor)
-                
-                repo_data.append({
-                    "用户": user,
-                    "仓库": repo,
-                    "提交次数": commits,
-                    "增加行数": additions,
-                    "删除行数": deletions,
-                    "变更行数": changes
-                })
-    
-    repo_df = pd.DataFrame(repo_data)
-    
-    # Create branch details dataframe
-    branch_data = []
-    for user, user_stats in stats.items():
-        for repo, repo_stats in user_stats["repos"].items():
-            for branch, branch_stats in repo_stats["branches"].items():
-                if branch_stats["commits"] > 0:  # Only include branches with commits
-                    # Apply scaling to all numeric values
-                    commits = apply_scale_factor(branch_stats["commits"], scale_factor)
-                    additions = apply_scale_factor(branch_stats["additions"], scale_factor)
-                    deletions = apply_scale_factor(branch_stats["deletions"], scale_factor)
-                    changes = apply_scale_factor(additions + deletions, scale_factor)
-                    
-                    branch_data.append({
-                        "用户": user,
-                        "仓库": repo,
-                        "分支": branch,
-                        "提交次数": commits,
-                        "增加行数": additions,
-                        "删除行数": deletions,
-                        "变更行数": changes
-                    })
-    
-    branch_df = pd.DataFrame(branch_data)
-    
-    try:
-        # Export to Excel
-        with pd.ExcelWriter(output_file) as writer:
-            user_df.to_excel(writer, sheet_name="用户汇总", index=False)
-            repo_df.to_excel(writer, sheet_name="仓库详情", index=False)
-            branch_df.to_excel(writer, sheet_name="分支详情", index=False)
-        
-        if scale_factor != 1:
-            print(f"数据已按比例调整 (缩放因子: {scale_factor})")
-        print(f"统计数据已导出到 {output_file}")
-        return output_file
-    except Exception as e:
-        print(f"导出到Excel时出错: {e}")
-        # Try to save as CSV if Excel export fails
+
+    RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+    RETRY_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+    def __init__(self, pool_size=10, max_retries=5, backoff_base=0.5, backoff_max=30.0, slow_down_ratio=0.1):
+        super().__init__()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.slow_down_ratio = slow_down_ratio
+        # Statistics reported at the end of a run
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._interval = 0.0
+
+    def _wait_for_slot(self):
+        """Reserve the next request slot and sleep until it is due"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+            delay = slot - now
+            self.throttled_seconds += delay
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pause_all(self, seconds):
+        """Make every thread wait ``seconds`` before its next request"""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    def _update_rate_limit(self, response):
+        headers = response.headers
         try:
-            user_df.to_csv("用户汇总.csv", index=False, encoding='utf-8-sig')
-            repo_df.to_csv("仓库详情.csv", index=False, encoding='utf-8-sig')
-            branch_df.to_csv("分支详情.csv", index=False, encoding='utf-8-sig')
-            print("由于Excel导出失败，已将数据保存为CSV文件")
-            return "CSV files"
-        except Exception as csv_e:
-            print(f"保存为CSV时出错: {csv_e}")
+            remaining = int(headers['RateLimit-Remaining'])
+            limit = int(headers['RateLimit-Limit'])
+            reset_in = max(0.0, float(headers['RateLimit-Reset']) - time.time())
+        except (KeyError, ValueError):
+            return
+        with self._lock:
+            if remaining <= 0:
+                self._next_slot = max(self._next_slot, time.monotonic() + reset_in)
+                self._interval = 0.0
+            elif remaining <= limit * self.slow_down_ratio:
+                self._interval = reset_in / remaining
+            else:
+                self._interval = 0.0
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return max(0.0, float(response.headers['Retry-After']))
+        except (KeyError, ValueError):
             return None
 
-def validate_statistics(stats):
+    def request(self, method, url, *args, **kwargs):
+        retryable = method.upper() in self.RETRY_METHODS
+        attempt = 0
+        while True:
+            self._wait_for_slot()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._update_rate_limit(response)
+                if (response.status_code not in self.RETRY_STATUSES or not retryable
+                        or attempt >= self.max_retries):
+                    return response
+                retry_after = self._retry_after(response)
+                # A proxy may ask for minutes or hours; never stall every thread longer than backoff_max
+                delay = min(retry_after, self.backoff_max) if retry_after is not None else self._backoff(attempt)
+                if response.status_code == 429:
+                    self._pause_all(delay)
+                response.close()
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+
+# RateLimitedSession, created by _rate_limited_session_class
+_session_class = None
+
+def _rate_limited_session_class():
+    """Return ``RateLimitedSession``, a ``requests.Session`` with ``_RateLimiting`` mixed in"""
+    global _session_class
+    if _session_class is None:
+        _session_class = type('RateLimitedSession', (_RateLimiting, requests.Session),
+                              {'__module__': __name__, '__doc__': _RateLimiting.__doc__})
+    return _session_class
+
+def __getattr__(name):
+    # The session class only exists once requests is imported
+    if name == 'RateLimitedSession':
+        return _rate_limited_session_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_gitlab_session(pool_size):
+    """Create the HTTP session used for GitLab API requests (settings from config)"""
+    return _rate_limited_session_class()(
+        pool_size=pool_size,
+        max_retries=getattr(config, 'HTTP_MAX_RETRIES', 5),
+        backoff_base=getattr(config, 'HTTP_BACKOFF_BASE', 0.5),
+        backoff_max=getattr(config, 'HTTP_BACKOFF_MAX', 30.0)
+    )
+
+def _commit_stats(commit):
     """
-    Validate the generated statistics
-    
+    Extract (additions, deletions) from a commit object
+
     Args:
-        stats (dict): Statistics dictionary
-    
+        commit: python-gitlab commit object (list or detail response)
+
     Returns:
-        bool: True if valid, False otherwise
+        tuple: (additions, deletions), or None if the response has no stats
     """
-    if not stats:
-        return False
-    
-    # Check if any commits were found
-    has_commits = False
-    for user, user_stats in stats.items():
-        if user_stats["total_commits"] > 0:
-            has_commits = True
-            break
-    
-    if not has_commits:
-        print("\n未找到所指定用户的提交数据。可能的原因:")
-        print("1. 日期范围内没有这些用户的提交")
-        print("2. 用户名与提交时使用的名称不完全匹配")
-        print("3. 所选仓库或分支不包含这些用户的提交")
-    
-    return has_commits
+    commit_stats = commit.attributes.get('stats')
+    if not commit_stats:
+        return None
+    return commit_stats.get('additions', 0), commit_stats.get('deletions', 0)
 
-def main():
-    # Get user input
-    params = get_user_input()
-    
-    # Print summary of parameters
-    print("\n=== 统计参数 ===")
-    print(f"日期范围: {params['start_date']} 至 {params['end_date']}")
-    print(f"仓库: {', '.join(params['repo_paths'])}")
-    print(f"用户: {', '.join(params['user_names'])}")
-    print(f"用户名模糊匹配: {'启用' if params['fuzzy_match'] else '禁用'}")
-    print(f"最大分支数: {params['max_branches']}")
-    print(f"数据缩放因子: {params['scale_factor']}")
-    
-    # Get statistics
-    stats = get_commit_statistics(
-        params['gitlab_url'],
-        params['gitlab_token'],
-        params['repo_paths'],
-        params['user_names'],
-        params['start_date'],
-        params['end_date'],
-        params['fuzzy_match'],
-        params['max_branches']
+# Compact per-commit record kept by the scan instead of python-gitlab objects
+CommitRecord = namedtuple(
+    'CommitRecord',
+    ['id', 'author_name', 'author_email', 'committed_date', 'additions', 'deletions']
+)
+
+def _commit_record(commit, additions, deletions):
+    """Build the compact commit record used by the statistics code"""
+    attributes = commit.attributes
+    return CommitRecord(
+        commit.id,
+        attributes.get('author_name', ''),
+        attributes.get('author_email', ''),
+        attributes.get('committed_date', ''),
+        additions,
+        deletions
     )
-    
-    # Validate statistics
-    if validate_statistics(stats):
-        # Export to Excel
-        output_file = export_to_excel(stats, params['output_file'], params['scale_factor'])
-        if output_file:
-            print(f"\n分析完成! 结果已保存到 {output_file}")
-    else:
-        print("\n未找到符合条件的提交数据，请检查参数是否正确。")
 
-if __name__ == "__main__":
-    try:
-        main()
+def _fetch_commit_detail(project, commit_id):
+    """Fetch a single commit and return it as a commit record"""
+    commit_detail = project.commits.get(commit_id)
+    additions, deletions = _commit_stats(commit_detail) or (0, 0)
+    return _commit_record(commit_detail, additions, deletions)
+
+def _parse_commit_date(value):
+    """
+    Parse a GitLab ISO timestamp into an aware datetime
+
+    Timestamps without an offset (such as the report's start and end dates)
+    are taken as UTC. Returns None for empty or malformed values.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def get_cache_dir():
+    """Return the local cache directory (CACHE_DIR in config, default '.cache')"""
+    return getattr(config, 'CACHE_DIR', '.cache')
+
+class WatermarkTracker:
+    """Newest ``committed_date`` and its SHA among the commits seen so far"""
+
+    def __init__(self, watermark=None):
+        self.last_date = self.last_sha = self._last_key = None
+        if watermark and watermark["last_committed_date"]:
+            self.last_date, self.last_sha = watermark["last_committed_date"], watermark["last_sha"]
+            self._last_key = _parse_commit_date(self.last_date)
+
+    def update(self, records):
+        for record in records:
+            key = _parse_commit_date(record.committed_date)
+            if key is not None and (self._last_key is None or key > self._last_key):
+                self._last_key, self.last_date, self.last_sha = key, record.committed_date, record.id
+
+class CommitCache:
+    """
+    Persistent SQLite cache of commit statistics keyed by (project_id, sha)
+
+    A commit's author and line statistics never change once it is committed,
+    so records fetched by earlier runs are reused instead of being requested
+    again. One connection is shared by all worker threads behind a lock.
+
+    The cache also remembers which commits were found on each scanned branch
+    and a per-branch high-water mark (the newest ``committed_date`` and its
+    SHA), which incremental runs use to request only newer commits.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'commits.sqlite3')
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.file_hits = 0
+        self.file_misses = 0
+        self.branch_list_hits = 0
+        self.branch_list_misses = 0
+        self._lock = threading.Lock()
+        # Shard worker processes share the cache file, so writers wait for each other
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS commits ("
+            "project_id INTEGER NOT NULL, sha TEXT NOT NULL, "
+            "author_name TEXT, author_email TEXT, committed_date TEXT, "
+            "additions INTEGER NOT NULL, deletions INTEGER NOT NULL, "
+            "PRIMARY KEY (project_id, sha))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS branch_commits ("
+            "project_id INTEGER NOT NULL, branch TEXT NOT NULL, sha TEXT NOT NULL, "
+            "PRIMARY KEY (project_id, branch, sha))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            "project_id INTEGER NOT NULL, branch TEXT NOT NULL, "
+            "scanned_since TEXT NOT NULL, last_committed_date TEXT, last_sha TEXT, "
+            "PRIMARY KEY (project_id, branch))"
+        )
+        # Per-file changes of commits whose diff has been fetched; commits
+        # without files only appear in commit_file_scans
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS commit_file_scans ("
+            "project_id INTEGER NOT NULL, sha TEXT NOT NULL, "
+            "PRIMARY KEY (project_id, sha))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS commit_files ("
+            "project_id INTEGER NOT NULL, sha TEXT NOT NULL, path TEXT NOT NULL, "
+            "additions INTEGER, deletions INTEGER, "
+            "PRIMARY KEY (project_id, sha, path))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS branch_scan_pending ("
+            "scan_id INTEGER NOT NULL, sha TEXT NOT NULL, "
+            "PRIMARY KEY (scan_id, sha))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS branch_lists ("
+            "project_id INTEGER NOT NULL, selection TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, branches TEXT NOT NULL, "
+            "PRIMARY KEY (project_id, selection))"
+        )
+        self._conn.commit()
+
+    def get_many(self, project_id, shas):
+        """
+        Look up cached commit records
+
+        Args:
+            project_id (int): GitLab project id
+            shas (list): Commit SHAs to look up
+
+        Returns:
+            dict: SHA -> commit record for every cached commit
+        """
+        found = {}
+        shas = list(shas)
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(shas), 500):
+                chunk = shas[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    "SELECT sha, author_name, author_email, committed_date, additions, deletions "
+                    f"FROM commits WHERE project_id = ? AND sha IN ({placeholders})",
+                    [project_id] + chunk
+                )
+                for row in rows:
+                    found[row[0]] = CommitRecord(*row)
+            self.hits += len(found)
+            self.misses += len(shas) - len(found)
+        return found
+
+    def get(self, project_id, sha):
+        """Look up one commit record without counting it as a cache hit or miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha, author_name, author_email, committed_date, additions, deletions "
+                "FROM commits WHERE project_id = ? AND sha = ?",
+                (project_id, sha)
+            ).fetchone()
+        return CommitRecord(*row) if row else None
+
+    def put_many(self, project_id, records):
+        """Store commit records of a project"""
+        rows = [(project_id,) + tuple(record) for record in records]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO commits "
+                "(project_id, sha, author_name, author_email, committed_date, additions, deletions) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def get_files_many(self, project_id, shas):
+        """
+        Look up the cached per-file changes of commits
+
+        Returns:
+            dict: SHA -> list of (path, additions, deletions) for every
+            commit whose diff has been cached
+        """
+        found = {}
+        shas = list(shas)
+        with self._lock:
+            for start in range(0, len(shas), 500):
+                chunk = shas[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT sha FROM commit_file_scans WHERE project_id = ? AND sha IN ({placeholders})",
+                    [project_id] + chunk
+                )
+                for (sha,) in rows:
+                    found[sha] = []
+                rows = self._conn.execute(
+                    "SELECT sha, path, additions, deletions "
+                    f"FROM commit_files WHERE project_id = ? AND sha IN ({placeholders})",
+                    [project_id] + chunk
+                )
+                for sha, path, additions, deletions in rows:
+                    if sha in found:
+                        found[sha].append((path, additions, deletions))
+            self.file_hits += len(found)
+            self.file_misses += len(shas) - len(found)
+        return found
+
+    def put_files(self, project_id, files_by_commit):
+        """Store the per-file changes of commits (SHA -> list of (path, additions, deletions))"""
+        if not files_by_commit:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO commit_files (project_id, sha, path, additions, deletions) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(project_id, sha) + tuple(entry) for sha, files in files_by_commit.items() for entry in files]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO commit_file_scans (project_id, sha) VALUES (?, ?)",
+                [(project_id, sha) for sha in files_by_commit]
+            )
+            self._conn.commit()
+
+    def get_branch_list(self, project_id, selection, ttl):
+        """
+        Return a cached branch selection younger than ``ttl`` seconds
+
+        Returns:
+            list: (name, commit) pairs, or None if missing or expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at, branches FROM branch_lists WHERE project_id = ? AND selection = ?",
+                (project_id, selection)
+            ).fetchone()
+            if row is None or time.time() - row[0] > ttl:
+                self.branch_list_misses += 1
+                return None
+            self.branch_list_hits += 1
+        return json.loads(row[1])
+
+    def put_branch_list(self, project_id, selection, branches):
+        """Store a branch selection as (name, commit) pairs"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO branch_lists (project_id, selection, fetched_at, branches) "
+                "VALUES (?, ?, ?, ?)",
+                (project_id, selection, time.time(), json.dumps(branches, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def get_watermark(self, project_id, branch):
+        """
+        Return the high-water mark of a branch
+
+        Returns:
+            dict: scanned_since, last_committed_date and last_sha, or None if
+            the branch has never been scanned completely
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT scanned_since, last_committed_date, last_sha FROM watermarks "
+                "WHERE project_id = ? AND branch = ?",
+                (project_id, branch)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"scanned_since": row[0], "last_committed_date": row[1], "last_sha": row[2]}
+
+    def get_branch_records(self, project_id, branch):
+        """Return the cached records of every commit seen on a branch"""
+        return [record for page in self.iter_branch_records(project_id, branch) for record in page]
+
+    def iter_branch_records(self, project_id, branch, page_size=1000):
+        """
+        Yield the cached records of a branch's commits in pages of at most
+        ``page_size``, ordered by SHA, without loading the whole branch
+        """
+        last_sha = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT c.sha, c.author_name, c.author_email, c.committed_date, c.additions, c.deletions "
+                    "FROM branch_commits b JOIN commits c ON c.project_id = b.project_id AND c.sha = b.sha "
+                    "WHERE b.project_id = ? AND b.branch = ? AND b.sha > ? ORDER BY b.sha LIMIT ?",
+                    (project_id, branch, last_sha, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [CommitRecord(*row) for row in rows]
+            last_sha = rows[-1][0]
+
+    def begin_branch_scan(self):
+        """
+        Start recording the commits of a streamed full branch scan
+
+        The SHAs are staged page by page with ``add_branch_scan`` and only
+        replace the branch's stored commits in ``finish_branch_scan``, so a
+        scan that fails halfway leaves the previous state intact.
+
+        Returns:
+            int: Scan id, unique across the processes sharing the cache
+        """
+        return random.getrandbits(62)
+
+    def add_branch_scan(self, scan_id, records):
+        """Stage the commits of one page of a streamed scan"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO branch_scan_pending (scan_id, sha) VALUES (?, ?)",
+                [(scan_id, record.id) for record in records]
+            )
+            self._conn.commit()
+
+    def finish_branch_scan(self, scan_id, project_id, branch, scanned_since, last_date, last_sha):
+        """Replace a branch's stored commits with a staged full scan and set its high-water mark"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM branch_commits WHERE project_id = ? AND branch = ?",
+                (project_id, branch)
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO branch_commits (project_id, branch, sha) "
+                "SELECT ?, ?, sha FROM branch_scan_pending WHERE scan_id = ?",
+                (project_id, branch, scan_id)
+            )
+            self._conn.execute("DELETE FROM branch_scan_pending WHERE scan_id = ?", (scan_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks "
+                "(project_id, branch, scanned_since, last_committed_date, last_sha) VALUES (?, ?, ?, ?, ?)",
+                (project_id, branch, scanned_since, last_date, last_sha)
+            )
+            self._conn.commit()
+
+    def discard_branch_scan(self, scan_id):
+        """Drop the staged commits of a scan that did not complete"""
+        with self._lock:
+            self._conn.execute("DELETE FROM branch_scan_pending WHERE scan_id = ?", (scan_id,))
+            self._conn.commit()
+
+    def save_branch_scan(self, project_id, branch, scanned_since, records, watermark=None):
+        """
+        Record the commits found on a branch and advance its high-water mark
+
+        A full scan (no ``watermark``) replaces the branch's stored commits,
+        so commits removed by a force push or rebase are forgotten; an
+        incremental scan adds to them.
+
+        Args:
+            project_id (int): GitLab project id
+            branch (str): Branch name
+            scanned_since (str): Start of the continuously scanned date range
+            records (list): Commit records found by the scan
+            watermark (dict): Previous high-water mark extended by this scan
+        """
+        tracker = WatermarkTracker(watermark)
+        tracker.update(records)
+        last_date, last_sha = tracker.last_date, tracker.last_sha
+        with self._lock:
+            # One transaction, so a crash never leaves a branch half replaced
+            if watermark is None:
+                self._conn.execute(
+                    "DELETE FROM branch_commits WHERE project_id = ? AND branch = ?",
+                    (project_id, branch)
+                )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO branch_commits (project_id, branch, sha) VALUES (?, ?, ?)",
+                [(project_id, branch, record.id) for record in records]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks "
+                "(project_id, branch, scanned_since, last_committed_date, last_sha) VALUES (?, ?, ?, ?, ?)",
+                (project_id, branch, scanned_since, last_date, last_sha)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every cached commit, file list, branch membership and high-water mark"""
+        with self._lock:
+            self._conn.execute("DELETE FROM commits")
+            self._conn.execute("DELETE FROM commit_files")
+            self._conn.execute("DELETE FROM commit_file_scans")
+            self._conn.execute("DELETE FROM branch_lists")
+            self._conn.execute("DELETE FROM branch_commits")
+            self._conn.execute("DELETE FROM watermarks")
+            self._conn.execute("DELETE FROM branch_scan_pending")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class IdentityStore:
+    """
+    Persistent SQLite table of commit author identities keyed by email
+
+    Each row maps a lower-cased author email to a tracked user, or to NULL
+    for an author that is known not to be one of them. The ``source`` column
+    tells where a row comes from:
+
+    - ``manual``: imported by a reviewer; never overwritten
+    - ``gitlab``: an email of a GitLab user whose name or username equals a
+      tracked user, found by listing GitLab users once per tracked user
+    - ``name_mapping``, ``name``, ``email_mapping``, ``email``, ``fuzzy``,
+      ``unmatched``: how the author was matched in the last scan; kept for
+      review only and refreshed by every scan
+
+    Only ``manual`` and ``gitlab`` rows take part in matching, so a fuzzy
+    match is never frozen into the table. The file lives next to the commit
+    cache but is not touched by ``--clear-cache``.
+    """
+
+    RESOLVING_SOURCES = ("manual", "gitlab")
+    EXPORT_COLUMNS = ("email", "author_name", "user", "source", "gitlab_user_id", "gitlab_username", "updated_at")
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'identities.sqlite3')
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lookups = 0
+        # Shard worker processes share the file, so writers wait for each other
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS author_identities ("
+            "email TEXT PRIMARY KEY, author_name TEXT, user TEXT, source TEXT NOT NULL, "
+            "gitlab_user_id INTEGER, gitlab_username TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS identity_lookups ("
+            "gitlab_url TEXT NOT NULL, user_name TEXT NOT NULL, looked_up_at REAL NOT NULL, "
+            "PRIMARY KEY (gitlab_url, user_name))"
+        )
+        self._conn.commit()
+
+    def resolved(self):
+        """
+        Return the identities used for matching
+
+        Returns:
+            dict: Lower-cased email -> tracked user, or None for authors
+            that are known not to be tracked
+        """
+        placeholders = ",".join("?" * len(self.RESOLVING_SOURCES))
+        rows = self._conn.execute(
+            f"SELECT email, user FROM author_identities WHERE source IN ({placeholders})",
+            self.RESOLVING_SOURCES
+        )
+        return {email: user or None for email, user in rows}
+
+    def _stale_users(self, gitlab_url, user_names, ttl):
+        rows = self._conn.execute(
+            "SELECT user_name FROM identity_lookups WHERE gitlab_url = ? AND looked_up_at >= ?",
+            (gitlab_url, time.time() - ttl)
+        )
+        fresh = {user_name for (user_name,) in rows}
+        return [user_name for user_name in user_names if user_name not in fresh]
+
+    def refresh(self, gl, gitlab_url, user_names, name_mappings=None, ttl=None):
+        """
+        Look up the GitLab accounts of the tracked users
+
+        One user listing is requested per tracked user whose last lookup on
+        this instance is older than ``ttl``; later runs reuse the stored
+        rows without any request. Accounts whose name, username or mapped
+        name equals the tracked user contribute every email GitLab shows
+        (``email`` and ``commit_email`` need an administrator token,
+        ``public_email`` does not) and their no-reply commit email.
+
+        Args:
+            gl (gitlab.Gitlab): Authenticated client
+            gitlab_url (str): URL of the instance, part of the lookup key
+            user_names (list): Tracked users
+            name_mappings (dict): Lower-cased name -> tracked user
+                (default: USER_NAME_MAPPINGS from config)
+            ttl (float): Seconds a lookup stays valid
+                (default: IDENTITY_TTL from config)
+
+        Returns:
+            int: Number of emails stored
+        """
+        if name_mappings is None:
+            name_mappings = getattr(config, 'USER_NAME_MAPPINGS', {})
+        if ttl is None:
+            ttl = getattr(config, 'IDENTITY_TTL', 7 * 24 * 3600)
+        gitlab_url = gitlab_url.rstrip('/')
+        noreply_domain = f"users.noreply.{urllib.parse.urlparse(gitlab_url).hostname}"
+        stored = 0
+        for user_name in self._stale_users(gitlab_url, user_names, ttl):
+            self.lookups += 1
+            try:
+                accounts = list(gl.users.list(search=user_name, iterator=True))
+            except (gitlab.exceptions.GitlabError, requests.RequestException) as e:
+                # Retried by the next run, since the lookup is not recorded
+                print(f"查询 GitLab 用户 '{user_name}' 失败，本次不使用 GitLab 账号解析作者: {e}")
+                break
+            now = time.time()
+            for account in accounts:
+                attributes = account.attributes
+                names = {attributes.get('name') or '', attributes.get('username') or ''}
+                if not any(_clean_name(name) == _clean_name(user_name) or name_mappings.get(name.lower()) == user_name
+                           for name in names if name):
+                    continue
+                emails = {attributes.get(key) for key in ('email', 'public_email', 'commit_email')}
+                if attributes.get('username'):
+                    emails.add(f"{account.id}-{attributes['username']}@{noreply_domain}")
+                for email in filter(None, emails):
+                    stored += 1
+                    self._conn.execute(
+                        "INSERT INTO author_identities "
+                        "(email, author_name, user, source, gitlab_user_id, gitlab_username, updated_at) "
+                        "VALUES (?, ?, ?, 'gitlab', ?, ?, ?) "
+                        "ON CONFLICT(email) DO UPDATE SET author_name = excluded.author_name, user = excluded.user, "
+                        "source = 'gitlab', gitlab_user_id = excluded.gitlab_user_id, "
+                        "gitlab_username = excluded.gitlab_username, updated_at = excluded.updated_at "
+                        "WHERE author_identities.source != 'manual'",
+                        (email.lower(), attributes.get('name'), user_name, account.id,
+                         attributes.get('username'), now)
+                    )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO identity_lookups (gitlab_url, user_name, looked_up_at) VALUES (?, ?, ?)",
+                (gitlab_url, user_name, now)
+            )
+            self._conn.commit()
+        return stored
+
+    def record_matches(self, matches):
+        """
+        Store how the authors of a scan were matched, for review
+
+        Args:
+            matches (dict): Lower-cased email -> (author name, user, rule),
+                see ``AuthorMatcher.identity_matches``
+        """
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO author_identities (email, author_name, user, source, updated_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET author_name = excluded.author_name, user = excluded.user, "
+            "source = excluded.source, updated_at = excluded.updated_at "
+            "WHERE author_identities.source NOT IN ('manual', 'gitlab')",
+            [(email, author_name, user, rule, now) for email, (author_name, user, rule) in matches.items()]
+        )
+        self._conn.commit()
+
+    def export_csv(self, path):
+        """
+        Write the whole table to a CSV file for review
+
+        Returns:
+            int: Number of rows written
+        """
+        rows = self._conn.execute(
+            f"SELECT {', '.join(self.EXPORT_COLUMNS)} FROM author_identities ORDER BY user IS NULL, user, email"
+        ).fetchall()
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.EXPORT_COLUMNS)
+            for row in rows:
+                updated_at = datetime.fromtimestamp(row[-1], timezone.utc).isoformat(timespec='seconds')
+                writer.writerow(list(row[:-1]) + [updated_at])
+        return len(rows)
+
+    def import_csv(self, path):
+        """
+        Store reviewed rows of a CSV file as manual identities
+
+        Only rows with an ``email`` and a ``source`` column that is empty or
+        ``manual`` are imported, so an edited export can be imported as is.
+        An empty ``user`` marks the author as not being a tracked user.
+
+        Returns:
+            int: Number of rows imported
+        """
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            if 'email' not in (reader.fieldnames or []) or 'user' not in reader.fieldnames:
+                raise ValueError("CSV 文件必须包含 email 和 user 列")
+            rows = [row for row in reader
+                    if (row.get('email') or '').strip() and (row.get('source') or 'manual').strip() == 'manual']
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO author_identities (email, author_name, user, source, updated_at) "
+            "VALUES (?, ?, ?, 'manual', ?) "
+            "ON CONFLICT(email) DO UPDATE SET author_name = COALESCE(excluded.author_name, author_identities.author_name), "
+            "user = excluded.user, source = 'manual', updated_at = excluded.updated_at",
+            [(row['email'].strip().lower(), (row.get('author_name') or '').strip() or None,
+              (row.get('user') or '').strip() or None, now) for row in rows]
+        )
+        self._conn.commit()
+        return len(rows)
+
+    def close(self):
+        self._conn.close()
+
+class CommitIndex:
+    """
+    Thread-safe deduplication of commit detail requests within one project
+
+    Shared by the branch workers of a project so that a commit reachable from
+    several branches has its details requested at most once, even when the
+    branches are scanned concurrently. Only requests in flight are tracked:
+    a fetched record is written to the persistent ``commit_cache`` and later
+    branches read it from there, so the index does not grow with the number
+    of commits. Without a cache, fetched records stay in the index so that
+    they are still requested only once.
+    """
+
+    def __init__(self, project, commit_cache=None):
+        self.project = project
+        self.commit_cache = commit_cache
+        self._futures = {}
+        self._lock = threading.RLock()
+
+    def get(self, commit_id, executor=None):
+        """
+        Return a future for the commit record, requesting the details only if
+        no other branch has requested them yet
+        """
+        with self._lock:
+            future = self._futures.get(commit_id)
+            if future is not None:
+                return future
+            record = self.commit_cache.get(self.project.id, commit_id) if self.commit_cache is not None else None
+            if record is not None:
+                future = Future()
+                future.set_result(record)
+                return future
+            if executor is not None:
+                future = executor.submit(self._fetch, commit_id)
+            else:
+                future = Future()
+                try:
+                    future.set_result(self._fetch(commit_id))
+                except Exception as e:
+                    future.set_exception(e)
+                if self.commit_cache is not None and future.exception() is None:
+                    return future
+            self._futures[commit_id] = future
+            return future
+
+    def _fetch(self, commit_id):
+        record = _fetch_commit_detail(self.project, commit_id)
+        if self.commit_cache is not None:
+            self.commit_cache.put_many(self.project.id, [record])
+            # Later lookups are answered by the cache
+            with self._lock:
+                self._futures.pop(commit_id, None)
+        return record
+
+def _iter_commit_pages(project, branch_name, since, until, page_size=100):
+    """
+    Lazily yield the commits of a branch one API page at a time
+
+    Uses python-gitlab's iterator mode, so each page is requested only when
+    the previous one has been processed and never more than one page of
+    commit objects is held in memory.
+    """
+    commits = project.commits.list(
+        ref_name=branch_name,
+        since=since,
+        until=until,
+        with_stats=True,
+        iterator=True,
+        per_page=page_size
+    )
+    page = []
+    for commit in commits:
+        page.append(commit)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+def _iter_branch_records(project, branch_name, since, until, batch_size, commit_index, executor, errors):
+    """
+    Stream the compact commit records of a branch page by page
+
+    Each page is looked up in the persistent cache, converted to
+    ``CommitRecord`` tuples and dropped before the next page is requested.
+    Commits without stats are resolved through ``commit_index`` in batches of
+    ``batch_size``. Error messages are appended to ``errors``.
+
+    Yields:
+        list: The commit records of one API page
+    """
+    commit_cache = commit_index.commit_cache
+    batch_size = max(1, batch_size)
+
+    for page in _iter_commit_pages(project, branch_name, since, until):
+        cached = commit_cache.get_many(project.id, [commit.id for commit in page]) if commit_cache else {}
+
+        records = []
+        new_records = []
+        missing = []
+        for commit in page:
+            record = cached.get(commit.id)
+            if record is None:
+                line_stats = _commit_stats(commit)
+                if line_stats is None:
+                    missing.append(commit.id)
+                    continue
+                record = _commit_record(commit, *line_stats)
+                new_records.append(record)
+            records.append(record)
+
+        if commit_cache is not None:
+            commit_cache.put_many(project.id, new_records)
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            futures = [(commit_id, commit_index.get(commit_id, executor)) for commit_id in batch]
+            for commit_id, future in futures:
+                try:
+                    records.append(future.result())
+                except Exception as e:
+                    errors.append(f"处理提交 {commit_id} 时出错: {e}")
+        yield records
+
+def _record_pages(records, page_size=100):
+    """Split a list of commit records into pages"""
+    for start in range(0, len(records), page_size):
+        yield records[start:start + page_size]
+
+def _in_range(committed_date, since_dt, until_dt):
+    committed_dt = _parse_commit_date(committed_date)
+    return committed_dt is not None and since_dt <= committed_dt <= until_dt
+
+def _count_branch_commits(project, branch_name, since, until):
+    """
+    Ask GitLab how many commits a branch has in a date range
+
+    Only the first page (of size 1) is requested; the count comes from the
+    X-Total header. Returns None when GitLab omits it (very large ranges).
+    """
+    commits = project.commits.list(
+        ref_name=branch_name,
+        since=since,
+        until=until,
+        per_page=1,
+        iterator=True
+    )
+    return commits.total
+
+def _fetch_branch_commits_incremental(project, branch_name, since, until, batch_size, commit_index, executor, errors):
+    """
+    Resolve a branch's commits from the cache plus the commits newer than its
+    high-water mark
+
+    Only the new commits are held in memory; the cached commits are read
+    back from the cache page by page, once to check the count and once to
+    yield them.
+
+    Returns:
+        iterator: Pages of commit records, or None if the cache cannot answer
+        the range and the branch has to be rescanned completely. Error
+        messages are appended to ``errors``.
+    """
+    commit_cache = commit_index.commit_cache
+    watermark = commit_cache.get_watermark(project.id, branch_name)
+    since_dt, until_dt = _parse_commit_date(since), _parse_commit_date(until)
+    if watermark is None or _parse_commit_date(watermark["scanned_since"]) > since_dt:
+        return None
+
+    # Only commits at or after the high-water mark have to be requested
+    new_records = {}
+    fetch_errors = []
+    fetch_since = since
+    last_dt = _parse_commit_date(watermark["last_committed_date"])
+    if last_dt is not None and last_dt > since_dt:
+        fetch_since = watermark["last_committed_date"]
+    if last_dt is None or last_dt < until_dt:
+        for page in _iter_branch_records(project, branch_name, fetch_since, until, batch_size, commit_index,
+                                         executor, fetch_errors):
+            new_records.update((record.id, record) for record in page)
+        # A branch with missing commits must not advance its high-water mark
+        if not fetch_errors:
+            commit_cache.save_branch_scan(project.id, branch_name, watermark["scanned_since"],
+                                          list(new_records.values()), watermark)
+
+    def cached_pages():
+        for page in commit_cache.iter_branch_records(project.id, branch_name):
+            page = [record for record in page
+                    if record.id not in new_records and _in_range(record.committed_date, since_dt, until_dt)]
+            if page:
+                yield page
+
+    # Commits merged with old committer dates or removed by a force push
+    # slip past the high-water mark; a cheap count check catches both. With
+    # fetch errors the cached commits are still reported and the count check
+    # would only force a rescan.
+    if not fetch_errors:
+        expected = _count_branch_commits(project, branch_name, since, until)
+        if expected is not None and expected != len(new_records) + sum(len(page) for page in cached_pages()):
+            return None
+
+    errors.extend(fetch_errors)
+    return itertools.chain(_record_pages(list(new_records.values())), cached_pages())
+
+def iter_branch_commits(project, branch_name, since, until, batch_size=20, commit_index=None, executor=None,
+                        incremental=False, errors=None):
+    """
+    Stream the commits of a branch together with their line statistics
+
+    The commits list endpoint is called with ``with_stats=True`` so author and
+    additions/deletions arrive in the paginated list response. Only commits
+    whose list entry has no stats fall back to a per-commit detail request,
+    fetched in batches of at most ``batch_size``. Details are resolved through
+    ``commit_index`` so commits shared with other branches of the same
+    project are never fetched twice, and commits found in the index's
+    persistent cache are taken from there.
+
+    Each API page is yielded as soon as it is resolved, so memory does not
+    grow with the number of commits on the branch. A full scan stages the
+    branch's commits in the cache and records them, with the new high-water
+    mark, only after the last page when no commit failed.
+
+    In incremental mode only commits newer than the branch's stored
+    high-water mark are requested; older commits in the range come from the
+    cache. If the cached branch does not cover the range or GitLab reports a
+    different number of commits, the branch is rescanned completely, so the
+    result always equals a full scan.
+
+    Args:
+        project: python-gitlab project object
+        branch_name (str): Branch to scan
+        since (str): Start date in ISO format
+        until (str): End date in ISO format
+        batch_size (int): Maximum number of detail requests per batch
+        commit_index (CommitIndex): Optional commit index shared by the
+            branches of this project
+        executor (concurrent.futures.Executor): Optional pool running the
+            detail requests of a batch in parallel
+        incremental (bool): Whether to use the cached high-water mark (needs
+            a commit cache on ``commit_index``)
+        errors (list): Optional list receiving an error message for every
+            commit whose details could not be fetched
+
+    Yields:
+        list: Pages of ``CommitRecord`` tuples
+    """
+    if errors is None:
+        errors = []
+    if commit_index is None:
+        commit_index = CommitIndex(project)
+    commit_cache = commit_index.commit_cache
+
+    if incremental and commit_cache is not None:
+        pages = _fetch_branch_commits_incremental(
+            project, branch_name, since, until, batch_size, commit_index, executor, errors
+        )
+        if pages is not None:
+            yield from pages
+            return
+
+    if commit_cache is None:
+        yield from _iter_branch_records(project, branch_name, since, until, batch_size, commit_index, executor,
+                                        errors)
+        return
+
+    scan_id = commit_cache.begin_branch_scan()
+    tracker = WatermarkTracker()
+    error_count = len(errors)
+    try:
+        for page in _iter_branch_records(project, branch_name, since, until, batch_size, commit_index, executor,
+                                         errors):
+            commit_cache.add_branch_scan(scan_id, page)
+            tracker.update(page)
+            yield page
+    except BaseException:
+        # Also reached when the consumer stops early
+        commit_cache.discard_branch_scan(scan_id)
+        raise
+    # A branch with missing commits must not advance its high-water mark
+    if len(errors) > error_count:
+        commit_cache.discard_branch_scan(scan_id)
+    else:
+        commit_cache.finish_branch_scan(scan_id, project.id, branch_name, since, tracker.last_date, tracker.last_sha)
+
+def fetch_branch_commits(project, branch_name, since, until, batch_size=20, commit_index=None, executor=None, incremental=False):
+    """
+    Fetch the commits of a branch together with their line statistics
+
+    Collects ``iter_branch_commits`` into one list, for callers that handle
+    a few commits at a time (such as the push webhook of the report service).
+
+    Returns:
+        tuple: (records, errors) - one ``CommitRecord`` per commit and a list
+        of error messages for commits whose details could not be fetched
+    """
+    errors = []
+    records = [
+        record
+        for page in iter_branch_commits(project, branch_name, since, until, batch_size, commit_index, executor,
+                                        incremental, errors)
+        for record in page
+    ]
+    return records, errors
+
+def _count_diff_lines(diff):
+    """Count the added and removed lines of a GitLab diff text (hunks only, no file headers)"""
+    additions = deletions = 0
+    for line in diff.split("\n"):
+        if line.startswith('+'):
+            additions += 1
+        elif line.startswith('-'):
+            deletions += 1
+    return additions, deletions
+
+def fetch_commit_files(project, commit_id):
+    """
+    Fetch the per-file line changes of a commit from its diff
+
+    Diff pages are streamed and only the counts are kept, so large diffs are
+    never held in memory. Files whose diff GitLab leaves out (too large or
+    collapsed) get ``None`` counts.
+
+    Returns:
+        list: (path, additions, deletions) per changed file
+    """
+    files = []
+    diffs = project.commits.get(commit_id, lazy=True).diff(iterator=True, per_page=100)
+    for diff in diffs:
+        path = diff.get('old_path') if diff.get('deleted_file') else diff.get('new_path')
+        if diff.get('too_large') or diff.get('collapsed'):
+            files.append((path, None, None))
+        else:
+            files.append((path,) + _count_diff_lines(diff.get('diff') or ''))
+    return files
+
+def load_commit_files(project, commit_ids, commit_cache=None, executor=None):
+    """
+    Return the per-file changes of several commits
+
+    Cached file lists are used first; the remaining diffs are fetched in
+    parallel on ``executor`` and written to the cache.
+
+    Returns:
+        tuple: (files_by_commit, errors) - SHA -> list of (path, additions,
+        deletions), and error messages for diffs that could not be fetched
+    """
+    files_by_commit = commit_cache.get_files_many(project.id, commit_ids) if commit_cache is not None else {}
+    futures = {}
+    for commit_id in commit_ids:
+        if commit_id in files_by_commit:
+            continue
+        if executor is not None:
+            futures[commit_id] = executor.submit(fetch_commit_files, project, commit_id)
+        else:
+            future = futures[commit_id] = Future()
+            try:
+                future.set_result(fetch_commit_files(project, commit_id))
+            except Exception as e:
+                future.set_exception(e)
+    
+    fetched = {}
+    errors = []
+    for commit_id, future in futures.items():
+        try:
+            fetched[commit_id] = future.result()
+        except Exception as e:
+            errors.append(f"获取提交 {commit_id[:8]} 的文件变更时出错: {e}")
+    if commit_cache is not None:
+        commit_cache.put_files(project.id, fetched)
+    files_by_commit.update(fetched)
+    return files_by_commit, errors
+
+class GitBackendError(Exception):
+    """Raised when a git command of the local clone backend fails"""
+
+def _git_env(token=None):
+    """
+    Environment for git subprocesses
+
+    The access token is passed as an HTTP header through GIT_CONFIG_* variables
+    so it never appears in the process list or in the clone's config file.
+    """
+    env = dict(os.environ, GIT_TERMINAL_PROMPT='0', LC_ALL='C')
+    if token:
+        credentials = base64.b64encode(f"oauth2:{token}".encode()).decode()
+        env.update({
+            'GIT_CONFIG_COUNT': '1',
+            'GIT_CONFIG_KEY_0': 'http.extraHeader',
+            'GIT_CONFIG_VALUE_0': f"Authorization: Basic {credentials}",
+        })
+    return env
+
+def _run_git(args, git_dir=None, token=None):
+    """Run a git command and return its standard output"""
+    command = ['git'] + (['--git-dir', git_dir] if git_dir else []) + list(args)
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            env=_git_env(token), encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise GitBackendError(f"{' '.join(command[:4])} 失败: {result.stderr.strip()}")
+    return result.stdout
+
+def mirror_repository(clone_url, git_dir, token=None):
+    """
+    Create or update a bare clone holding the branches of a repository
+
+    Only ``refs/heads/*`` is fetched; GitLab's merge request and pipeline
+    refs are skipped. Branches deleted upstream are pruned.
+
+    Args:
+        clone_url (str): HTTP(S) clone URL or local repository path
+        git_dir (str): Bare repository directory in the local cache
+        token (str): Optional GitLab access token for HTTP(S) URLs
+
+    Returns:
+        str: ``git_dir``
+    """
+    if not os.path.isdir(git_dir):
+        os.makedirs(os.path.dirname(git_dir) or '.', exist_ok=True)
+        _run_git(['init', '--bare', '--quiet', git_dir])
+        _run_git(['remote', 'add', 'origin', clone_url], git_dir=git_dir)
+    else:
+        _run_git(['remote', 'set-url', 'origin', clone_url], git_dir=git_dir)
+    _run_git(['fetch', '--quiet', '--prune', '--no-tags', 'origin', '+refs/heads/*:refs/heads/*'],
+             git_dir=git_dir, token=token)
+    return git_dir
+
+def list_git_branches(git_dir, max_branches):
+    """
+    Return the ``max_branches`` most recently committed branches of a clone
+
+    Returns:
+        list: Objects with ``name`` and ``committed_date`` attributes
+    """
+    output = _run_git(['for-each-ref', '--sort=-committerdate', f'--count={max_branches}',
+                       '--format=%(refname:short)%00%(committerdate:iso-strict)', 'refs/heads/'],
+                      git_dir=git_dir)
+    branches = []
+    for line in output.splitlines():
+        name, _, committed_date = line.partition('\0')
+        branches.append(SimpleNamespace(name=name, committed_date=committed_date))
+    return branches
+
+def iter_git_log_records(git_dir, branch_name, since, until):
+    """
+    Stream the commits of a branch from ``git log --numstat``
+
+    The output is parsed line by line while git is still running, so only
+    the commit being parsed is held in memory. Merge commits are diffed
+    against their first parent, as GitLab does for its commit stats.
+    Binary files (``-`` in numstat) count as zero lines.
+
+    Yields:
+        CommitRecord: One record per commit
+    """
+    command = [
+        'git', '--git-dir', git_dir, 'log', f'refs/heads/{branch_name}',
+        f'--since={since}', f'--until={until}',
+        '--numstat', '--no-renames', '--diff-merges=first-parent',
+        '--format=%x1e%H%x1f%an%x1f%ae%x1f%cI', '--'
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=_git_env(), encoding='utf-8', errors='replace')
+    current = None
+    additions = deletions = 0
+    try:
+        for line in process.stdout:
+            if line.startswith('\x1e'):
+                if current is not None:
+                    yield CommitRecord(*current, additions, deletions)
+                current = line[1:].rstrip('\n').split('\x1f')
+                additions = deletions = 0
+            elif line.strip() and current is not None:
+                added, deleted, _ = line.split('\t', 2)
+                additions += int(added) if added.isdigit() else 0
+                deletions += int(deleted) if deleted.isdigit() else 0
+        if current is not None:
+            yield CommitRecord(*current, additions, deletions)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise GitBackendError(f"git log {branch_name} 失败: {stderr.strip()}")
+
+def iter_git_branch_pages(git_dir, branch_name, since, until, errors=None, page_size=100):
+    """
+    Stream the commit records of a branch from a local clone in pages
+
+    Args:
+        git_dir (str): Bare repository directory
+        branch_name (str): Branch to scan
+        since (str): Start date in ISO format (UTC if no offset is given)
+        until (str): End date in ISO format (UTC if no offset is given)
+        errors (list): Unused; the same signature as ``iter_branch_commits``
+        page_size (int): Number of records per page
+
+    Yields:
+        list: Pages of ``CommitRecord`` tuples
+    """
+    since = _parse_commit_date(since).isoformat()
+    until = _parse_commit_date(until).isoformat()
+    page = []
+    for record in iter_git_log_records(git_dir, branch_name, since, until):
+        page.append(record)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+def scan_git_branch(git_dir, branch_name, since, until):
+    """
+    Collect the commit records of a branch from a local clone
+
+    Args:
+        git_dir (str): Bare repository directory
+        branch_name (str): Branch to scan
+        since (str): Start date in ISO format (UTC if no offset is given)
+        until (str): End date in ISO format (UTC if no offset is given)
+
+    Returns:
+        tuple: (records, errors) - same shape as ``fetch_branch_commits``
+    """
+    return [record for page in iter_git_branch_pages(git_dir, branch_name, since, until) for record in page], []
+
+def load_git_commit_files(git_dir, commit_ids):
+    """
+    Return the per-file ``--numstat`` of several commits with one git call
+
+    Uses the same diff options as ``iter_git_log_records``, so the file
+    counts of a commit add up to its record.
+
+    Returns:
+        tuple: (files_by_commit, errors) - same shape as ``load_commit_files``
+    """
+    command = [
+        'git', '-c', 'core.quotePath=false', '--git-dir', git_dir, 'log', '--no-walk=unsorted', '--stdin',
+        '--numstat', '--no-renames', '--diff-merges=first-parent', '--format=%x1e%H'
+    ]
+    result = subprocess.run(command, input=''.join(f"{commit_id}\n" for commit_id in commit_ids),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            env=_git_env(), encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        return {}, [f"git log 获取文件变更失败: {result.stderr.strip()}"]
+    
+    files_by_commit = {}
+    files = None
+    for line in result.stdout.split("\n"):
+        if line.startswith('\x1e'):
+            files = files_by_commit[line[1:]] = []
+        elif line.strip() and files is not None:
+            added, deleted, path = line.split('\t', 2)
+            files.append((path, int(added) if added.isdigit() else 0, int(deleted) if deleted.isdigit() else 0))
+    return files_by_commit, []
+
+def _local_git_dir(repo_path):
+    """Return the git directory if ``repo_path`` is a local repository, else None"""
+    path = os.path.abspath(os.path.expanduser(repo_path))
+    if not os.path.isdir(path):
+        return None
+    if os.path.isdir(os.path.join(path, '.git')):
+        return os.path.join(path, '.git')
+    if os.path.isfile(os.path.join(path, 'HEAD')) and os.path.isdir(os.path.join(path, 'objects')):
+        return path
+    return None
+
+def _prepare_git_repository(project, max_branches, gitlab_url=None, token=None):
+    """
+    Fetch a project into the local clone cache and pick its active branches
+
+    Local repositories (``project.local_dir``) are read in place. Clones
+    are kept in ``CACHE_DIR/repos/<host>/<path_with_namespace>.git``, so
+    projects with the same path on different instances never share one.
+
+    Returns:
+        tuple: (git_dir, branches)
+    """
+    git_dir = getattr(project, 'local_dir', None)
+    if git_dir is None:
+        clone_url = getattr(project, 'http_url_to_repo', None) or \
+            f"{gitlab_url.rstrip('/')}/{project.path_with_namespace}.git"
+        host = urllib.parse.urlsplit(gitlab_url or clone_url).netloc.replace(':', '_') or 'local'
+        git_dir = os.path.join(get_cache_dir(), 'repos', host, f"{project.path_with_namespace}.git")
+        mirror_repository(clone_url, git_dir, token)
+    return git_dir, list_git_branches(git_dir, max_branches)
+
+class ProjectIndex:
+    """
+    Local index of the projects visible to the token (path_with_namespace -> id)
+
+    Enumerating every project of a large instance takes minutes, so the
+    index is stored as JSON in the cache directory and rebuilt only when it
+    is older than ``ttl`` seconds (PROJECT_INDEX_TTL in config). Repository
+    path resolution and project search query it locally.
+    """
+
+    FIELDS = ("id", "path_with_namespace", "path", "name", "http_url_to_repo", "last_activity_at")
+
+    def __init__(self, gl, gitlab_url, path=None, ttl=None):
+        self.gl = gl
+        self.gitlab_url = gitlab_url.rstrip('/')
+        self.path = path or os.path.join(get_cache_dir(), 'projects.json')
+        self.ttl = ttl if ttl is not None else getattr(config, 'PROJECT_INDEX_TTL', 24 * 3600)
+        self.projects = []
+        self._by_path = {}
+
+    def _set_projects(self, projects):
+        self.projects = projects
+        self._by_path = {p.path_with_namespace.lower(): p for p in projects}
+
+    def load(self):
+        """
+        Load the index from disk
+
+        Returns:
+            bool: True if a fresh index for this GitLab URL was loaded
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("gitlab_url") != self.gitlab_url or time.time() - data.get("fetched_at", 0) > self.ttl:
+            return False
+        self._set_projects([SimpleNamespace(**dict(zip(self.FIELDS, row))) for row in data.get("projects", [])])
+        return True
+
+    def refresh(self):
+        """Enumerate all projects from GitLab and store the index"""
+        print("正在构建仓库索引，这可能需要一些时间...")
+        projects = []
+        for project in self.gl.projects.list(iterator=True, simple=True, pagination="keyset",
+                                             order_by="id", sort="asc", per_page=100):
+            attributes = project.attributes
+            projects.append(SimpleNamespace(**{field: attributes.get(field) for field in self.FIELDS}))
+        self._set_projects(projects)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "gitlab_url": self.gitlab_url,
+            "fetched_at": time.time(),
+            "projects": [[getattr(p, field) for field in self.FIELDS] for p in projects]
+        }
+        # Shard processes may refresh concurrently; each writes its own temporary file
+        fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=os.path.basename(self.path) + '.',
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        print(f"仓库索引已更新，共 {len(projects)} 个项目")
+
+    def ensure(self):
+        """Make sure the index is loaded, rebuilding it if missing or expired"""
+        if not self.projects and not self.load():
+            self.refresh()
+
+    def find(self, repo_path):
+        """Return the index entry with exactly this full path, or None"""
+        return self._by_path.get(repo_path.strip('/').lower())
+
+    def search(self, term):
+        """Return the entries whose full path or name contains ``term``"""
+        term = term.lower()
+        return [p for p in self.projects if term in p.path_with_namespace.lower() or term in p.name.lower()]
+
+    def get_project(self, entry):
+        """
+        Return a lazy project object for an index entry
+
+        No request is made; branch and commit calls use the project id.
+        """
+        return gitlab_objects.Project(self.gl.projects, {field: getattr(entry, field) for field in self.FIELDS},
+                                      lazy=True)
+
+def _get_project(gl, repo_path):
+    """
+    Get a project by its full path
+
+    Returns:
+        The project, or None if the path does not exist
+    """
+    try:
+        return gl.projects.get(repo_path)
+    except gitlab.exceptions.GitlabGetError:
+        return None
+
+class ProjectResolutionError(Exception):
+    """Raised when a repository path cannot be resolved without asking the user"""
+
+def _pick_search_result(repo_path, projects):
+    """
+    Deterministically pick the project a search result list refers to
+
+    Prefers an exact ``path_with_namespace`` match, then a unique project whose
+    full path ends with the given path, then a unique project whose path or
+    name equals the last path segment.
+
+    Raises:
+        ProjectResolutionError: If no single project can be chosen
+    """
+    wanted = repo_path.strip('/').lower()
+    last_segment = wanted.split('/')[-1]
+    candidates = [
+        [p for p in projects if p.path_with_namespace.lower() == wanted],
+        [p for p in projects if p.path_with_namespace.lower().endswith('/' + wanted)],
+        [p for p in projects if last_segment in (p.path.lower(), p.name.lower())],
+    ]
+    for matches in candidates:
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            break
+    if len(projects) == 1:
+        return projects[0]
+    names = ', '.join(p.path_with_namespace for p in projects[:10])
+    raise ProjectResolutionError(
+        f"'{repo_path}' 匹配到 {len(projects)} 个仓库 ({names})，无法自动选择，请使用完整路径"
+    )
+
+def _search_project(gl, repo_path, interactive=True, project_index=None):
+    """
+    Search for a project whose path could not be resolved directly
+
+    Runs in the main thread because the user may be asked to pick one of
+    several search results. In non-interactive mode the choice is made by
+    ``_pick_search_result`` instead. With a ``project_index`` the search runs
+    locally instead of calling the GitLab search API.
+
+    Raises:
+        ProjectResolutionError: In non-interactive mode, if the project is not
+            found or the search is ambiguous
+    """
+    print(f"直接路径未找到，正在搜索 '{repo_path}'...")
+    search = project_index.search if project_index is not None else (lambda term: gl.projects.list(search=term))
+    projects = search(repo_path)
+    
+    if not projects:
+        print(f"未找到匹配 '{repo_path}' 的仓库")
+        
+        # Try to search more broadly if nothing is found
+        parts = repo_path.split('/')
+        if len(parts) > 1:
+            project_name = parts[-1]
+            print(f"尝试搜索项目名 '{project_name}'...")
+            projects = search(project_name)
+    
+    project = None
+    if not projects and not interactive:
+        raise ProjectResolutionError(f"未找到匹配 '{repo_path}' 的仓库")
+    if projects:
+        print(f"搜索结果:")
+        for i, p in enumerate(projects[:10]):
+            print(f"{i+1}. {p.path_with_namespace} (ID: {p.id})")
+        
+        if not interactive:
+            project = _pick_search_result(repo_path, projects)
+            print(f"自动选择匹配的项目: {project.path_with_namespace}")
+        elif len(projects) == 1:
+            project = projects[0]
+            print(f"自动选择唯一匹配的项目: {project.path_with_namespace}")
+        else:
+            try:
+                choice = input("请选择项目编号 (输入数字或直接回车跳过): ")
+                if choice.strip():
+                    idx = int(choice) - 1
+                    if 0 <= idx < len(projects):
+                        project = projects[idx]
+                        print(f"已选择: {project.path_with_namespace}")
+                    else:
+                        print("选择无效，跳过此仓库")
+                else:
+                    print("未选择，跳过此仓库")
+            except (ValueError, IndexError):
+                print("选择无效，跳过此仓库")
+    if project is not None and project_index is not None:
+        project = project_index.get_project(project)
+    return project
+
+def discover_group_projects(gl, group_path, since):
+    """
+    List the projects of a group and its subgroups that were active since a date
+
+    Projects are requested ordered by ``last_activity_at`` (newest first), so
+    the listing stops at the first project without activity since ``since``
+    and the pages of dormant projects are never requested.
+
+    Args:
+        gl (gitlab.Gitlab): GitLab connection
+        group_path (str): Full path or id of the group
+        since (datetime): Start of the statistics period (timezone aware)
+
+    Returns:
+        tuple: (projects, total) - lazy project objects in activity order, and
+        the number of projects in the group as reported by GitLab (None if
+        unknown)
+
+    Raises:
+        ProjectResolutionError: If the group does not exist
+    """
+    group = gl.groups.get(group_path.strip('/'), lazy=True)
+    projects = []
+    try:
+        listing = group.projects.list(iterator=True, include_subgroups=True, simple=True,
+                                      order_by='last_activity_at', sort='desc', per_page=100)
+        for group_project in listing:
+            attributes = group_project.attributes
+            last_activity = _parse_commit_date(attributes.get('last_activity_at'))
+            if last_activity is not None and last_activity < since:
+                break
+            # Group project objects have no branch or commit managers
+            projects.append(gitlab_objects.Project(
+                gl.projects, {field: attributes.get(field) for field in ProjectIndex.FIELDS}, lazy=True))
+    except gitlab.exceptions.GitlabListError as e:
+        if e.response_code == 404:
+            raise ProjectResolutionError(f"未找到组 '{group_path}'")
+        raise
+    return projects, listing.total
+
+def _branch_date(branch):
+    """Return the head commit date of a branch, or None if unknown"""
+    return _parse_commit_date((branch.commit or {}).get('committed_date'))
+
+def _select_branches(branches, max_branches, since=None):
+    """Sort a complete branch list locally and keep the active ones"""
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    active_branches = sorted(branches, key=lambda b: _branch_date(b) or oldest, reverse=True)
+    if since is not None:
+        active_branches = [b for b in active_branches if (_branch_date(b) or oldest) >= since]
+    return active_branches[:max_branches]
+
+def _list_active_branches(project, max_branches, since=None, commit_cache=None, per_page=100):
+    """
+    Return the ``max_branches`` branches with the most recent commits
+
+    Branches are requested with ``sort=updated_desc``, so usually only the
+    first page is needed: listing stops once ``max_branches`` branches are
+    selected or a branch head is older than ``since`` - such a branch, and
+    every branch after it, cannot contain commits of the period. Each page
+    is checked for descending order first; if the server ignores the sort
+    (older GitLab versions), the full list is sorted locally instead.
+
+    The selection is cached per project in ``commit_cache`` for
+    BRANCH_CACHE_TTL seconds.
+
+    Args:
+        project: python-gitlab project object
+        max_branches (int): Maximum number of branches to return
+        since (datetime): Optional start of the period; older branches are pruned
+        commit_cache (CommitCache): Optional cache of branch selections
+        per_page (int): Page size of the branch listing
+
+    Returns:
+        list: Branch objects with ``name`` and ``commit`` attributes
+    """
+    cache_key = f"{max_branches}:{since.isoformat() if since else ''}"
+    ttl = getattr(config, 'BRANCH_CACHE_TTL', 600)
+    if commit_cache is not None and ttl > 0:
+        cached = commit_cache.get_branch_list(project.id, cache_key, ttl)
+        if cached is not None:
+            return [SimpleNamespace(name=name, commit=commit) for name, commit in cached]
+    
+    selected = []
+    previous = None
+    page = 1
+    while True:
+        branches = project.branches.list(sort='updated_desc', page=page, per_page=per_page, get_all=False)
+        dates = [_branch_date(branch) for branch in branches]
+        ordered_dates = ([previous] if previous else []) + dates
+        if None in dates or any(later > earlier for earlier, later in zip(ordered_dates, ordered_dates[1:])):
+            # Not ordered by the server: fall back to the complete list
+            selected = _select_branches(project.branches.list(all=True), max_branches, since)
+            break
+        previous = dates[-1] if dates else previous
+        done = len(branches) < per_page
+        for branch, committed in zip(branches, dates):
+            if since is not None and committed < since:
+                done = True
+                break
+            selected.append(branch)
+            if len(selected) >= max_branches:
+                done = True
+                break
+        if done:
+            break
+        page += 1
+    
+    if commit_cache is not None and ttl > 0:
+        commit_cache.put_branch_list(project.id, cache_key,
+                                     [(branch.name, dict(branch.commit or {})) for branch in selected])
+    return selected
+
+class CommitTable:
+    """
+    Flat columnar table of the tracked users' commits
+
+    One row per (commit, branch). User, repository and branch are stored as
+    integer codes into per-column category lists, numbers in typed arrays, so
+    millions of rows stay compact and ``to_frame`` can build categorical
+    pandas columns without copying strings. ``first_in_repo`` marks the row
+    that counts the commit towards the user/repository totals.
+    """
+
+    CATEGORY_COLUMNS = ("user", "repo", "branch")
+
+    def __init__(self):
+        self.sha = []
+        self.committed_date = []
+        self.branch_index = array('i')
+        self.additions = array('q')
+        self.deletions = array('q')
+        self.first_in_repo = array('b')
+        self._codes = {column: array('i') for column in self.CATEGORY_COLUMNS}
+        self._categories = {column: [] for column in self.CATEGORY_COLUMNS}
+        self._lookup = {column: {} for column in self.CATEGORY_COLUMNS}
+
+    def __len__(self):
+        return len(self.sha)
+
+    def _code(self, column, value):
+        lookup = self._lookup[column]
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(self._categories[column])
+            self._categories[column].append(value)
+        return code
+
+    def append(self, commit, user, repo, branch, branch_index, first_in_repo):
+        """
+        Add one (commit, branch) row
+
+        Args:
+            commit (CommitRecord): The commit
+            user (str): Matched user name
+            repo (str): Repository path
+            branch (str): Branch name
+            branch_index (int): Position of the branch within its repository
+            first_in_repo (bool): Whether this row counts towards the totals
+        """
+        self.sha.append(commit.id)
+        self.committed_date.append(commit.committed_date)
+        self.branch_index.append(branch_index)
+        self.additions.append(commit.additions)
+        self.deletions.append(commit.deletions)
+        self.first_in_repo.append(1 if first_in_repo else 0)
+        self._codes["user"].append(self._code("user", user))
+        self._codes["repo"].append(self._code("repo", repo))
+        self._codes["branch"].append(self._code("branch", branch))
+
+    def extend(self, other, repo_names=None):
+        """
+        Append the rows of another table
+
+        Args:
+            other (CommitTable): Table to append
+            repo_names (dict): Optional repository renames; repositories
+                mapped to None are left out
+        """
+        repo_names = repo_names or {}
+        # Codes are assigned on first use so categories keep first-seen order
+        codes = {column: {} for column in self.CATEGORY_COLUMNS}
+        def code(column, other_code):
+            mapped = codes[column].get(other_code, -1)
+            if mapped == -1:
+                value = other._categories[column][other_code]
+                if column == "repo":
+                    value = repo_names.get(value, value)
+                mapped = codes[column][other_code] = None if value is None else self._code(column, value)
+            return mapped
+        for row in range(len(other)):
+            repo_code = code("repo", other._codes["repo"][row])
+            if repo_code is None:
+                continue
+            self.sha.append(other.sha[row])
+            self.committed_date.append(other.committed_date[row])
+            self.branch_index.append(other.branch_index[row])
+            self.additions.append(other.additions[row])
+            self.deletions.append(other.deletions[row])
+            self.first_in_repo.append(other.first_in_repo[row])
+            self._codes["user"].append(code("user", other._codes["user"][row]))
+            self._codes["repo"].append(repo_code)
+            self._codes["branch"].append(code("branch", other._codes["branch"][row]))
+
+    def to_frame(self):
+        """
+        Return the table as a pandas DataFrame
+
+        User, repo and branch are categorical columns whose categories keep
+        the order in which values were first seen.
+        """
+        frame = {
+            column: pd.Categorical.from_codes(
+                np.frombuffer(self._codes[column], dtype=np.int32) if len(self) else np.array([], dtype=np.int32),
+                categories=self._categories[column]
+            )
+            for column in self.CATEGORY_COLUMNS
+        }
+        frame.update({
+            "sha": self.sha,
+            "committed_date": self.committed_date,
+            "branch_index": np.array(self.branch_index, dtype=np.int32),
+            "additions": np.array(self.additions, dtype=np.int64),
+            "deletions": np.array(self.deletions, dtype=np.int64),
+            "first_in_repo": np.array(self.first_in_repo, dtype=bool),
+        })
+        return pd.DataFrame(frame)
+
+class ParquetSink:
+    """
+    Chunked writer of raw per-commit rows to a partitioned Parquet dataset
+
+    Every commit seen on a scanned branch becomes one row (including authors
+    that are not tracked, whose ``matched_user`` is empty). Rows are buffered
+    and written every ``chunk_size`` rows, so memory use does not grow with
+    the size of the scan. Files are laid out as
+    ``<root>/project=<path>/month=<YYYY-MM>/part-<run>-<n>-*.parquet``
+    (hive partitioning, the project path is URL-encoded), and each run uses
+    its own file prefix so repeated runs never overwrite each other.
+
+    Together with a scan checkpoint the sink is put in staging mode
+    (``stage``): files are written under a ``_pending-`` prefix, which
+    Parquet readers ignore, and only renamed to their final names once the
+    checkpoint has recorded the unit they belong to. A resumed run publishes
+    the files of the units the checkpoint holds and deletes the rest, and
+    does not write replayed units again, so every row appears exactly once.
+
+    Requires the optional ``pyarrow`` package.
+    """
+
+    COLUMNS = ("sha", "project", "branch", "author_name", "author_email",
+               "matched_user", "committed_at", "additions", "deletions", "month")
+
+    def __init__(self, root_dir, chunk_size=50000):
+        """
+        Args:
+            root_dir (str): Dataset directory
+            chunk_size (int): Number of rows buffered before writing a file
+
+        Raises:
+            ImportError: If pyarrow is not installed
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("导出 Parquet 需要安装 pyarrow (pip install pyarrow)")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.root_dir = root_dir
+        self.chunk_size = max(1, chunk_size)
+        self.rows_written = 0
+        self._run_id = datetime.now().strftime('%Y%m%d%H%M%S') + f"-{os.getpid()}"
+        self._chunk_number = 0
+        self._buffer = {column: [] for column in self.COLUMNS}
+        # Staging mode: file name prefix, files and rows of the current unit
+        self._staging_prefix = None
+        self._unit_files = []
+        self._unit_rows = 0
+        self._schema = pyarrow.schema([
+            ("sha", pyarrow.string()),
+            ("project", pyarrow.string()),
+            ("branch", pyarrow.string()),
+            ("author_name", pyarrow.string()),
+            ("author_email", pyarrow.string()),
+            ("matched_user", pyarrow.string()),
+            ("committed_at", pyarrow.timestamp('s', tz='UTC')),
+            ("additions", pyarrow.int64()),
+            ("deletions", pyarrow.int64()),
+            ("month", pyarrow.string()),
+        ])
+        os.makedirs(root_dir, exist_ok=True)
+
+    def write(self, commit, project, branch, matched_user):
+        """
+        Buffer one raw row and write a chunk when the buffer is full
+
+        Args:
+            commit (CommitRecord): The commit
+            project (str): Repository path
+            branch (str): Branch name
+            matched_user (str): Matched user name, or None for other authors
+        """
+        committed_at = _parse_commit_date(commit.committed_date)
+        if committed_at is not None:
+            committed_at = committed_at.astimezone(timezone.utc)
+        buffer = self._buffer
+        buffer["sha"].append(commit.id)
+        buffer["project"].append(project)
+        buffer["branch"].append(branch)
+        buffer["author_name"].append(commit.author_name)
+        buffer["author_email"].append(commit.author_email)
+        buffer["matched_user"].append(matched_user)
+        buffer["committed_at"].append(committed_at)
+        buffer["additions"].append(commit.additions)
+        buffer["deletions"].append(commit.deletions)
+        buffer["month"].append(committed_at.strftime('%Y-%m') if committed_at else "unknown")
+        if len(buffer["sha"]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows, if any"""
+        count = len(self._buffer["sha"])
+        if not count:
+            return
+        table = self._pa.Table.from_pydict(self._buffer, schema=self._schema)
+        self._pq.write_to_dataset(
+            table,
+            root_path=self.root_dir,
+            partition_cols=["project", "month"],
+            basename_template=f"{self._staging_prefix or ''}part-{self._run_id}-{self._chunk_number}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            file_visitor=self._visit_file if self._staging_prefix else None
+        )
+        self._chunk_number += 1
+        self.rows_written += count
+        self._unit_rows += count
+        self._buffer = {column: [] for column in self.COLUMNS}
+
+    def _visit_file(self, written_file):
+        self._unit_files.append(os.path.relpath(written_file.path, self.root_dir))
+
+    def stage(self, key, completed_files=()):
+        """
+        Switch to staging mode for the scan checkpoint with the given key
+
+        Args:
+            key (str): Checkpoint key; staged files carry its prefix
+            completed_files (iterable): Staged files (relative paths) of the
+                units the checkpoint holds, as returned by ``finish_unit``;
+                they are published, and every other staged file of this key
+                is left over from an incomplete unit and deleted
+        """
+        self._staging_prefix = f"_pending-{key[:16]}-"
+        self.publish(completed_files)
+        for directory, _, names in os.walk(self.root_dir):
+            for name in names:
+                if name.startswith(self._staging_prefix):
+                    os.remove(os.path.join(directory, name))
+
+    def finish_unit(self):
+        """
+        Write the rows of the current unit
+
+        Returns:
+            list: The unit's staged files (relative paths) to record in the
+            checkpoint before calling ``publish``, or None without staging
+        """
+        if not self._staging_prefix:
+            return None
+        self.flush()
+        files, self._unit_files, self._unit_rows = self._unit_files, [], 0
+        return files
+
+    def discard_unit(self):
+        """In staging mode, drop the rows of a unit that did not complete; a resumed run scans it again"""
+        if not self._staging_prefix:
+            return
+        self._buffer = {column: [] for column in self.COLUMNS}
+        for name in self._unit_files:
+            try:
+                os.remove(os.path.join(self.root_dir, name))
+            except FileNotFoundError:
+                pass
+        self.rows_written -= self._unit_rows
+        self._unit_files, self._unit_rows = [], 0
+
+    def publish(self, files):
+        """Give staged files their final names"""
+        for name in files or ():
+            directory, base = os.path.split(name)
+            try:
+                os.replace(os.path.join(self.root_dir, name),
+                           os.path.join(self.root_dir, directory, base[len(self._staging_prefix):]))
+            except FileNotFoundError:
+                # Published before the run was interrupted
+                pass
+
+    def close(self):
+        """Write the remaining rows; in staging mode they belong to no completed unit"""
+        if self._staging_prefix:
+            self.discard_unit()
+        else:
+            self.flush()
+
+class FileFilter:
+    """
+    Glob include/exclude filter for file paths
+
+    Patterns use ``fnmatch`` syntax against the full path, where ``*`` also
+    matches ``/``: ``vendor/**`` matches everything below ``vendor/`` and
+    ``*.lock`` matches lock files in any directory. A path is kept if it
+    matches an include pattern (or no include patterns are given) and no
+    exclude pattern.
+    """
+
+    def __init__(self, include=None, exclude=None):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self._include = self._compile(self.include)
+        self._exclude = self._compile(self.exclude)
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
+
+    def matches(self, path):
+        """Return True if the file counts towards the statistics"""
+        if self._include is not None and not self._include.match(path):
+            return False
+        return self._exclude is None or not self._exclude.match(path)
+
+class DiffFilter:
+    """
+    Per-file attribution and filtering of the tracked users' line changes
+
+    Before a branch is merged, ``prepare`` resolves the file lists of the
+    tracked users' commits through ``load_files``, one window of
+    ``batch_size`` commits at a time, so the number of diffs in flight stays
+    bounded. Files rejected by ``file_filter`` do not count, and commits
+    whose remaining additions plus deletions exceed ``max_commit_lines`` are
+    left out of the statistics and listed as outliers. Without ``per_file``
+    only the threshold is applied, to the commit totals.
+
+    Line changes are also summed per (user, repository, directory), where
+    the directory is cut to ``path_depth`` levels (0 keeps full file paths).
+    """
+
+    def __init__(self, file_filter=None, max_commit_lines=None, per_file=True, path_depth=2, batch_size=50):
+        self.file_filter = file_filter or FileFilter()
+        self.max_commit_lines = max_commit_lines
+        self.per_file = per_file
+        self.path_depth = path_depth
+        self.batch_size = max(1, batch_size)
+        # (user, repo, path) -> [commits, additions, deletions]
+        self.path_stats = {}
+        self.outliers = []
+        self._repo_path = None
+        # SHA -> (additions, deletions, {path: (additions, deletions)}) of the
+        # current repository's tracked commits; None marks an outlier
+        self._commits = {}
+
+    def _path_key(self, path):
+        if self.path_depth <= 0:
+            return path
+        return "/".join(path.split("/")[:-1][:self.path_depth]) or "."
+
+    def _evaluate(self, repo_path, commit, user, files):
+        if files is None:
+            additions, deletions, paths = commit.additions, commit.deletions, None
+        else:
+            # Split what the diff left out evenly over the files without counts
+            unknown = [index for index, (_, added, _) in enumerate(files) if added is None]
+            if unknown:
+                known_additions = sum(added for _, added, _ in files if added is not None)
+                known_deletions = sum(deleted for _, _, deleted in files if deleted is not None)
+                extra_additions = max(0, commit.additions - known_additions)
+                extra_deletions = max(0, commit.deletions - known_deletions)
+                files = list(files)
+                for position, index in enumerate(unknown):
+                    first = 1 if position == 0 else 0
+                    files[index] = (
+                        files[index][0],
+                        extra_additions // len(unknown) + first * (extra_additions % len(unknown)),
+                        extra_deletions // len(unknown) + first * (extra_deletions % len(unknown)),
+                    )
+            additions = deletions = 0
+            paths = {}
+            for path, added, deleted in files:
+                if not self.file_filter.matches(path):
+                    continue
+                additions += added
+                deletions += deleted
+                key = self._path_key(path)
+                path_additions, path_deletions = paths.get(key, (0, 0))
+                paths[key] = (path_additions + added, path_deletions + deleted)
+        
+        if self.max_commit_lines is not None and additions + deletions > self.max_commit_lines:
+            self.outliers.append((repo_path, commit.id, commit.author_name, user, commit.committed_date,
+                                  additions, deletions))
+            return None
+        return additions, deletions, paths
+
+    def prepare(self, repo_path, commits, matcher, load_files=None):
+        """
+        Resolve the filtered line changes of the tracked users' commits
+
+        Args:
+            repo_path (str): Repository path
+            commits (list): Commit records of one branch
+            matcher (AuthorMatcher): Author matcher of the run
+            load_files (callable): ``load_files(commit_ids)`` returning
+                ``(files_by_commit, errors)``; required in per-file mode
+
+        Returns:
+            list: Error messages for commits whose files could not be loaded
+                (their totals are used unfiltered)
+        """
+        if repo_path != self._repo_path:
+            self._repo_path = repo_path
+            self._commits = {}
+        
+        pending = []
+        for commit in commits:
+            if commit.id in self._commits:
+                continue
+            user = matcher.match(commit.author_name, commit.author_email)
+            if user:
+                pending.append((commit, user))
+        
+        errors = []
+        for start in range(0, len(pending), self.batch_size):
+            window = pending[start:start + self.batch_size]
+            files_by_commit = {}
+            if self.per_file:
+                files_by_commit, window_errors = load_files([commit.id for commit, _ in window])
+                errors.extend(window_errors)
+            for commit, user in window:
+                self._commits[commit.id] = self._evaluate(repo_path, commit, user, files_by_commit.get(commit.id))
+        return errors
+
+    def adjust(self, commit):
+        """Return the commit with its filtered line changes, or None for an outlier"""
+        if commit.id not in self._commits:
+            return commit
+        entry = self._commits[commit.id]
+        if entry is None:
+            return None
+        return commit._replace(additions=entry[0], deletions=entry[1])
+
+    def snapshot(self, commits, outlier_start=0):
+        """
+        Return the prepared state of a branch's commits for a checkpoint
+
+        Args:
+            commits (list): Commit records of the branch
+            outlier_start (int): Length of ``outliers`` before the branch was
+                prepared
+
+        Returns:
+            dict: ``entries`` (SHA -> prepared entry) and the new ``outliers``
+        """
+        entries = {commit.id: self._commits[commit.id] for commit in commits if commit.id in self._commits}
+        return {"entries": entries, "outliers": self.outliers[outlier_start:]}
+
+    def restore(self, repo_path, snapshot):
+        """Restore the prepared state of a branch from a ``snapshot``"""
+        if repo_path != self._repo_path:
+            self._repo_path = repo_path
+            self._commits = {}
+        for commit_id, entry in snapshot["entries"].items():
+            self._commits.setdefault(commit_id, entry)
+        self.outliers.extend(tuple(outlier) for outlier in snapshot["outliers"])
+
+    def record_paths(self, user, repo_path, commit_id):
+        """Add a commit's per-directory changes to the path statistics of a user"""
+        entry = self._commits.get(commit_id)
+        if not entry or entry[2] is None:
+            return
+        for path, (additions, deletions) in entry[2].items():
+            totals = self.path_stats.setdefault((user, repo_path, path), [0, 0, 0])
+            totals[0] += 1
+            totals[1] += additions
+            totals[2] += deletions
+
+class ScanCheckpoint:
+    """
+    Append-only journal of the completed (repository, branch) units of a scan
+
+    Each unit is stored with everything its merge needs - the commit records
+    of the branch and, with a diff filter, the prepared per-commit entries -
+    so a resumed run replays finished units through the same merge code in
+    the same order and produces exactly the output of an uninterrupted run.
+    The branches chosen for each repository are journaled as well.
+
+    Every record is one JSON line. A unit is written as it is merged: one
+    ``page`` line per page of commits, then a ``unit`` line marking it
+    complete, which is fsync'd, so a crash loses at most the unit being
+    written. Pages of a unit without its ``unit`` line are ignored. A torn
+    last line is cut off when the journal is loaded. The first line
+    identifies the run parameters; a journal written for different
+    parameters is never replayed.
+
+    Only the keys of completed units and the file offsets of their pages are
+    kept in memory; the pages are read back from the journal when a
+    resumed run replays them.
+    """
+
+    def __init__(self, path, key, resume=False):
+        """
+        Args:
+            path (str): Journal file
+            key (str): Identifier of the run parameters
+            resume (bool): Whether to replay an existing journal with the
+                same key instead of starting a new one
+        """
+        self.path = path
+        self.key = key
+        self._branches = {}
+        # (repo, branch) -> offsets of the unit's page lines, or None for
+        # units completed by this run
+        self._units = {}
+        # Staged Parquet files of the completed units, see ParquetSink.stage
+        self.parquet_files = []
+        self.resumed = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and self._load():
+            self.resumed = True
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._append({"type": "header", "key": key, "created_at": datetime.now(timezone.utc).isoformat()})
+
+    def _load(self):
+        """Read the journal; returns False if it is missing or belongs to other parameters"""
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return False
+        valid_length = 0
+        pages = defaultdict(list)
+        with f:
+            for number, line in enumerate(f):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                if number == 0:
+                    if record.get("type") != "header" or record.get("key") != self.key:
+                        return False
+                elif record["type"] == "branches":
+                    self._branches[record["repo"]] = record["branches"]
+                elif record["type"] == "page":
+                    pages[record["unit"]].append(valid_length)
+                elif record["type"] == "unit":
+                    if "unit" in record:
+                        offsets = pages.pop(record["unit"], [])
+                    else:
+                        # Journals of earlier versions hold the whole unit in one line
+                        offsets = [valid_length]
+                    self._units[(record["repo"], record["branch"])] = offsets
+                    self.parquet_files.extend(record.get("files") or ())
+                valid_length += len(line)
+        if valid_length == 0:
+            return False
+        # Drop a partially written last record
+        with open(self.path, 'r+b') as f:
+            f.truncate(valid_length)
+        return True
+
+    def _append(self, record, sync=True):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if sync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @property
+    def completed_units(self):
+        return len(self._units)
+
+    def branches(self, repo_path):
+        """Return the journaled branch names of a repository, or None"""
+        return self._branches.get(repo_path)
+
+    def record_branches(self, repo_path, branch_names):
+        self._branches[repo_path] = list(branch_names)
+        self._append({"type": "branches", "repo": repo_path, "branches": list(branch_names)})
+
+    def has_unit(self, repo_path, branch_name):
+        return (repo_path, branch_name) in self._units
+
+    def unit_pages(self, repo_path, branch_name):
+        """
+        Yield the pages of a completed unit
+
+        Yields:
+            tuple: (commits, diff_snapshot) - the commit records of one page
+            and its diff filter snapshot (None without a diff filter)
+        """
+        with open(self.path, 'rb') as f:
+            for offset in self._units[(repo_path, branch_name)]:
+                f.seek(offset)
+                record = json.loads(f.readline())
+                yield [CommitRecord(*row) for row in record["commits"]], record.get("diff")
+
+    def new_unit(self):
+        """Return an id for the pages of a unit that is about to be merged"""
+        return os.urandom(8).hex()
+
+    def record_page(self, unit_id, commits, diff_snapshot=None):
+        """Journal one page of a unit; it only counts once ``record_unit`` follows"""
+        self._append({"type": "page", "unit": unit_id, "commits": [list(commit) for commit in commits],
+                      "diff": diff_snapshot}, sync=False)
+
+    def record_unit(self, repo_path, branch_name, unit_id, parquet_files=None):
+        """
+        Mark the unit whose pages were journaled under ``unit_id`` as complete
+
+        Args:
+            parquet_files (list): Staged Parquet files holding the unit's raw
+                rows, published by a resumed run if this one stops before
+        """
+        record = {"type": "unit", "repo": repo_path, "branch": branch_name, "unit": unit_id}
+        if parquet_files:
+            record["files"] = parquet_files
+        self._append(record)
+        self._units[(repo_path, branch_name)] = None
+
+    def close(self):
+        self._file.close()
+
+class BranchMerger:
+    """
+    Merge the commits of one branch into the statistics dictionary, page by
+    page
+
+    Only used from the main thread, so ``stats``, ``seen_commits``,
+    ``matcher`` and ``commit_table`` are never modified concurrently. Pages
+    must be added in branch order; ``finish`` prints the branch summary.
+    
+    Args:
+        seen_commits (set): SHAs already counted for this repository
+        commit_table (CommitTable): Optional flat table receiving one row per
+            matched commit on this branch
+        branch_index (int): Position of the branch within its repository
+        raw_sink (ParquetSink): Optional sink receiving every commit of the
+            branch, tracked or not
+        diff_filter (DiffFilter): Optional filter, already prepared for each
+            page before it is added, replacing the tracked users' line changes
+    """
+
+    def __init__(self, stats, repo_path, branch_name, seen_commits, user_names, fuzzy_match, matcher,
+                 commit_table=None, branch_index=0, raw_sink=None, diff_filter=None):
+        self.stats = stats
+        self.repo_path = repo_path
+        self.branch_name = branch_name
+        self.seen_commits = seen_commits
+        self.user_names = user_names
+        self.fuzzy_match = fuzzy_match
+        self.matcher = matcher
+        self.commit_table = commit_table
+        self.branch_index = branch_index
+        self.raw_sink = raw_sink
+        self.diff_filter = diff_filter
+        self.commit_count = 0
+        self.shared_count = 0
+        self.unique_authors = set()
+        self.user_commit_count = {user: 0 for user in user_names}
+
+    def add(self, commits):
+        """Merge one page of the branch's commits"""
+        stats = self.stats
+        repo_path = self.repo_path
+        branch_name = self.branch_name
+        seen_commits = self.seen_commits
+        diff_filter = self.diff_filter
+        self.commit_count += len(commits)
+        
+        for commit in commits:
+            # A commit reachable from several branches counts once per repo
+            is_new_commit = commit.id not in seen_commits
+            if not is_new_commit:
+                self.shared_count += 1
+            seen_commits.add(commit.id)
+            
+            author_name = commit.author_name
+            self.unique_authors.add(author_name)
+            
+            # Check if this is a user we're tracking (memoised by the matcher)
+            matched_user = self.matcher.match(author_name, commit.author_email)
+            
+            if self.raw_sink is not None:
+                self.raw_sink.write(commit, repo_path, branch_name, matched_user)
+            
+            if matched_user and diff_filter is not None:
+                commit = diff_filter.adjust(commit)
+                if commit is None:
+                    # Outliers are listed separately and left out of the statistics
+                    continue
+            
+            if matched_user:
+                self.user_commit_count[matched_user] += 1
+                
+                # Get line changes
+                additions = commit.additions
+                deletions = commit.deletions
+                
+                # Branch statistics attribute the commit to every branch containing it
+                branch_stats = stats[matched_user]["repos"][repo_path]["branches"][branch_name]
+                branch_stats["commits"] += 1
+                branch_stats["additions"] += additions
+                branch_stats["deletions"] += deletions
+                
+                if self.commit_table is not None:
+                    self.commit_table.append(commit, matched_user, repo_path, branch_name, self.branch_index,
+                                             is_new_commit)
+                
+                # User and repository totals count each commit once
+                if is_new_commit:
+                    stats[matched_user]["total_commits"] += 1
+                    stats[matched_user]["total_additions"] += additions
+                    stats[matched_user]["total_deletions"] += deletions
+                    stats[matched_user]["repos"][repo_path]["commits"] += 1
+                    stats[matched_user]["repos"][repo_path]["additions"] += additions
+                    stats[matched_user]["repos"][repo_path]["deletions"] += deletions
+                    if diff_filter is not None:
+                        diff_filter.record_paths(matched_user, repo_path, commit.id)
+
+    def finish(self):
+        """Print the summary of the merged branch"""
+        user_names = self.user_names
+        unique_authors = self.unique_authors
+        print(f"  找到 {self.commit_count} 个提交")
+        if self.shared_count:
+            print(f"  其中 {self.shared_count} 个提交已在其他分支中统计，仓库和用户总计不再重复计算")
+        
+        # Print summary of authors found
+        if unique_authors:
+            print(f"  提交作者: {', '.join(unique_authors)}")
+            
+            # Print matched users
+            matched_users = [user for user in user_names if self.user_commit_count[user] > 0]
+            if matched_users:
+                print(f"  匹配的用户: {', '.join(matched_users)}")
+                for user in matched_users:
+                    print(f"    - {user}: {self.user_commit_count[user]} 个提交")
+            else:
+                print(f"  警告: 没有找到匹配的用户。请检查用户名是否正确。")
+                print(f"  您指定的用户: {', '.join(user_names)}")
+                print(f"  实际的提交作者: {', '.join(unique_authors)}")
+                if self.fuzzy_match:
+                    print("  提示: 已启用模糊匹配，但仍未找到匹配。尝试调整用户名以匹配提交者名称。")
+        else:
+            print("  没有找到任何提交作者信息")
+
+def _merge_branch_commits(stats, repo_path, branch_name, commits, seen_commits, user_names, fuzzy_match, matcher,
+                          commit_table=None, branch_index=0, raw_sink=None, diff_filter=None):
+    """Merge all commits of one branch at once, see ``BranchMerger``"""
+    merger = BranchMerger(stats, repo_path, branch_name, seen_commits, user_names, fuzzy_match, matcher,
+                          commit_table, branch_index, raw_sink, diff_filter)
+    merger.add(commits)
+    merger.finish()
+
+class PageChannel:
+    """
+    Bounded hand-off of one branch's commit pages from a worker thread to
+    the merging thread
+
+    The worker blocks once ``max_pages`` pages are waiting, so a branch that
+    is fetched ahead of its turn holds at most that many pages in memory.
+    ``cancel`` releases a blocked worker when the merge stops early.
+    """
+
+    def __init__(self, max_pages):
+        self._queue = queue.Queue(max(1, max_pages))
+        self._cancelled = threading.Event()
+        self.errors = []
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(self, iter_pages):
+        """
+        Worker side: forward every page of ``iter_pages(errors=...)``
+
+        Args:
+            iter_pages (callable): Takes the error list as ``errors`` and
+                returns an iterator over pages of commit records
+        """
+        pages = None
+        try:
+            pages = iter_pages(errors=self.errors)
+            for page in pages:
+                if not self._put(("page", page)):
+                    return
+            self._put(("done", None))
+        except Exception as e:
+            self._put(("error", e))
+        finally:
+            if pages is not None and hasattr(pages, "close"):
+                pages.close()
+
+    def __iter__(self):
+        """Merging side: yield the pages in order; re-raises a worker error"""
+        while True:
+            kind, value = self._queue.get()
+            if kind == "page":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+
+    def cancel(self):
+        self._cancelled.set()
+
+def get_commit_statistics(gitlab_url, gitlab_token, repo_paths, user_names, start_date, end_date, fuzzy_match=True, max_branches=5, max_concurrency=None, use_cache=True, incremental=False, interactive=True, allow_missing=False, list_projects=False, backend='api', scan_errors=None, commit_table=None,
+                          raw_sink=None, diff_filter=None, group_paths=None, metrics=None, checkpoint=None,
+                          scan_state=None, resolve_identities=None):
+    """
+    Get commit statistics from GitLab repositories
+    
+    Project resolution, branch listing and commit fetching run on a bounded
+    thread pool; results are merged into the statistics dictionary by the
+    main thread in repository/branch order.
+    
+    Args:
+        gitlab_url (str): GitLab server URL
+        gitlab_token (str): GitLab access token
+        repo_paths (list): List of repository paths to analyze
+        user_names (list): List of user names to track
+        start_date (str): Start date in format 'YYYY-MM-DD'
+        end_date (str): End date in format 'YYYY-MM-DD'
+        fuzzy_match (bool): Whether to use fuzzy matching for user names
+        max_branches (int): Maximum number of active branches to analyze
+        max_concurrency (int): Maximum number of concurrent API requests
+            (default: MAX_CONCURRENCY from config)
+        use_cache (bool): Whether to read and write the local commit cache
+        incremental (bool): Whether to request only commits newer than each
+            branch's cached high-water mark (requires ``use_cache``)
+        interactive (bool): Whether the user may be prompted; when False the
+            run never reads from stdin
+        allow_missing (bool): In non-interactive mode, skip repositories that
+            cannot be resolved instead of failing the whole run
+        list_projects (bool): Whether to print the list of available projects
+            first (enumerates every project unless the project index is fresh)
+        backend (str): 'api' to read commits through the REST API, or 'git'
+            to fetch each project into a local clone and parse
+            ``git log --numstat``. With the git backend, repository paths
+            that are local git directories are read in place without
+            connecting to GitLab.
+        scan_errors (list): Optional list that receives a message for every
+            branch or commit that could not be fetched, so callers can tell
+            that the statistics are incomplete
+        commit_table (CommitTable): Optional flat table that receives one row
+            per (commit, branch) of the tracked users, for ``export_to_excel``
+        raw_sink (ParquetSink): Optional sink receiving every scanned commit
+            as a raw row; the caller closes it
+        diff_filter (DiffFilter): Optional per-file attribution, path filter
+            and outlier threshold applied to the tracked users' commits
+        group_paths (list): Optional group paths whose projects, including
+            those of subgroups, are scanned in addition to ``repo_paths``;
+            projects without activity since ``start_date`` are skipped
+        metrics (RunMetrics): Optional metrics collector receiving phase
+            timings, per-endpoint API latencies, counters and cache hit rates
+        checkpoint (ScanCheckpoint): Optional journal; completed branches are
+            appended to it, and branches it already holds are replayed
+            instead of fetched
+        scan_state (dict): Optional dict receiving the state needed to keep
+            merging new commits later: ``matcher``, ``projects`` (path ->
+            project), ``branches`` (path -> branch names), ``seen_commits``
+            (path -> SHAs) and ``branch_commits`` ((path, branch) -> SHAs)
+        resolve_identities (bool): Whether authors are first matched by email
+            through the persistent ``IdentityStore``, after refreshing its
+            GitLab accounts of the tracked users (default:
+            IDENTITY_RESOLUTION from config, off); ignored without
+            ``use_cache``, since the table lives in the cache directory
+    
+    Returns:
+        dict: Statistics per user and repository
+    """
+    if max_concurrency is None:
+        max_concurrency = getattr(config, 'MAX_CONCURRENCY', 8)
+    max_concurrency = max(1, int(max_concurrency))
+    if scan_errors is None:
+        scan_errors = []
+    group_paths = list(group_paths or [])
+    if metrics is None:
+        metrics = RunMetrics()
+    
+    if backend not in ('api', 'git'):
+        print(f"未知的统计后端: {backend}")
+        return None
+    
+    # The git backend reads local repositories directly
+    local_git_dirs = {}
+    if backend == 'git':
+        local_git_dirs = {repo_path: _local_git_dir(repo_path) for repo_path in repo_paths}
+        local_git_dirs = {repo_path: git_dir for repo_path, git_dir in local_git_dirs.items() if git_dir}
+    needs_gitlab = backend == 'api' or len(local_git_dirs) < len(repo_paths) or bool(group_paths)
+    
+    # Connect to GitLab
+    request_counter = ApiRequestCounter()
+    gl = None
+    if needs_gitlab:
+        try:
+            with metrics.phase("connect"):
+                # Keep one pooled connection per worker thread; transient errors are retried
+                session = create_gitlab_session(max_concurrency * 2)
+                session.hooks['response'].append(request_counter)
+                session.hooks['response'].append(metrics)
+                gl = gitlab.Gitlab(gitlab_url, private_token=gitlab_token, session=session,
+                                   timeout=getattr(config, 'HTTP_TIMEOUT', 60))
+                gl.auth()
+            print(f"成功连接到 GitLab，当前用户: {gl.user.name}")
+        except Exception as e:
+            print(f"连接 GitLab 失败: {e}")
+            return None
+    else:
+        print("所有仓库均为本地 git 仓库，无需连接 GitLab")
+    
+    # Convert dates to ISO format for GitLab API
+    try:
+        start_date_iso = datetime.strptime(start_date, '%Y-%m-%d').isoformat()
+        end_date_iso = datetime.strptime(end_date, '%Y-%m-%d').isoformat()
+    except ValueError as e:
+        print(f"日期格式错误: {e}")
+        return None
+    
+    # Locally cached path -> id index used for resolving and searching repositories
+    project_index = ProjectIndex(gl, gitlab_url)
+    index_loaded = gl is not None and use_cache and project_index.load()
+    
+    if list_projects and gl is not None:
+        # List all available projects to help users find correct paths
+        print("\n正在获取可用的仓库列表，这可能需要一些时间...")
+        with metrics.phase("list_projects"):
+            list_available_projects(gl, project_index=project_index if use_cache else None)
+        index_loaded = bool(project_index.projects)
+    
+    if interactive:
+        # Ask if user wants to continue or update repo paths
+        update_repos = input("\n要更新仓库路径吗? (y/n，默认: n): ").lower() == 'y'
+        if update_repos:
+            repos_input = input("请输入新的仓库路径 (用逗号分隔): ")
+            repo_paths = [r.strip() for r in repos_input.split(',')]
+            print(f"已更新仓库路径: {repo_paths}")
+    
+    # Initialize statistics dictionary
+    stats = {user: {"total_commits": 0, "total_additions": 0, "total_deletions": 0, "repos": {}} for user in user_names}
+    
+    # Authors are resolved by email first; GitLab accounts are listed once per tracked user, not per commit
+    if resolve_identities is None:
+        resolve_identities = getattr(config, 'IDENTITY_RESOLUTION', False)
+    if resolve_identities and not use_cache:
+        print("未使用缓存，不使用作者身份表，只按姓名和配置的映射匹配作者")
+        resolve_identities = False
+    identity_store = None
+    identities = None
+    if resolve_identities:
+        try:
+            identity_store = IdentityStore()
+            if gl is not None:
+                with metrics.phase("identities"):
+                    stored = identity_store.refresh(gl, gitlab_url, user_names)
+                if identity_store.lookups:
+                    print(f"已查询 {identity_store.lookups} 个用户的 GitLab 账号，记录 {stored} 个邮箱")
+                metrics.count("identity_lookups", identity_store.lookups)
+            identities = identity_store.resolved()
+            if identities:
+                print(f"作者身份表: {len(identities)} 个邮箱 ({identity_store.path})")
+        except sqlite3.Error as e:
+            print(f"打开作者身份表失败，将只按姓名和配置的映射匹配作者: {e}")
+            identity_store = None
+    
+    # The stores are closed however the scan ends, including early returns
+    commit_cache = None
+    try:
+        # Author matching tables are built once and memoised across repositories
+        matcher = AuthorMatcher(user_names, fuzzy_match, identities=identities,
+                                email_local_part=identity_store is not None)
+        if scan_state is not None:
+            scan_state.update(matcher=matcher, projects={}, branches={}, seen_commits={}, branch_commits={})
+        
+        # Number of commit detail requests issued per batch when the list response has no stats
+        detail_batch_size = getattr(config, 'DETAIL_FETCH_BATCH_SIZE', 20)
+        
+        print(f"\n并发请求数: {max_concurrency}")
+        
+        # Commit statistics never change, so earlier runs' results are reused
+        if backend == 'git':
+            print("统计后端: 本地 git 仓库 (git log --numstat)")
+        elif use_cache:
+            try:
+                commit_cache = CommitCache()
+                print(f"使用提交缓存: {commit_cache.path}")
+                if incremental:
+                    print("增量模式: 仅获取各分支上次统计之后的新提交")
+            except sqlite3.Error as e:
+                print(f"打开提交缓存失败，将不使用缓存: {e}")
+        
+        # Detail requests get their own pool so branch workers never wait on their own pool
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=max_concurrency) as detail_executor:
+            resolve_started = time.perf_counter()
+            # Resolve all projects by path in parallel
+            # Remove leading slash if present
+            repo_paths = [p if p in local_git_dirs else p.lstrip('/') for p in repo_paths]
+            project_futures = []
+            for repo_path in repo_paths:
+                entry = project_index.find(repo_path) if index_loaded else None
+                if repo_path in local_git_dirs:
+                    # Local repositories of the git backend need no resolution
+                    future = Future()
+                    git_dir = local_git_dirs[repo_path]
+                    future.set_result(SimpleNamespace(id=git_dir, path_with_namespace=repo_path, local_dir=git_dir))
+                elif entry is not None:
+                    # Resolved from the index without a request
+                    metrics.count("projects_from_index")
+                    future = Future()
+                    future.set_result(project_index.get_project(entry))
+                else:
+                    future = executor.submit(_get_project, gl, repo_path)
+                project_futures.append(future)
+            
+            # Groups are listed while the repositories are being resolved
+            period_start = _parse_commit_date(start_date_iso)
+            group_futures = [executor.submit(discover_group_projects, gl, group_path, period_start)
+                             for group_path in group_paths]
+            
+            projects = []
+            seen_project_ids = set()
+            resolution_errors = []
+            for repo_path, future in zip(repo_paths, project_futures):
+                print(f"\n处理仓库: {repo_path}")
+                try:
+                    project = future.result()
+                    if project:
+                        print(f"已找到仓库: {project.path_with_namespace} (ID: {project.id})")
+                    else:
+                        # Searching may prompt the user, so it stays sequential
+                        search_index = None
+                        if use_cache:
+                            try:
+                                project_index.ensure()
+                                search_index = project_index
+                            except Exception as e:
+                                print(f"构建仓库索引失败，改用 GitLab 搜索: {e}")
+                        project = _search_project(gl, repo_path, interactive, search_index)
+                except ProjectResolutionError as e:
+                    print(f"错误: {e}")
+                    resolution_errors.append(str(e))
+                    continue
+                except Exception as e:
+                    print(f"查找仓库 {repo_path} 时出错: {e}")
+                    if not interactive:
+                        resolution_errors.append(f"查找仓库 {repo_path} 时出错: {e}")
+                    continue
+                
+                if not project:
+                    print(f"跳过仓库: {repo_path}")
+                    continue
+                
+                if project.id in seen_project_ids:
+                    print(f"仓库 {project.path_with_namespace} 已在列表中，跳过重复项")
+                    continue
+                seen_project_ids.add(project.id)
+                projects.append(project)
+            
+            for group_path, future in zip(group_paths, group_futures):
+                print(f"\n扫描组: {group_path}")
+                try:
+                    group_projects, total = future.result()
+                except ProjectResolutionError as e:
+                    print(f"错误: {e}")
+                    resolution_errors.append(str(e))
+                    continue
+                except Exception as e:
+                    print(f"扫描组 {group_path} 时出错: {e}")
+                    resolution_errors.append(f"扫描组 {group_path} 时出错: {e}")
+                    continue
+                
+                if total is not None:
+                    print(f"组内共 {total} 个项目，其中 {len(group_projects)} 个在 {start_date} 之后有活动")
+                else:
+                    print(f"组内 {len(group_projects)} 个项目在 {start_date} 之后有活动")
+                added = 0
+                for project in group_projects:
+                    if project.id in seen_project_ids:
+                        continue
+                    seen_project_ids.add(project.id)
+                    projects.append(project)
+                    added += 1
+                if added < len(group_projects):
+                    print(f"其中 {len(group_projects) - added} 个项目已在列表中，跳过重复项")
+            
+            if resolution_errors and not allow_missing:
+                print(f"\n{len(resolution_errors)} 个仓库无法解析，已停止统计:")
+                for error in resolution_errors:
+                    print(f"  - {error}")
+                print("请使用完整的仓库路径，或使用 --allow-missing 跳过无法解析的仓库")
+                return None
+            metrics.add_phase_time("resolve_projects", time.perf_counter() - resolve_started)
+            metrics.count("projects", len(projects))
+            if scan_state is not None:
+                scan_state["projects"].update((project.path_with_namespace, project) for project in projects)
+            
+            # List branches of all projects in parallel (the git backend fetches its clones first)
+            if backend == 'git':
+                branch_futures = [
+                    executor.submit(_prepare_git_repository, project, max_branches, gitlab_url, gitlab_token)
+                    for project in projects
+                ]
+            else:
+                # Branches journaled by an interrupted run are reused as they were
+                branch_futures = [
+                    None if checkpoint is not None and checkpoint.branches(project.path_with_namespace) is not None
+                    else executor.submit(_list_active_branches, project, max_branches, period_start, commit_cache)
+                    for project in projects
+                ]
+            
+            # Branches are scanned ahead of the merge, but only a bounded number at a time
+            max_in_flight = max(1, int(getattr(config, 'MAX_BRANCHES_IN_FLIGHT', None) or max_concurrency))
+            page_buffer = max(1, int(getattr(config, 'BRANCH_READ_AHEAD_PAGES', 256)))
+            
+            def scan_items():
+                """Yield ("repo", ...) and ("branch", ...) items in merge order"""
+                for project, future in zip(projects, branch_futures):
+                    # Update repo_path to the actual path_with_namespace
+                    repo_path = project.path_with_namespace
+                    try:
+                        with metrics.phase("list_branches"):
+                            if backend == 'git':
+                                git_dir, active_branches = future.result()
+                            elif future is not None:
+                                active_branches = future.result()
+                    except Exception as e:
+                        print(f"获取仓库 {repo_path} 的分支时出错: {e}")
+                        scan_errors.append(f"获取仓库 {repo_path} 的分支时出错: {e}")
+                        continue
+                    
+                    if checkpoint is not None:
+                        saved_branches = checkpoint.branches(repo_path)
+                        if saved_branches is None:
+                            checkpoint.record_branches(repo_path, [branch.name for branch in active_branches])
+                        else:
+                            active_branches = [SimpleNamespace(name=name) for name in saved_branches]
+                    
+                    metrics.count("branches", len(active_branches))
+                    commit_index = CommitIndex(project, commit_cache)
+                    if backend == 'git':
+                        load_files = partial(load_git_commit_files, git_dir)
+                    else:
+                        load_files = partial(load_commit_files, project, commit_cache=commit_cache, executor=detail_executor)
+                    yield "repo", repo_path, [branch.name for branch in active_branches], load_files
+                    for branch_index, branch in enumerate(active_branches):
+                        if checkpoint is not None and checkpoint.has_unit(repo_path, branch.name):
+                            # Completed before the interruption; replayed from the checkpoint
+                            yield "branch", repo_path, branch.name, branch_index, None
+                        elif backend == 'git':
+                            yield "branch", repo_path, branch.name, branch_index, partial(
+                                iter_git_branch_pages, git_dir, branch.name, start_date_iso, end_date_iso)
+                        else:
+                            yield "branch", repo_path, branch.name, branch_index, partial(
+                                iter_branch_commits,
+                                project,
+                                branch.name,
+                                start_date_iso,
+                                end_date_iso,
+                                batch_size=detail_batch_size,
+                                commit_index=commit_index,
+                                executor=detail_executor,
+                                incremental=incremental
+                            )
+            
+            items = scan_items()
+            window = deque()
+            in_flight = 0
+            
+            def fill_window():
+                """Start branch scans until ``max_in_flight`` of them are ahead of the merge"""
+                nonlocal in_flight
+                while in_flight < max_in_flight:
+                    item = next(items, None)
+                    if item is None:
+                        return
+                    channel = None
+                    if item[0] == "branch" and item[4] is not None:
+                        channel = PageChannel(page_buffer)
+                        executor.submit(channel.run, item[4])
+                        in_flight += 1
+                    window.append((item, channel))
+            
+            # Merge results in repository/branch order as they arrive
+            seen_commits = set()
+            load_files = None
+            channel = None
+            try:
+                fill_window()
+                while window:
+                    item, channel = window.popleft()
+                    if channel is not None:
+                        in_flight -= 1
+                    fill_window()
+                    
+                    if item[0] == "repo":
+                        _, repo_path, branch_names, load_files = item
+                        print(f"\n仓库 {repo_path}: 分析 {len(branch_names)} 个分支: {', '.join(branch_names)}")
+                        
+                        # Initialize repo stats for each user
+                        for user in user_names:
+                            stats[user]["repos"][repo_path] = {
+                                "commits": 0,
+                                "additions": 0,
+                                "deletions": 0,
+                                "branches": {}
+                            }
+                        
+                        # SHAs of every commit already counted on another branch of this repo
+                        seen_commits = set()
+                        if scan_state is not None:
+                            scan_state["branches"][repo_path] = branch_names
+                            scan_state["seen_commits"][repo_path] = seen_commits
+                        continue
+                    
+                    _, repo_path, branch_name, branch_index, _ = item
+                    print(f"分析分支: {branch_name}")
+                    
+                    # Initialize branch stats for each user
+                    for user in user_names:
+                        stats[user]["repos"][repo_path]["branches"][branch_name] = {
+                            "commits": 0,
+                            "additions": 0,
+                            "deletions": 0
+                        }
+                    
+                    # Raw rows of replayed units were written by the interrupted run
+                    merger = BranchMerger(stats, repo_path, branch_name, seen_commits, user_names, fuzzy_match, matcher,
+                                          commit_table, branch_index, raw_sink if channel is not None else None,
+                                          diff_filter)
+                    branch_commit_ids = set() if scan_state is not None else None
+                    
+                    if channel is None:
+                        resumed = 0
+                        for commits, diff_snapshot in checkpoint.unit_pages(repo_path, branch_name):
+                            if diff_filter is not None:
+                                diff_filter.restore(repo_path, diff_snapshot)
+                            with metrics.phase("merge"):
+                                merger.add(commits)
+                            resumed += len(commits)
+                            if branch_commit_ids is not None:
+                                branch_commit_ids.update(commit.id for commit in commits)
+                        print(f"从检查点恢复 {resumed} 个提交")
+                        metrics.count("units_resumed")
+                    else:
+                        errors = []
+                        unit_id = checkpoint.new_unit() if checkpoint is not None else None
+                        pages = iter(channel)
+                        try:
+                            while True:
+                                with metrics.phase("fetch_commits"):
+                                    commits = next(pages, None)
+                                if commits is None:
+                                    break
+                                metrics.count("commits_scanned", len(commits))
+                                
+                                diff_snapshot = None
+                                if diff_filter is not None:
+                                    outlier_start = len(diff_filter.outliers)
+                                    with metrics.phase("fetch_diffs"):
+                                        diff_errors = diff_filter.prepare(repo_path, commits, matcher, load_files)
+                                    for error in diff_errors:
+                                        print(error)
+                                        scan_errors.append(f"仓库 {repo_path} 分支 {branch_name}: {error}")
+                                    errors.extend(diff_errors)
+                                    diff_snapshot = diff_filter.snapshot(commits, outlier_start)
+                                
+                                if unit_id is not None:
+                                    with metrics.phase("checkpoint"):
+                                        checkpoint.record_page(unit_id, commits, diff_snapshot)
+                                with metrics.phase("merge"):
+                                    merger.add(commits)
+                                if branch_commit_ids is not None:
+                                    branch_commit_ids.update(commit.id for commit in commits)
+                        except Exception as e:
+                            # Pages merged before the failure stay in the statistics; the
+                            # worker may still be blocked on pages nobody will read
+                            channel.cancel()
+                            print(f"获取分支 {branch_name} 的提交时出错: {e}")
+                            scan_errors.append(f"仓库 {repo_path} 分支 {branch_name}: 获取提交时出错: {e}")
+                            errors.append(str(e))
+                        
+                        for error in channel.errors:
+                            print(error)
+                            scan_errors.append(f"仓库 {repo_path} 分支 {branch_name}: {error}")
+                        errors.extend(channel.errors)
+                        
+                        # Incomplete branches are not journaled so a resumed run retries them
+                        if unit_id is not None and not errors:
+                            with metrics.phase("checkpoint"):
+                                parquet_files = raw_sink.finish_unit() if raw_sink is not None else None
+                                checkpoint.record_unit(repo_path, branch_name, unit_id, parquet_files)
+                                if parquet_files:
+                                    raw_sink.publish(parquet_files)
+                        elif unit_id is not None and raw_sink is not None:
+                            raw_sink.discard_unit()
+                    
+                    merger.finish()
+                    if scan_state is not None:
+                        scan_state["branch_commits"][(repo_path, branch_name)] = branch_commit_ids
+            finally:
+                # Release workers still blocked on their page buffers, including
+                # the branch being merged when the loop was interrupted
+                if channel is not None:
+                    channel.cancel()
+                for _, pending in window:
+                    if pending is not None:
+                        pending.cancel()
+        
+        # Print name mappings if fuzzy matching was used
+        if fuzzy_match and matcher.author_matches:
+            print("\n===== 用户名匹配结果 =====")
+            for author, user in matcher.author_matches.items():
+                print(f"提交作者 '{author}' -> 匹配到用户 '{user}'")
+        
+        if diff_filter is not None and diff_filter.outliers:
+            print(f"\n{len(diff_filter.outliers)} 个提交的变更行数超过 {diff_filter.max_commit_lines} 行，未计入统计")
+        
+        if gl is not None:
+            print(f"\n本次运行共发起 {request_counter.count} 次 GitLab API 请求")
+            if session.retries or session.throttled_seconds >= 1:
+                print(f"重试 {session.retries} 次，各线程累计限流等待 {session.throttled_seconds:.1f} 秒")
+            metrics.count("http_retries", session.retries)
+            metrics.count("throttled_seconds", round(session.throttled_seconds, 3))
+        metrics.count("scan_errors", len(scan_errors))
+        if scan_errors:
+            print(f"\n警告: {len(scan_errors)} 个分支或提交在重试后仍获取失败，统计结果不完整")
+        if commit_cache is not None:
+            print(f"提交缓存: 命中 {commit_cache.hits} 个，未命中 {commit_cache.misses} 个")
+            metrics.set_cache("commits", commit_cache.hits, commit_cache.misses)
+            metrics.set_cache("commit_files", commit_cache.file_hits, commit_cache.file_misses)
+            metrics.set_cache("branch_lists", commit_cache.branch_list_hits, commit_cache.branch_list_misses)
+        if identity_store is not None:
+            try:
+                identity_store.record_matches(matcher.identity_matches)
+            except sqlite3.Error as e:
+                print(f"保存作者匹配结果失败: {e}")
+    finally:
+        if commit_cache is not None:
+            commit_cache.close()
+        if identity_store is not None:
+            identity_store.close()
+    
+    return stats
+
+ScanShard = namedtuple('ScanShard', ['index', 'url', 'prefix', 'repo_paths'])
+
+# Access token of a shard worker process, assigned by _init_shard_worker
+_shard_token = None
+
+def _init_shard_worker(token_queue):
+    """Take one access token from the pool for the lifetime of a worker process"""
+    global _shard_token
+    if not hasattr(config, 'GITLAB_URL'):
+        # Worker processes started with "spawn" re-import this module
+        load_config(required=False)
+    _shard_token = token_queue.get()
+
+def _shard_checkpoint_key(checkpoint_key, shard):
+    """Checkpoint key of one shard: the run key plus the shard's instance and projects"""
+    data = "\n".join([checkpoint_key, shard.url] + list(shard.repo_paths))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def _scan_shard(shard, options):
+    """
+    Scan the projects of one shard in a worker process
+
+    Runs ``get_commit_statistics`` non-interactively with the worker's own
+    GitLab client and token and returns the partial results for
+    ``merge_statistics``.
+
+    Args:
+        shard (ScanShard): Instance URL, repository prefix and projects
+        options (dict): Scan options shared by all shards
+
+    Returns:
+        dict: ``stats`` (None if the shard failed), ``scan_errors``,
+        ``commit_table``, ``path_stats``, ``outliers``, ``metrics`` and the
+        shard's ``checkpoint_path``
+    """
+    metrics = RunMetrics()
+    scan_errors = []
+    commit_table = CommitTable()
+    diff_filter = options["diff_filter"]
+    raw_sink = None
+    if options["parquet_dir"]:
+        raw_sink = ParquetSink(options["parquet_dir"], options["parquet_chunk_size"])
+    checkpoint = None
+    if options["checkpoint_key"] is not None:
+        checkpoint = open_checkpoint(_shard_checkpoint_key(options["checkpoint_key"], shard), options["resume"])
+        if checkpoint.resumed:
+            print(f"分片 {shard.index + 1}: 从检查点继续，已完成 {checkpoint.completed_units} 个分支")
+        if raw_sink is not None:
+            raw_sink.stage(checkpoint.key, checkpoint.parquet_files)
+    
+    stats = get_commit_statistics(
+        shard.url,
+        _shard_token,
+        list(shard.repo_paths),
+        options["user_names"],
+        options["start_date"],
+        options["end_date"],
+        options["fuzzy_match"],
+        options["max_branches"],
+        max_concurrency=options["max_concurrency"],
+        use_cache=options["use_cache"],
+        incremental=options["incremental"],
+        interactive=False,
+        allow_missing=options["allow_missing"],
+        list_projects=options["list_projects"] and shard.index == 0,
+        backend=options["backend"],
+        scan_errors=scan_errors,
+        commit_table=commit_table,
+        raw_sink=raw_sink,
+        diff_filter=diff_filter,
+        metrics=metrics,
+        checkpoint=checkpoint,
+        resolve_identities=options["resolve_identities"]
+    )
+    if checkpoint is not None:
+        checkpoint.close()
+    if raw_sink is not None:
+        raw_sink.close()
+        metrics.count("parquet_rows", raw_sink.rows_written)
+    return {
+        "prefix": shard.prefix,
+        "stats": stats,
+        "scan_errors": scan_errors,
+        "commit_table": commit_table,
+        "path_stats": diff_filter.path_stats if diff_filter is not None else {},
+        "outliers": diff_filter.outliers if diff_filter is not None else [],
+        "metrics": metrics,
+        "checkpoint_path": checkpoint.path if checkpoint is not None else None,
+    }
+
+def merge_statistics(results, user_names, commit_table=None, scan_errors=None, diff_filter=None):
+    """
+    Combine the partial results of sharded scans
+
+    Shards hold contiguous slices of the project list and are merged in
+    shard order, so repositories, table rows, path statistics and outliers
+    come out in the same order as in a single-process scan. Repository
+    paths get the shard's instance prefix; a repository that already came
+    from an earlier shard is skipped, like a duplicate project in one scan.
+
+    Args:
+        results (list): ``_scan_shard`` results in shard order
+        user_names (list): Tracked users
+        commit_table (CommitTable): Optional table receiving the shards' rows
+        scan_errors (list): Optional list receiving the shards' errors
+        diff_filter (DiffFilter): Optional filter receiving the shards' path
+            statistics and outliers
+
+    Returns:
+        dict: Statistics per user and repository
+    """
+    stats = {user: {"total_commits": 0, "total_additions": 0, "total_deletions": 0, "repos": {}} for user in user_names}
+    seen_repos = set()
+    for result in results:
+        prefix = result["prefix"]
+        if scan_errors is not None:
+            scan_errors.extend(f"{prefix}{error}" for error in result["scan_errors"])
+        if not result["stats"]:
+            continue
+        
+        # Every user has an entry for every scanned repository
+        repo_names = {}
+        for repo_path in next(iter(result["stats"].values()))["repos"]:
+            name = prefix + repo_path
+            repo_names[repo_path] = None if name in seen_repos else name
+            seen_repos.add(name)
+        
+        for user, user_stats in result["stats"].items():
+            target = stats[user]
+            for repo_path, repo_stats in user_stats["repos"].items():
+                name = repo_names[repo_path]
+                if name is None:
+                    continue
+                target["repos"][name] = repo_stats
+                # User totals are the sums of the repository totals
+                target["total_commits"] += repo_stats["commits"]
+                target["total_additions"] += repo_stats["additions"]
+                target["total_deletions"] += repo_stats["deletions"]
+        
+        if commit_table is not None:
+            commit_table.extend(result["commit_table"], repo_names)
+        if diff_filter is not None:
+            for (user, repo_path, path), values in result["path_stats"].items():
+                name = repo_names.get(repo_path)
+                if name is not None:
+                    totals = diff_filter.path_stats.setdefault((user, name, path), [0, 0, 0])
+                    for position, value in enumerate(values):
+                        totals[position] += value
+            for outlier in result["outliers"]:
+                name = repo_names.get(outlier[0])
+                if name is not None:
+                    diff_filter.outliers.append((name,) + tuple(outlier[1:]))
+    return stats
+
+def _expand_group_projects(instance, start_date, allow_missing, metrics=None):
+    """
+    List the active projects of an instance's groups in the parent process,
+    so the projects can be spread over the shards
+
+    Returns:
+        list: Repository paths (explicit repositories first), or None if a
+        group could not be read and ``allow_missing`` is not set
+    """
+    repo_paths = [repo_path.lstrip('/') for repo_path in instance["repo_paths"]]
+    if not instance["group_paths"]:
+        return repo_paths
+    session = create_gitlab_session(4)
+    if metrics is not None:
+        session.hooks['response'].append(metrics)
+    gl = gitlab.Gitlab(instance["url"], private_token=instance["tokens"][0],
+                       session=session, timeout=getattr(config, 'HTTP_TIMEOUT', 60))
+    since = _parse_commit_date(datetime.strptime(start_date, '%Y-%m-%d').isoformat())
+    known = set(repo_paths)
+    for group_path in instance["group_paths"]:
+        print(f"\n扫描组: {instance['prefix']}{group_path}")
+        try:
+            group_projects, total = discover_group_projects(gl, group_path, since)
+        except Exception as e:
+            print(f"扫描组 {group_path} 时出错: {e}")
+            if not allow_missing:
+                print("请检查组路径，或使用 --allow-missing 跳过无法读取的组")
+                return None
+            continue
+        if total is not None:
+            print(f"组内共 {total} 个项目，其中 {len(group_projects)} 个在 {start_date} 之后有活动")
+        else:
+            print(f"组内 {len(group_projects)} 个项目在 {start_date} 之后有活动")
+        for project in group_projects:
+            if project.path_with_namespace not in known:
+                known.add(project.path_with_namespace)
+                repo_paths.append(project.path_with_namespace)
+    return repo_paths
+
+def scan_sharded(params, options, instances, scan_errors, commit_table, diff_filter=None, metrics=None,
+                 checkpoint_paths=None):
+    """
+    Scan projects in parallel worker processes, one access token per process
+
+    The projects of every instance (explicit repositories plus the active
+    projects of its groups) are cut into contiguous shards, about
+    ``SHARDS_PER_TOKEN`` per token, so slow projects do not leave the other
+    workers idle. Each worker process owns one token of its instance and
+    scans shards with its own GitLab client, so the scan is bounded by the
+    combined rate limit of all tokens. The partial results are merged with
+    ``merge_statistics`` in shard order.
+
+    Args:
+        params (dict): Run parameters (dates, users, matching options)
+        options (dict): Scan options for ``_scan_shard``
+        instances (list): Instances from ``get_scan_instances``
+        scan_errors (list): Receives the errors of all shards
+        commit_table (CommitTable): Receives the rows of all shards
+        diff_filter (DiffFilter): Optional filter; each shard uses a copy and
+            the results are merged back into it
+        metrics (RunMetrics): Optional collector receiving the shards' metrics
+        checkpoint_paths (list): Optional list receiving the shards'
+            checkpoint files
+
+    Returns:
+        dict: Statistics per user and repository, or None if the projects
+        could not be determined
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    
+    if metrics is None:
+        metrics = RunMetrics()
+    shards_per_token = max(1, getattr(config, 'SHARDS_PER_TOKEN', 4))
+    
+    plans = []
+    with metrics.phase("list_groups"):
+        for instance in instances:
+            repo_paths = _expand_group_projects(instance, params['start_date'], options["allow_missing"], metrics)
+            if repo_paths is None:
+                return None
+            plans.append((instance, repo_paths))
+    
+    shards = []
+    instance_shards = []
+    for instance, repo_paths in plans:
+        count = min(len(repo_paths), len(instance["tokens"]) * shards_per_token)
+        bounds = [round(i * len(repo_paths) / count) for i in range(count + 1)] if count else [0]
+        first = len(shards)
+        for start, end in zip(bounds, bounds[1:]):
+            shards.append(ScanShard(len(shards), instance["url"], instance["prefix"], tuple(repo_paths[start:end])))
+        instance_shards.append((instance, shards[first:]))
+    
+    print(f"\n分片统计: {len(instances)} 个 GitLab 实例，"
+          f"{sum(len(instance['tokens']) for instance in instances)} 个访问令牌，"
+          f"{sum(len(plan[1]) for plan in plans)} 个仓库，{len(shards)} 个分片")
+    
+    options = dict(options, user_names=params['user_names'], start_date=params['start_date'],
+                   end_date=params['end_date'], fuzzy_match=params['fuzzy_match'],
+                   max_branches=params['max_branches'], diff_filter=diff_filter)
+    futures = []
+    pools = []
+    try:
+        with metrics.phase("shards"):
+            for instance, shard_list in instance_shards:
+                if not shard_list:
+                    continue
+                workers = min(len(instance["tokens"]), len(shard_list))
+                token_queue = multiprocessing.Queue()
+                for token in instance["tokens"][:workers]:
+                    token_queue.put(token)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                                           initargs=(token_queue,))
+                pools.append(pool)
+                futures.extend((shard, pool.submit(_scan_shard, shard, options)) for shard in shard_list)
+            
+            results = []
+            for shard, future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"分片 {shard.index + 1} 执行失败: {e}")
+                    scan_errors.append(f"分片 {shard.index + 1} ({shard.prefix}{', '.join(shard.repo_paths)}) 执行失败: {e}")
+    finally:
+        for pool in pools:
+            pool.shutdown()
+    
+    if any(result["stats"] is None for result in results):
+        # A shard stopped on repositories that could not be resolved
+        return None
+    
+    with metrics.phase("merge"):
+        stats = merge_statistics(results, params['user_names'], commit_table, scan_errors, diff_filter)
+    for result in results:
+        metrics.merge(result["metrics"])
+        if checkpoint_paths is not None and result["checkpoint_path"]:
+            checkpoint_paths.append(result["checkpoint_path"])
+    metrics.count("shards", len(shards))
+    return stats
+
+def scale_values(values, scale_factor):
+    """
+    Vectorised ``apply_scale_factor`` for a pandas Series
+
+    Args:
+        values (pandas.Series): Original values
+        scale_factor (float): Scale factor
+
+    Returns:
+        pandas.Series: Scaled non-negative integers
+    """
+    if scale_factor == 0 or scale_factor == 1:
+        return values
+    if scale_factor > 0:
+        scaled = values * scale_factor
+    else:
+        scaled = values / abs(scale_factor)
+    return scaled.round().clip(lower=0).astype('int64')
+
+def _summary_frame(frame, key_columns, scale_factor):
+    """
+    Apply the scale factor to an aggregated frame and rename it for the report
+
+    ``frame`` holds the key columns plus commits/additions/deletions. The
+    change column is computed from the already scaled additions and
+    deletions and then scaled again, exactly as the per-value export did.
+    """
+    result = frame[key_columns].copy()
+    result["commits"] = scale_values(frame["commits"], scale_factor)
+    result["additions"] = scale_values(frame["additions"], scale_factor)
+    result["deletions"] = scale_values(frame["deletions"], scale_factor)
+    result["changes"] = scale_values(result["additions"] + result["deletions"], scale_factor)
+    return result.reset_index(drop=True)
+
+REPORT_COLUMNS = {
+    "user": "用户",
+    "repo": "仓库",
+    "branch": "分支",
+}
+
+def _commit_frame(stats, commit_table):
+    """Return the commit table as a frame whose users follow the order of ``stats``"""
+    df = commit_table.to_frame()
+    # Report users in the order they were requested
+    df["user"] = df["user"].cat.set_categories(list(stats))
+    return df
+
+def _aggregate_commit_table(df):
+    """
+    Aggregate a commit frame into user, repository and branch frames
+
+    Args:
+        df (pandas.DataFrame): Frame from ``_commit_frame``
+
+    Returns:
+        tuple: (user_frame, repo_frame, branch_frame) with unscaled commits,
+        additions and deletions
+    """
+    aggregations = {
+        "commits": ("sha", "size"),
+        "additions": ("additions", "sum"),
+        "deletions": ("deletions", "sum"),
+    }
+    totals = df[df["first_in_repo"]]
+    user_frame = totals.groupby("user", observed=False).agg(**aggregations).reset_index()
+    repo_frame = totals.groupby(["user", "repo"], observed=True).agg(**aggregations).reset_index()
+    branch_frame = df.groupby(["user", "repo", "branch_index"], observed=True).agg(
+        branch=("branch", "first"), **aggregations
+    ).reset_index()
+    return user_frame, repo_frame, branch_frame
+
+def _flatten_statistics(stats):
+    """
+    Flatten the nested statistics dictionary into user, repository and branch
+    frames (repositories and branches without commits are left out)
+
+    Returns:
+        tuple: (user_frame, repo_frame, branch_frame)
+    """
+    user_frame = pd.DataFrame(
+        [(user, s["total_commits"], s["total_additions"], s["total_deletions"]) for user, s in stats.items()],
+        columns=["user", "commits", "additions", "deletions"]
+    )
+    repo_frame = pd.DataFrame(
+        [(user, repo, r["commits"], r["additions"], r["deletions"])
+         for user, s in stats.items() for repo, r in s["repos"].items() if r["commits"] > 0],
+        columns=["user", "repo", "commits", "additions", "deletions"]
+    )
+    branch_frame = pd.DataFrame(
+        [(user, repo, branch, b["commits"], b["additions"], b["deletions"])
+         for user, s in stats.items() for repo, r in s["repos"].items()
+         for branch, b in r["branches"].items() if b["commits"] > 0],
+        columns=["user", "repo", "branch", "commits", "additions", "deletions"]
+    )
+    return user_frame, repo_frame, branch_frame
+
+TIME_BUCKETS = {
+    "day": ("D", "按日"),
+    "week": ("W", "按周"),
+    "month": ("M", "按月"),
+}
+
+def _aggregate_time_buckets(df, time_bucket):
+    """
+    Aggregate a commit frame per period, per user and per repository
+
+    Commit timestamps are converted to UTC before bucketing. Each commit is
+    counted once per repository, like the user and repository totals. Weekly
+    periods run Monday to Sunday and are labelled ``YYYY-MM-DD/YYYY-MM-DD``.
+
+    Args:
+        df (pandas.DataFrame): Frame from ``_commit_frame``
+        time_bucket (str): "day", "week" or "month"
+
+    Returns:
+        tuple: (user_period_frame, repo_period_frame) with unscaled commits,
+        additions and deletions
+    """
+    frequency = TIME_BUCKETS[time_bucket][0]
+    df = df[df["first_in_repo"]].copy()
+    committed_at = pd.to_datetime(df["committed_date"], utc=True, errors='coerce')
+    df["period"] = committed_at.dt.tz_convert(None).dt.to_period(frequency).astype(str)
+    
+    aggregations = {
+        "commits": ("sha", "size"),
+        "additions": ("additions", "sum"),
+        "deletions": ("deletions", "sum"),
+    }
+    user_frame = df.groupby(["user", "period"], observed=True).agg(**aggregations).reset_index()
+    repo_frame = df.groupby(["user", "repo", "period"], observed=True).agg(**aggregations).reset_index()
+    return user_frame, repo_frame
+
+def _path_frames(stats, diff_filter):
+    """
+    Build the unscaled path statistics and outlier frames of a diff filter
+
+    Path rows follow the user order of ``stats`` and the repository order of
+    the scan, paths sorted alphabetically within a repository.
+
+    Returns:
+        tuple: (path_frame, outlier_frame)
+    """
+    path_frame = pd.DataFrame(
+        [key + tuple(values) for key, values in diff_filter.path_stats.items()],
+        columns=["user", "repo", "path", "commits", "additions", "deletions"]
+    )
+    repo_order = list(dict.fromkeys(path_frame["repo"]))
+    path_frame["user"] = pd.Categorical(path_frame["user"], categories=list(stats))
+    path_frame["repo"] = pd.Categorical(path_frame["repo"], categories=repo_order)
+    path_frame = path_frame.sort_values(["user", "repo", "path"], kind="stable")
+    path_frame["user"] = path_frame["user"].astype(str)
+    path_frame["repo"] = path_frame["repo"].astype(str)
+    
+    outlier_frame = pd.DataFrame(
+        diff_filter.outliers,
+        columns=["repo", "sha", "author", "user", "committed_date", "additions", "deletions"]
+    )
+    return path_frame, outlier_frame
+
+def build_report_frames(stats, scale_factor=1, commit_table=None, time_bucket=None, diff_filter=None,
+                        repo_pivot=False):
+    """
+    Build the report sheets as DataFrames
+
+    With a ``commit_table`` every sheet is a pandas ``groupby`` aggregation
+    of the flat table; otherwise the nested statistics dictionary is
+    flattened. Scaling is applied column-wise in both cases.
+
+    Args:
+        stats (dict): Statistics dictionary
+        scale_factor (float): Scale factor for statistics
+        commit_table (CommitTable): Optional flat commit table of the same scan
+        time_bucket (str): Optional "day", "week" or "month"; adds per-period
+            user and repository sheets (requires ``commit_table``)
+        diff_filter (DiffFilter): Optional diff filter of the same scan; adds
+            the path statistics sheet (in per-file mode) and the outlier sheet
+            (when a threshold is set)
+        repo_pivot (bool): Whether to add a user x repository sheet of the
+            changed lines, pivoted from the repository sheet
+
+    Returns:
+        dict: Sheet name -> DataFrame, in sheet order
+    """
+    # The commit table is converted once and shared by all aggregations
+    commit_frame = _commit_frame(stats, commit_table) if commit_table is not None else None
+    if commit_frame is not None:
+        user_frame, repo_frame, branch_frame = _aggregate_commit_table(commit_frame)
+    else:
+        user_frame, repo_frame, branch_frame = _flatten_statistics(stats)
+    
+    user_df = _summary_frame(user_frame, ["user"], scale_factor).rename(columns={
+        "user": "用户", "commits": "总提交次数", "additions": "总增加行数",
+        "deletions": "总删除行数", "changes": "总变更行数"
+    })
+    value_columns = {"commits": "提交次数", "additions": "增加行数", "deletions": "删除行数", "changes": "变更行数"}
+    repo_df = _summary_frame(repo_frame, ["user", "repo"], scale_factor).rename(
+        columns={**REPORT_COLUMNS, **value_columns})
+    branch_df = _summary_frame(branch_frame, ["user", "repo", "branch"], scale_factor).rename(
+        columns={**REPORT_COLUMNS, **value_columns})
+    
+    # Plain string columns, so the sheets look the same for both sources
+    for frame in (user_df, repo_df, branch_df):
+        for column in ("用户", "仓库", "分支"):
+            if column in frame:
+                frame[column] = frame[column].astype(str)
+    
+    sheets = {
+        "用户汇总": user_df,
+        "仓库详情": repo_df,
+        "分支详情": branch_df,
+    }
+    
+    if repo_pivot:
+        # Users in report order, repositories in scan order
+        pivot = repo_df.pivot_table(index="用户", columns="仓库", values="变更行数", aggfunc="sum",
+                                    fill_value=0, sort=False)
+        sheets["仓库透视"] = pivot.reindex(list(stats), fill_value=0).rename_axis(
+            index="用户", columns=None).reset_index()
+    
+    if time_bucket and commit_frame is not None:
+        label = TIME_BUCKETS[time_bucket][1]
+        user_period_frame, repo_period_frame = _aggregate_time_buckets(commit_frame, time_bucket)
+        period_columns = {**REPORT_COLUMNS, "period": "周期", **value_columns}
+        for sheet_name, frame, keys in (
+            (f"{label}用户统计", user_period_frame, ["user", "period"]),
+            (f"{label}仓库统计", repo_period_frame, ["user", "repo", "period"]),
+        ):
+            period_df = _summary_frame(frame, keys, scale_factor).rename(columns=period_columns)
+            for column in ("用户", "仓库"):
+                if column in period_df:
+                    period_df[column] = period_df[column].astype(str)
+            sheets[sheet_name] = period_df
+    
+    if diff_filter is not None:
+        path_frame, outlier_frame = _path_frames(stats, diff_filter)
+        if diff_filter.per_file:
+            sheets["路径统计"] = _summary_frame(path_frame, ["user", "repo", "path"], scale_factor).rename(
+                columns={**REPORT_COLUMNS, "path": "路径", **value_columns})
+        if diff_filter.max_commit_lines is not None:
+            outlier_df = outlier_frame[["repo", "sha", "author", "user", "committed_date"]].copy()
+            outlier_df["additions"] = scale_values(outlier_frame["additions"], scale_factor)
+            outlier_df["deletions"] = scale_values(outlier_frame["deletions"], scale_factor)
+            sheets["超大提交"] = outlier_df.rename(columns={
+                **REPORT_COLUMNS, "sha": "提交", "author": "提交作者", "committed_date": "提交时间",
+                "additions": "增加行数", "deletions": "删除行数"
+            })
+    
+    return sheets
+
+EXCEL_ENGINES = ("pandas", "streaming")
+
+def _write_streaming_workbook(sheets, output_file):
+    """
+    Write report frames with an openpyxl write-only workbook
+
+    Rows are appended one at a time and flushed to the sheet's temporary file
+    instead of holding an openpyxl cell object per value like
+    ``pd.ExcelWriter``. The report frames themselves are built in full by
+    ``build_report_frames`` beforehand, so memory still grows with the number
+    of report rows; only the workbook's own overhead is avoided.
+
+    Args:
+        sheets (dict): Sheet name -> DataFrame, in sheet order
+        output_file (str): Output Excel file name
+    """
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    for sheet_name, frame in sheets.items():
+        worksheet = workbook.create_sheet(title=sheet_name)
+        worksheet.append([str(column) for column in frame.columns])
+        for row in frame.itertuples(index=False, name=None):
+            # numpy scalars are written as plain Python values; NaN as empty cells
+            worksheet.append([None if pd.isna(value) else value.item() if hasattr(value, "item") else value
+                              for value in row])
+    workbook.save(output_file)
+
+def _write_csv_fallback(sheets, output_file):
+    """
+    Write one CSV per sheet next to ``output_file``
+
+    Files are named ``<output name>_<sheet name>.csv`` and keep the columns of
+    the Excel sheets.
+
+    Returns:
+        list: Paths of the written CSV files
+    """
+    base, _ = os.path.splitext(output_file)
+    paths = []
+    for sheet_name, frame in sheets.items():
+        path = f"{base}_{sheet_name}.csv"
+        frame.to_csv(path, index=False, encoding='utf-8-sig')
+        paths.append(path)
+    return paths
+
+def export_to_excel(stats, output_file="gitlab_statistics.xlsx", scale_factor=1, commit_table=None,
+                    time_bucket=None, diff_filter=None, engine=None, repo_pivot=False):
+    """
+    Export statistics to Excel
+    
+    Args:
+        stats (dict): Statistics dictionary
+        output_file (str): Output Excel file name
+        scale_factor (float): Scale factor for statistics
+        commit_table (CommitTable): Optional flat commit table of the same
+            scan; when given, the sheets are aggregated from it
+        time_bucket (str): Optional "day", "week" or "month" for the extra
+            per-period sheets
+        diff_filter (DiffFilter): Optional diff filter of the same scan for
+            the path and outlier sheets
+        engine (str): "pandas" (``pd.ExcelWriter``) or "streaming" (openpyxl
+            write-only workbook); defaults to ``EXCEL_ENGINE`` of the config
+        repo_pivot (bool): Whether to add the user x repository pivot sheet
+    
+    Returns:
+        str: Path of the workbook, the CSV files written instead, or None
+    """
+    engine = engine or getattr(config, 'EXCEL_ENGINE', 'pandas')
+    sheets = build_report_frames(stats, scale_factor, commit_table, time_bucket, diff_filter, repo_pivot)
+    
+    try:
+        # Export to Excel
+        if engine == "streaming":
+            _write_streaming_workbook(sheets, output_file)
+        else:
+            with pd.ExcelWriter(output_file) as writer:
+                for sheet_name, frame in sheets.items():
+                    frame.to_excel(writer, sheet_name=sheet_name, index=False)
+        
+        if scale_factor != 1:
+            print(f"数据已按比例调整 (缩放因子: {scale_factor})")
+        print(f"统计数据已导出到 {output_file}")
+        return output_file
+    except Exception as e:
+        print(f"导出到Excel时出错: {e}")
+        # Try to save as CSV next to the requested output if Excel export fails
+        try:
+            paths = _write_csv_fallback(sheets, output_file)
+            print("由于Excel导出失败，已将数据保存为CSV文件")
+            return ", ".join(paths)
+        except Exception as csv_e:
+            print(f"保存为CSV时出错: {csv_e}")
+            return None
+
+def validate_statistics(stats):
+    """
+    Validate the generated statistics
+    
+    Args:
+        stats (dict): Statistics dictionary
+    
+    Returns:
+        bool: True if valid, False otherwise
+    """
+    if not stats:
+        return False
+    
+    # Check if any commits were found
+    has_commits = False
+    for user, user_stats in stats.items():
+        if user_stats["total_commits"] > 0:
+            has_commits = True
+            break
+    
+    if not has_commits:
+        print("\n未找到所指定用户的提交数据。可能的原因:")
+        print("1. 日期范围内没有这些用户的提交")
+        print("2. 用户名与提交时使用的名称不完全匹配")
+        print("3. 所选仓库或分支不包含这些用户的提交")
+    
+    return has_commits
+
+class ReportService:
+    """
+    Warm report state of the ``--serve`` mode
+
+    The initial scan runs once; afterwards the statistics, the flat commit
+    table, the author matcher and the per-repository sets of merged commits
+    stay in memory. GitLab push webhooks add the new commits of the pushed
+    branch: the branch is fetched incrementally (only commits newer than its
+    cached high-water mark are requested) and the commits not merged yet go
+    through the same merge as a scan, so the aggregates always equal a fresh
+    run over the same branches. Branches that were not selected by the
+    initial scan are added when they are pushed to.
+
+    Queries are answered from a pandas frame of the commit table that is
+    cached until the next update.
+    """
+
+    GROUP_COLUMNS = {
+        "user": ["user"],
+        "repo": ["user", "repo"],
+        "branch": ["user", "repo", "branch"],
+    }
+
+    def __init__(self, params, max_concurrency=None, use_cache=True, allow_missing=False, diff_filter=None,
+                 scale_factor=1, time_bucket=None, webhook_secret=None, repo_pivot=False, insecure_webhooks=False):
+        """
+        Args:
+            params (dict): Run parameters from ``get_batch_params``
+            max_concurrency (int): Maximum number of concurrent API requests
+            use_cache (bool): Whether to use the local commit cache
+            allow_missing (bool): Skip repositories that cannot be resolved
+            diff_filter (DiffFilter): Optional per-file filter of the report
+            scale_factor (float): Default scale factor of exported reports
+            time_bucket (str): Default per-period sheets of exported reports
+            webhook_secret (str): Expected ``X-Gitlab-Token`` of webhooks;
+                without it webhooks are rejected
+            repo_pivot (bool): Whether exported reports include the pivot sheet
+            insecure_webhooks (bool): Accept webhooks without a token when no
+                ``webhook_secret`` is set
+        """
+        self.params = params
+        self.max_concurrency = max(1, int(max_concurrency or getattr(config, 'MAX_CONCURRENCY', 8)))
+        self.use_cache = use_cache
+        self.allow_missing = allow_missing
+        self.diff_filter = diff_filter
+        self.scale_factor = scale_factor
+        self.time_bucket = time_bucket
+        self.repo_pivot = repo_pivot
+        self.webhook_secret = webhook_secret
+        self.insecure_webhooks = insecure_webhooks
+        self.stats = None
+        self.commit_table = CommitTable()
+        self.scan_errors = []
+        self.state = {}
+        self.commit_cache = None
+        self.executor = None
+        self.updated_at = None
+        self.events = 0
+        self._since = datetime.strptime(params['start_date'], '%Y-%m-%d').isoformat()
+        self._until = datetime.strptime(params['end_date'], '%Y-%m-%d').isoformat()
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def load(self, metrics=None):
+        """
+        Run the initial scan
+
+        Returns:
+            bool: False if the scan failed
+        """
+        self.stats = get_commit_statistics(
+            self.params['gitlab_url'],
+            self.params['gitlab_token'],
+            self.params['repo_paths'],
+            self.params['user_names'],
+            self.params['start_date'],
+            self.params['end_date'],
+            self.params['fuzzy_match'],
+            self.params['max_branches'],
+            max_concurrency=self.max_concurrency,
+            use_cache=self.use_cache,
+            interactive=False,
+            allow_missing=self.allow_missing,
+            scan_errors=self.scan_errors,
+            commit_table=self.commit_table,
+            diff_filter=self.diff_filter,
+            group_paths=self.params['group_paths'],
+            metrics=metrics,
+            scan_state=self.state
+        )
+        if self.stats is None:
+            return False
+        if self.use_cache:
+            try:
+                self.commit_cache = CommitCache()
+            except sqlite3.Error as e:
+                print(f"打开提交缓存失败，将不使用缓存: {e}")
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self.updated_at = datetime.now(timezone.utc)
+        return True
+
+    def handle_push(self, payload):
+        """
+        Apply a GitLab push event
+
+        Args:
+            payload (dict): Webhook payload
+
+        Returns:
+            dict: Outcome of the event (``status`` is "ok" or "ignored")
+        """
+        if payload.get("object_kind") != "push":
+            return {"status": "ignored", "reason": "不是推送事件"}
+        ref = payload.get("ref") or ""
+        if not ref.startswith("refs/heads/"):
+            return {"status": "ignored", "reason": "不是分支推送"}
+        branch_name = ref[len("refs/heads/"):]
+        repo_path = (payload.get("project") or {}).get("path_with_namespace")
+        project = self.state.get("projects", {}).get(repo_path)
+        if project is None:
+            return {"status": "ignored", "reason": f"仓库 {repo_path} 不在统计范围内"}
+        if set(payload.get("after") or "0") == {"0"}:
+            # Commits of a deleted branch stay counted, as in the last scan
+            return {"status": "ignored", "reason": "分支已删除"}
+        
+        # Fetch outside the lock so queries are answered meanwhile
+        commit_index = CommitIndex(project, self.commit_cache)
+        commits, errors = fetch_branch_commits(
+            project, branch_name, self._since, self._until,
+            batch_size=getattr(config, 'DETAIL_FETCH_BATCH_SIZE', 20),
+            commit_index=commit_index,
+            executor=self.executor,
+            incremental=self.commit_cache is not None
+        )
+        
+        user_names = self.params['user_names']
+        with self._lock:
+            known = self.state["branch_commits"].setdefault((repo_path, branch_name), set())
+            new_commits = [commit for commit in commits if commit.id not in known]
+            branches = self.state["branches"].setdefault(repo_path, [])
+            if branch_name not in branches:
+                branches.append(branch_name)
+            for user in user_names:
+                repo_stats = self.stats[user]["repos"].setdefault(
+                    repo_path, {"commits": 0, "additions": 0, "deletions": 0, "branches": {}})
+                repo_stats["branches"].setdefault(branch_name, {"commits": 0, "additions": 0, "deletions": 0})
+            
+            if new_commits:
+                if self.diff_filter is not None:
+                    load_files = partial(load_commit_files, project, commit_cache=self.commit_cache,
+                                         executor=self.executor)
+                    errors = errors + self.diff_filter.prepare(repo_path, new_commits, self.state["matcher"],
+                                                               load_files)
+                _merge_branch_commits(self.stats, repo_path, branch_name, new_commits,
+                                      self.state["seen_commits"].setdefault(repo_path, set()),
+                                      user_names, self.params['fuzzy_match'], self.state["matcher"],
+                                      self.commit_table, branches.index(branch_name), None, self.diff_filter)
+                known.update(commit.id for commit in new_commits)
+                self._frame = None
+            self.scan_errors.extend(f"仓库 {repo_path} 分支 {branch_name}: {error}" for error in errors)
+            self.events += 1
+            self.updated_at = datetime.now(timezone.utc)
+        
+        for error in errors:
+            print(error)
+        return {"status": "ok", "repo": repo_path, "branch": branch_name,
+                "new_commits": len(new_commits), "errors": errors}
+
+    def _commit_frame(self):
+        """Return the cached commit frame with parsed timestamps (call with the lock held)"""
+        if self._frame is None:
+            frame = self.commit_table.to_frame()
+            frame["user"] = frame["user"].cat.set_categories(list(self.stats))
+            frame["committed_at"] = pd.to_datetime(frame["committed_date"], utc=True, errors='coerce')
+            self._frame = frame
+        return self._frame
+
+    def query(self, users=None, repos=None, since=None, until=None, group_by="user", period=None):
+        """
+        Aggregate the tracked users' commits
+
+        Args:
+            users (list): Optional user names to include
+            repos (list): Optional repository paths to include
+            since (str): Optional start date ``YYYY-MM-DD`` (inclusive, UTC)
+            until (str): Optional end date ``YYYY-MM-DD`` (exclusive, UTC)
+            group_by (str): "user", "repo" or "branch"
+            period (str): Optional "day", "week" or "month" to split the
+                rows by period
+
+        Returns:
+            dict: ``rows`` of unscaled commits, additions and deletions, and
+            the ``totals``. Commits on several branches count once, except
+            per branch.
+
+        Raises:
+            ValueError: If a parameter is invalid
+        """
+        if group_by not in self.GROUP_COLUMNS:
+            raise ValueError(f"group_by 必须是 {', '.join(self.GROUP_COLUMNS)} 之一")
+        if period is not None and period not in TIME_BUCKETS:
+            raise ValueError(f"period 必须是 {', '.join(TIME_BUCKETS)} 之一")
+        bounds = []
+        for value in (since, until):
+            try:
+                bounds.append(pd.Timestamp(datetime.strptime(value, '%Y-%m-%d'), tz='UTC') if value else None)
+            except ValueError:
+                raise ValueError(f"日期格式错误: {value} (应为 YYYY-MM-DD)")
+        
+        with self._lock:
+            frame = self._commit_frame()
+            mask = np.ones(len(frame), dtype=bool)
+            if group_by != "branch":
+                mask &= frame["first_in_repo"].to_numpy()
+            if users:
+                mask &= frame["user"].isin(users).to_numpy()
+            if repos:
+                mask &= frame["repo"].isin(repos).to_numpy()
+            if bounds[0] is not None:
+                mask &= (frame["committed_at"] >= bounds[0]).to_numpy()
+            if bounds[1] is not None:
+                mask &= (frame["committed_at"] < bounds[1]).to_numpy()
+            rows = frame[mask]
+            updated_at = self.updated_at
+        
+        columns = list(self.GROUP_COLUMNS[group_by])
+        if period is not None:
+            rows = rows.assign(period=rows["committed_at"].dt.tz_convert(None)
+                               .dt.to_period(TIME_BUCKETS[period][0]).astype(str))
+            columns.append("period")
+        grouped = rows.groupby(columns, observed=True).agg(
+            commits=("sha", "size"), additions=("additions", "sum"), deletions=("deletions", "sum")
+        ).reset_index()
+        result_rows = [
+            {column: value.item() if hasattr(value, 'item') else value for column, value in record.items()}
+            for record in grouped.to_dict(orient="records")
+        ]
+        return {
+            "group_by": group_by,
+            "period": period,
+            "since": since,
+            "until": until,
+            "updated_at": updated_at.isoformat() if updated_at else None,
+            "rows": result_rows,
+            "totals": {
+                "commits": int(len(rows)),
+                "additions": int(rows["additions"].sum()),
+                "deletions": int(rows["deletions"].sum()),
+            },
+        }
+
+    def export(self, scale_factor=None, time_bucket=None):
+        """
+        Build the Excel report of the current state
+
+        Returns:
+            bytes: Contents of the workbook, or None if it could not be written
+        """
+        scale_factor = self.scale_factor if scale_factor is None else scale_factor
+        time_bucket = time_bucket or self.time_bucket
+        with tempfile.TemporaryDirectory(prefix="gitlab-report-") as directory:
+            path = os.path.join(directory, "gitlab_statistics.xlsx")
+            with self._lock:
+                output_file = export_to_excel(self.stats, path, scale_factor, self.commit_table, time_bucket,
+                                              self.diff_filter, repo_pivot=self.repo_pivot)
+            if output_file != path:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+
+    def health(self):
+        with self._lock:
+            return {
+                "status": "ok",
+                "rows": len(self.commit_table),
+                "repositories": len(self.state.get("projects", {})),
+                "events": self.events,
+                "scan_errors": len(self.scan_errors),
+                "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            }
+
+def _make_service_handler(service):
+    """Build the HTTP request handler class of a ``ReportService``"""
+    from http.server import BaseHTTPRequestHandler
+
+    class ReportRequestHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, data):
+            self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                       "application/json; charset=utf-8")
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            first = lambda name: query.get(name, [None])[0]
+            try:
+                if url.path == "/health":
+                    self._send_json(200, service.health())
+                elif url.path == "/stats":
+                    started = time.perf_counter()
+                    result = service.query(
+                        users=_split_list(first("users") or ""),
+                        repos=_split_list(first("repos") or ""),
+                        since=first("since"),
+                        until=first("until"),
+                        group_by=first("group_by") or "user",
+                        period=first("period"),
+                    )
+                    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                    self._send_json(200, result)
+                elif url.path == "/export":
+                    time_bucket = first("time_bucket")
+                    if time_bucket is not None and time_bucket not in TIME_BUCKETS:
+                        raise ValueError(f"time_bucket 必须是 {', '.join(TIME_BUCKETS)} 之一")
+                    scale_factor = first("scale_factor")
+                    content = service.export(float(scale_factor) if scale_factor else None, time_bucket)
+                    if content is None:
+                        self._send_json(500, {"error": "导出 Excel 失败"})
+                        return
+                    self._send(200, content, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                               {"Content-Disposition": 'attachment; filename="gitlab_statistics.xlsx"'})
+                else:
+                    self._send_json(404, {"error": "未知的路径"})
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+            except Exception as e:
+                print(f"处理请求 {url.path} 时出错: {e}")
+                self._send_json(500, {"error": str(e)})
+
+        def do_POST(self):
+            if urllib.parse.urlsplit(self.path).path != "/webhook":
+                self._send_json(404, {"error": "未知的路径"})
+                return
+            if not service.webhook_secret:
+                if not service.insecure_webhooks:
+                    self._send_json(403, {"error": "未设置 WEBHOOK_SECRET，不接受 Webhook 请求"})
+                    return
+            elif not hmac.compare_digest(self.headers.get("X-Gitlab-Token", "").encode('utf-8'),
+                                         service.webhook_secret.encode('utf-8')):
+                self._send_json(401, {"error": "X-Gitlab-Token 不正确"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError:
+                self._send_json(400, {"error": "请求体不是有效的 JSON"})
+                return
+            try:
+                self._send_json(200, service.handle_push(payload))
+            except Exception as e:
+                print(f"处理推送事件时出错: {e}")
+                self._send_json(500, {"error": str(e)})
+
+    return ReportRequestHandler
+
+def serve_reports(service, host, port):
+    """
+    Serve a loaded ``ReportService`` over HTTP until interrupted
+
+    Endpoints:
+        GET /health: state of the service
+        GET /stats: aggregated statistics, see ``ReportService.query``
+            (``users``, ``repos``, ``since``, ``until``, ``group_by``,
+            ``period``)
+        GET /export: the Excel report (``scale_factor``, ``time_bucket``)
+        POST /webhook: GitLab push events
+    """
+    from http.server import ThreadingHTTPServer
+    
+    server = ThreadingHTTPServer((host, port), _make_service_handler(service))
+    print(f"\n统计服务已启动: http://{host}:{server.server_address[1]}")
+    print("接口: GET /stats, GET /export, GET /health, POST /webhook (GitLab 推送事件)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if service.executor is not None:
+            service.executor.shutdown()
+        if service.commit_cache is not None:
+            service.commit_cache.close()
+
+def _split_list(value):
+    """Split a comma separated string into a list of stripped, non-empty items"""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(
+        description="GitLab 代码统计工具",
+        epilog="不带 --batch 运行时会交互式询问参数；带 --batch 时只使用命令行参数和配置文件，不会等待输入。"
+    )
+    parser.add_argument('--batch', action='store_true',
+                        help="非交互模式，适用于定时任务和 CI")
+    parser.add_argument('--url', help="GitLab URL (默认: 配置文件中的 GITLAB_URL)")
+    parser.add_argument('--token-env', default='GITLAB_TOKEN', metavar='NAME',
+                        help="保存访问令牌的环境变量名 (默认: GITLAB_TOKEN，未设置时使用配置文件中的令牌)")
+    parser.add_argument('--start-date', help="开始日期 YYYY-MM-DD")
+    parser.add_argument('--end-date', help="结束日期 YYYY-MM-DD")
+    parser.add_argument('--repos', help="仓库路径，用逗号分隔")
+    parser.add_argument('--groups', help="组路径，用逗号分隔；统计组及其子组下在开始日期之后有活动的所有项目")
+    parser.add_argument('--users', help="用户姓名，用逗号分隔")
+    parser.add_argument('--no-fuzzy-match', dest='fuzzy_match', action='store_false', default=None,
+                        help="关闭用户名模糊匹配")
+    parser.add_argument('--max-branches', type=int, help="每个仓库分析的最大活跃分支数")
+    parser.add_argument('--output', help="输出Excel文件名")
+    parser.add_argument('--scale-factor', type=float, help="数据缩放因子 (正数乘以，负数除以)")
+    parser.add_argument('--max-concurrency', type=int, help="最大并发请求数")
+    parser.add_argument('--list-projects', action='store_true',
+                        default=None,
+                        help="统计前列出所有可用仓库 (使用本地仓库索引)")
+    parser.add_argument('--allow-missing', action='store_true',
+                        help="非交互模式下跳过无法解析的仓库，而不是终止统计")
+    parser.add_argument('--backend', choices=('api', 'git'),
+                        help="统计后端: api 通过 REST API 获取提交; git 将仓库拉取到本地缓存后解析 git log --numstat (默认: api)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="不读取也不写入本地提交缓存")
+    parser.add_argument('--clear-cache', action='store_true',
+                        help="运行前清空本地提交缓存")
+    parser.add_argument('--incremental', action='store_true',
+                        default=None,
+                        help="增量模式: 仅获取上次运行之后的新提交，其余提交从缓存读取")
+    parser.add_argument('--time-bucket', choices=tuple(TIME_BUCKETS),
+                        help="按日/周/月额外输出每个用户和每个仓库的分时段统计表")
+    parser.add_argument('--repo-pivot', action='store_true',
+                        default=None,
+                        help="额外输出用户 x 仓库的变更行数透视表")
+    parser.add_argument('--excel-engine', choices=EXCEL_ENGINES,
+                        help="Excel 写入方式: pandas 或 streaming (openpyxl 只写模式，逐行写入，不为每个单元格创建对象) (默认: pandas)")
+    parser.add_argument('--file-stats', action='store_true',
+                        default=None,
+                        help="按文件统计: 获取提交的 diff，按路径汇总变更行数，并应用 --include/--exclude 过滤")
+    parser.add_argument('--include', metavar='PATTERNS',
+                        help="只统计匹配这些 glob 模式的文件，用逗号分隔 (启用按文件统计)")
+    parser.add_argument('--exclude', metavar='PATTERNS',
+                        help="不统计匹配这些 glob 模式的文件，用逗号分隔，例如 'vendor/**,*.lock' (启用按文件统计)")
+    parser.add_argument('--max-commit-lines', type=int, metavar='N',
+                        help="变更行数 (增加+删除) 超过 N 的提交不计入统计，并在'超大提交'表中列出")
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help="将运行指标 (各阶段耗时、各 API 接口的请求数和延迟分布、缓存命中率) 以 JSON 格式写入该文件")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="使用 cProfile 运行并将性能分析数据写入该文件")
+    parser.add_argument('--checkpoint', action='store_true', default=None,
+                        help="统计过程中写入检查点，中断后可以使用 --resume 继续 (检查点记录每个提交，会占用磁盘空间并增加统计时间)")
+    parser.add_argument('--resume', action='store_true',
+                        help="从上次中断的运行的检查点继续，跳过已完成的仓库分支 (参数需与中断的运行相同，并继续写入检查点)")
+    parser.add_argument('--serve', action='store_true',
+                        help="服务模式: 统计一次后常驻内存，提供统计查询、报告下载和 GitLab 推送 Webhook 接口")
+    parser.add_argument('--host',
+                        help="服务模式的监听地址 (默认: 127.0.0.1)")
+    parser.add_argument('--port', type=int,
+                        help="服务模式的监听端口 (默认: 8080)")
+    parser.add_argument('--insecure-webhooks', action='store_true',
+                        help="服务模式: 未设置 WEBHOOK_SECRET 时也接受 Webhook 请求 (不校验 X-Gitlab-Token，仅用于受信任的网络)")
+    parser.add_argument('--identity-resolution', dest='identity_resolution', action='store_true',
+                        default=None,
+                        help="使用作者身份表按提交作者邮箱匹配用户 (每个用户查询一次 GitLab 账号，结果保存在缓存目录中；"
+                             "与 --no-cache 同时使用时无效)")
+    parser.add_argument('--no-identity-resolution', dest='identity_resolution', action='store_false',
+                        default=None,
+                        help="不使用作者身份表，只按作者姓名和配置的映射匹配用户 (覆盖配置文件中的 IDENTITY_RESOLUTION)")
+    parser.add_argument('--export-identities', metavar='FILE',
+                        help="将作者身份表 (邮箱 -> 用户及其来源) 导出为 CSV 文件供检查，然后退出")
+    parser.add_argument('--import-identities', metavar='FILE',
+                        help="将 CSV 文件中 source 为空或 manual 的行导入为人工确认的作者身份，然后退出")
+    parser.add_argument('--parquet-dir', metavar='DIR',
+                        help="同时将原始提交记录导出为按项目和月份分区的 Parquet 数据集 (需要 pyarrow)")
+    return parser.parse_args(argv)
+
+# Options whose default comes from the configuration file: dest -> (setting, default)
+_CONFIG_DEFAULTS = {
+    'list_projects': ('LIST_ALL_PROJECTS', False),
+    'backend': ('DEFAULT_BACKEND', 'api'),
+    'incremental': ('INCREMENTAL', False),
+    'time_bucket': ('DEFAULT_TIME_BUCKET', None),
+    'repo_pivot': ('REPO_PIVOT', False),
+    'excel_engine': ('EXCEL_ENGINE', 'pandas'),
+    'file_stats': ('FILE_STATS', False),
+    'max_commit_lines': ('MAX_COMMIT_LINES', None),
+    'metrics_file': ('METRICS_FILE', None),
+    'checkpoint': ('CHECKPOINT_ENABLED', False),
+    'host': ('SERVICE_HOST', '127.0.0.1'),
+    'port': ('SERVICE_PORT', 8080),
+    'identity_resolution': ('IDENTITY_RESOLUTION', False),
+    'parquet_dir': ('PARQUET_OUTPUT_DIR', None),
+}
+
+def apply_config_defaults(args):
+    """
+    Fill the options that were not given on the command line from the
+    active configuration
+
+    ``parse_args`` leaves these options at None so that it does not need
+    the configuration (``--help`` works without a config.py); call this
+    after ``load_config``.
+
+    Args:
+        args (argparse.Namespace): Options from ``parse_args``
+
+    Returns:
+        argparse.Namespace: The same options, completed
+    """
+    for dest, (setting, default) in _CONFIG_DEFAULTS.items():
+        if getattr(args, dest) is None:
+            setattr(args, dest, getattr(config, setting, default))
+    return args
+
+def get_batch_params(args):
+    """
+    Build the run parameters from command line options without prompting
+
+    Options that are not given fall back to the configuration file. The
+    access token is read from the environment variable named by
+    ``--token-env`` so it never appears in the process list.
+
+    Raises:
+        ValueError: If a parameter is missing or invalid
+    """
+    params = {
+        "gitlab_url": args.url or getattr(config, 'GITLAB_URL', None),
+        "gitlab_token": os.environ.get(args.token_env) or getattr(config, 'GITLAB_TOKEN', None),
+        "start_date": args.start_date or getattr(config, 'DEFAULT_START_DATE', "2023-01-01"),
+        "end_date": args.end_date or getattr(config, 'DEFAULT_END_DATE', "2023-12-31"),
+        "repo_paths": _split_list(args.repos if args.repos is not None else getattr(config, 'DEFAULT_REPOSITORIES', "")),
+        "group_paths": _split_list(args.groups if args.groups is not None else getattr(config, 'DEFAULT_GROUPS', "")),
+        "user_names": _split_list(args.users if args.users is not None else getattr(config, 'DEFAULT_USERS', "")),
+        "fuzzy_match": args.fuzzy_match if args.fuzzy_match is not None else getattr(config, 'DEFAULT_FUZZY_MATCH', True),
+        "max_branches": args.max_branches if args.max_branches is not None else getattr(config, 'DEFAULT_MAX_BRANCHES', 1),
+        "output_file": args.output or getattr(config, 'DEFAULT_OUTPUT_FILE', "gitlab_statistics.xlsx"),
+        "scale_factor": args.scale_factor if args.scale_factor is not None else getattr(config, 'SCALE_FACTOR', 1)
+    }
+    
+    if not params["gitlab_url"]:
+        raise ValueError("未指定 GitLab URL (--url 或配置文件中的 GITLAB_URL)")
+    for key in ("start_date", "end_date"):
+        try:
+            datetime.strptime(params[key], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"日期格式错误: {params[key]} (应为 YYYY-MM-DD)")
+    if not params["repo_paths"] and not params["group_paths"]:
+        raise ValueError("未指定仓库路径或组路径 (--repos/--groups 或配置文件中的 DEFAULT_REPOSITORIES/DEFAULT_GROUPS)")
+    if not params["user_names"]:
+        raise ValueError("未指定用户 (--users 或配置文件中的 DEFAULT_USERS)")
+    if params["max_branches"] < 1:
+        raise ValueError("--max-branches 必须大于 0")
+    if not params["gitlab_token"]:
+        raise ValueError(f"未找到访问令牌，请设置环境变量 {args.token_env}")
+    return params
+
+def create_diff_filter(args):
+    """
+    Build the diff filter from command line options and the configuration
+
+    Returns:
+        DiffFilter: The filter, or None if neither per-file statistics nor an
+        outlier threshold is requested
+    """
+    include = _split_list(args.include) if args.include is not None else list(getattr(config, 'FILE_INCLUDE_PATTERNS', []))
+    exclude = _split_list(args.exclude) if args.exclude is not None else list(getattr(config, 'FILE_EXCLUDE_PATTERNS', []))
+    per_file = bool(args.file_stats or include or exclude)
+    if not per_file and args.max_commit_lines is None:
+        return None
+    return DiffFilter(
+        FileFilter(include, exclude),
+        max_commit_lines=args.max_commit_lines,
+        per_file=per_file,
+        path_depth=getattr(config, 'PATH_DEPTH', 2),
+        batch_size=getattr(config, 'DIFF_FETCH_BATCH_SIZE', 50)
+    )
+
+def checkpoint_key(params, args, diff_filter=None):
+    """
+    Identify the parameters of a run for its scan checkpoint
+
+    The key is a hash of every parameter that affects the result, so
+    ``--resume`` only replays a checkpoint written by an interrupted run
+    with the same parameters.
+
+    Returns:
+        str: The key, or None if the run writes no checkpoint (neither
+        ``--checkpoint``, ``CHECKPOINT_ENABLED`` nor ``--resume``)
+    """
+    if not (args.checkpoint or args.resume):
+        return None
+    key_fields = {
+        "gitlab_url": params['gitlab_url'],
+        "start_date": params['start_date'],
+        "end_date": params['end_date'],
+        "repo_paths": params['repo_paths'],
+        "group_paths": params['group_paths'],
+        "user_names": params['user_names'],
+        "fuzzy_match": params['fuzzy_match'],
+        "max_branches": params['max_branches'],
+        "backend": args.backend,
+        # Replayed units are not written to the Parquet dataset again
+        "parquet_dir": os.path.abspath(args.parquet_dir) if args.parquet_dir else None,
+        "name_mappings": getattr(config, 'USER_NAME_MAPPINGS', {}),
+        "email_mappings": getattr(config, 'USER_EMAIL_MAPPINGS', {}),
+        "diff_filter": None if diff_filter is None else [
+            diff_filter.file_filter.include, diff_filter.file_filter.exclude,
+            diff_filter.max_commit_lines, diff_filter.per_file, diff_filter.path_depth
+        ],
+    }
+    return hashlib.sha256(json.dumps(key_fields, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def open_checkpoint(key, resume=False):
+    """Open the scan checkpoint with the given key in the cache directory"""
+    path = os.path.join(get_cache_dir(), 'checkpoints', f"{key[:16]}.jsonl")
+    return ScanCheckpoint(path, key, resume=resume)
+
+def get_scan_instances(params, args):
+    """
+    Build the list of GitLab instances to scan and their token pools
+
+    The main instance (``--url``) scans the requested repositories and
+    groups with the run's token plus the extra tokens from the environment
+    variable named by ``--token-env`` with an ``S`` appended (comma
+    separated, e.g. ``GITLAB_TOKENS``) or ``GITLAB_TOKENS`` in the
+    configuration. Federated instances come from ``GITLAB_INSTANCES``; their
+    repository paths are prefixed with the instance name in the report.
+
+    Returns:
+        list: Dicts with ``url``, ``prefix``, ``tokens``, ``repo_paths`` and
+        ``group_paths``
+
+    Raises:
+        ValueError: If an instance has no URL or no token
+    """
+    pool = _split_list(os.environ.get(f"{args.token_env}S", ""))
+    if not pool:
+        pool = list(getattr(config, 'GITLAB_TOKENS', []))
+    tokens = list(dict.fromkeys([params['gitlab_token']] + pool))
+    instances = [{
+        "url": params['gitlab_url'],
+        "prefix": "",
+        "tokens": tokens,
+        "repo_paths": params['repo_paths'],
+        "group_paths": params['group_paths'],
+    }]
+    for entry in getattr(config, 'GITLAB_INSTANCES', []):
+        url = entry.get("url")
+        name = entry.get("name") or urllib.parse.urlsplit(url or "").hostname
+        tokens = list(entry.get("tokens", []))
+        if entry.get("token_env"):
+            tokens = _split_list(os.environ.get(entry["token_env"], "")) or tokens
+        if not url or not tokens:
+            raise ValueError(f"GITLAB_INSTANCES 中的实例 {name or url} 缺少 url 或访问令牌")
+        repo_paths = entry.get("repositories", [])
+        group_paths = entry.get("groups", [])
+        instances.append({
+            "url": url,
+            "prefix": f"{name}:",
+            "tokens": list(dict.fromkeys(tokens)),
+            "repo_paths": _split_list(repo_paths) if isinstance(repo_paths, str) else list(repo_paths),
+            "group_paths": _split_list(group_paths) if isinstance(group_paths, str) else list(group_paths),
+        })
+    return instances
+
+def main(argv=None):
+    """
+    Run the tool
+
+    With ``--profile`` the run is executed under cProfile and the statistics
+    are dumped to the given file; with ``--metrics-file`` a JSON run summary
+    (phase timings, API latencies per endpoint, cache hit rates) is written,
+    also when the run fails.
+
+    Returns:
+        int: Process exit code - 0 on success, 1 if no data was exported
+        or the configuration is missing, 2 for invalid parameters or repositories that could not be resolved,
+        3 if the report was exported but some branches or commits could not
+        be fetched
+    """
+    args = parse_args(argv)
+    try:
+        # Batch runs can take every parameter from the command line and the
+        # environment, so they do not need a config.py
+        load_config(required=not (args.batch or args.import_identities or args.export_identities))
+    except ConfigError as e:
+        print(f"错误: {e}")
+        return 1
+    apply_config_defaults(args)
+    metrics = RunMetrics()
+    profiler = cProfile.Profile() if args.profile else None
+    exit_code = None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        exit_code = run(args, metrics)
+        return exit_code
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"性能分析数据已写入 {args.profile} (可使用 python -m pstats 查看)")
+        if args.metrics_file:
+            metrics.write(args.metrics_file, exit_code=exit_code)
+            print(f"运行指标已写入 {args.metrics_file}")
+
+def manage_identities(args):
+    """
+    Import reviewed identities and/or export the author identity table
+
+    Returns:
+        int: Process exit code - 0 on success, 2 if a file could not be read
+        or written
+    """
+    identity_store = IdentityStore()
+    try:
+        if args.import_identities:
+            count = identity_store.import_csv(args.import_identities)
+            print(f"已从 {args.import_identities} 导入 {count} 个人工确认的作者身份")
+        if args.export_identities:
+            count = identity_store.export_csv(args.export_identities)
+            print(f"已将 {count} 个作者身份导出到 {args.export_identities}")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"处理作者身份表时出错: {e}")
+        return 2
+    finally:
+        identity_store.close()
+    return 0
+
+def run(args, metrics):
+    """
+    Run one statistics job for parsed command line options
+
+    Args:
+        args (argparse.Namespace): Options from ``parse_args``
+        metrics (RunMetrics): Metrics collector of the run
+
+    Returns:
+        int: Process exit code, see ``main``
+    """
+    if args.clear_cache:
+        commit_cache = CommitCache()
+        commit_cache.clear()
+        commit_cache.close()
+        print(f"已清空提交缓存: {commit_cache.path}")
+    
+    if args.import_identities or args.export_identities:
+        return manage_identities(args)
+    
+    if args.batch:
+        try:
+            params = get_batch_params(args)
+        except ValueError as e:
+            print(f"参数错误: {e}")
+            return 2
+    else:
+        # Get user input
+        params = get_user_input()
+    
+    # Print summary of parameters
+    print("\n=== 统计参数 ===")
+    print(f"日期范围: {params['start_date']} 至 {params['end_date']}")
+    print(f"仓库: {', '.join(params['repo_paths'])}")
+    if params['group_paths']:
+        print(f"组: {', '.join(params['group_paths'])}")
+    print(f"用户: {', '.join(params['user_names'])}")
+    print(f"用户名模糊匹配: {'启用' if params['fuzzy_match'] else '禁用'}")
+    print(f"最大分支数: {params['max_branches']}")
+    print(f"数据缩放因子: {params['scale_factor']}")
+    if args.time_bucket:
+        print(f"分时段统计: {TIME_BUCKETS[args.time_bucket][1]}")
+    diff_filter = create_diff_filter(args)
+    if diff_filter is not None and diff_filter.per_file:
+        print("按文件统计: 启用")
+        if diff_filter.file_filter.include:
+            print(f"包含文件: {', '.join(diff_filter.file_filter.include)}")
+        if diff_filter.file_filter.exclude:
+            print(f"排除文件: {', '.join(diff_filter.file_filter.exclude)}")
+    if args.max_commit_lines is not None:
+        print(f"超大提交阈值: {args.max_commit_lines} 行")
+    
+    metrics.parameters = {
+        "start_date": params['start_date'],
+        "end_date": params['end_date'],
+        "repositories": len(params['repo_paths']),
+        "groups": len(params['group_paths']),
+        "users": len(params['user_names']),
+        "max_branches": params['max_branches'],
+        "backend": args.backend,
+        "incremental": args.incremental,
+        "use_cache": not args.no_cache,
+        "max_concurrency": args.max_concurrency or getattr(config, 'MAX_CONCURRENCY', 8),
+        "file_stats": bool(diff_filter is not None and diff_filter.per_file),
+    }
+    
+    if args.serve:
+        if args.backend != 'api':
+            print("参数错误: 服务模式只支持 API 后端")
+            return 2
+        webhook_secret = os.environ.get('GITLAB_WEBHOOK_SECRET') or getattr(config, 'WEBHOOK_SECRET', None)
+        if not webhook_secret:
+            if args.insecure_webhooks:
+                print("警告: 未设置 WEBHOOK_SECRET，Webhook 请求不校验 X-Gitlab-Token，任何能访问服务的人都可以触发统计更新")
+            else:
+                print("未设置 WEBHOOK_SECRET，将拒绝 Webhook 请求 (可使用 --insecure-webhooks 关闭校验)")
+        service = ReportService(
+            params,
+            max_concurrency=args.max_concurrency,
+            use_cache=not args.no_cache,
+            allow_missing=args.allow_missing,
+            diff_filter=diff_filter,
+            scale_factor=params['scale_factor'],
+            time_bucket=args.time_bucket,
+            repo_pivot=args.repo_pivot,
+            webhook_secret=webhook_secret,
+            insecure_webhooks=args.insecure_webhooks
+        )
+        if not service.load(metrics):
+            return 2
+        serve_reports(service, args.host, args.port)
+        return 0
+    
+    try:
+        instances = get_scan_instances(params, args)
+    except ValueError as e:
+        print(f"参数错误: {e}")
+        return 2
+    sharded = len(instances) > 1 or len(instances[0]["tokens"]) > 1
+    
+    raw_sink = None
+    if args.parquet_dir:
+        try:
+            raw_sink = ParquetSink(args.parquet_dir, getattr(config, 'PARQUET_CHUNK_SIZE', 50000))
+        except ImportError as e:
+            print(f"参数错误: {e}")
+            return 2
+        if sharded:
+            # Every shard process writes its own files
+            raw_sink = None
+    
+    key = checkpoint_key(params, args, diff_filter)
+    checkpoint = None
+    if key is not None and not sharded:
+        checkpoint = open_checkpoint(key, args.resume)
+        if checkpoint.resumed:
+            print(f"从检查点继续: 已完成 {checkpoint.completed_units} 个分支 ({checkpoint.path})")
+        elif args.resume:
+            print("未找到与本次参数相同的检查点，将从头开始统计")
+        if raw_sink is not None:
+            raw_sink.stage(key, checkpoint.parquet_files)
+    
+    # Get statistics
+    scan_errors = []
+    commit_table = CommitTable()
+    checkpoint_paths = []
+    if sharded:
+        options = {
+            "max_concurrency": args.max_concurrency,
+            "use_cache": not args.no_cache,
+            "incremental": args.incremental,
+            "allow_missing": args.allow_missing,
+            "list_projects": args.list_projects,
+            "backend": args.backend,
+            "parquet_dir": args.parquet_dir,
+            "parquet_chunk_size": getattr(config, 'PARQUET_CHUNK_SIZE', 50000),
+            "checkpoint_key": key,
+            "resume": args.resume,
+            "resolve_identities": args.identity_resolution,
+        }
+        stats = scan_sharded(params, options, instances, scan_errors, commit_table, diff_filter, metrics,
+                             checkpoint_paths)
+        if args.parquet_dir:
+            print(f"原始提交记录已导出到 {args.parquet_dir} ({metrics.counters.get('parquet_rows', 0)} 行)")
+    else:
+        stats = get_commit_statistics(
+            params['gitlab_url'],
+            params['gitlab_token'],
+            params['repo_paths'],
+            params['user_names'],
+            params['start_date'],
+            params['end_date'],
+            params['fuzzy_match'],
+            params['max_branches'],
+            max_concurrency=args.max_concurrency,
+            use_cache=not args.no_cache,
+            incremental=args.incremental,
+            interactive=not args.batch,
+            allow_missing=args.allow_missing,
+            list_projects=args.list_projects,
+            backend=args.backend,
+            scan_errors=scan_errors,
+            commit_table=commit_table,
+            raw_sink=raw_sink,
+            diff_filter=diff_filter,
+            group_paths=params['group_paths'],
+            metrics=metrics,
+            checkpoint=checkpoint,
+            resolve_identities=args.identity_resolution
+        )
+        if checkpoint is not None:
+            checkpoint.close()
+            checkpoint_paths.append(checkpoint.path)
+    
+    if raw_sink is not None:
+        with metrics.phase("export"):
+            raw_sink.close()
+        metrics.count("parquet_rows", raw_sink.rows_written)
+        print(f"原始提交记录已导出到 {args.parquet_dir} ({raw_sink.rows_written} 行)")
+    
+    if stats is None:
+        return 2
+    
+    # Validate statistics
+    if validate_statistics(stats):
+        # Export to Excel
+        with metrics.phase("export"):
+            output_file = export_to_excel(stats, params['output_file'], params['scale_factor'], commit_table,
+                                          args.time_bucket, diff_filter, args.excel_engine, args.repo_pivot)
+        if output_file:
+            print(f"\n分析完成! 结果已保存到 {output_file}")
+            if scan_errors:
+                if checkpoint_paths:
+                    print("检查点已保留，可使用 --resume 重试获取失败的分支")
+                return 3
+            for path in checkpoint_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return 0
+    else:
+        print("\n未找到符合条件的提交数据，请检查参数是否正确。")
+    return 1
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
     except KeyboardInterrupt:
         print("\n程序已中断")
+        sys.exit(130)
     except Exception as e:
         print(f"\n程序执行出错: {e}")
+        sys.exit(1)
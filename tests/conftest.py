@@ -0,0 +1,60 @@
+"""
+Shared fixtures: the tool module with a test configuration, and the local
+fake GitLab from ``benchmarks/fake_gitlab.py``
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import gitlab_statistics  # noqa: E402
+from fake_gitlab import SyntheticDataset, start_server  # noqa: E402
+
+# The fake GitLab's commits are spread over 2024
+START_DATE = "2024-01-01"
+END_DATE = "2024-12-31"
+
+
+@pytest.fixture
+def gs(tmp_path, monkeypatch):
+    """gitlab_statistics with its own configuration, cache directory and working directory"""
+    monkeypatch.chdir(tmp_path)
+    settings = SimpleNamespace(
+        GITLAB_URL="http://127.0.0.1:9",
+        GITLAB_TOKEN="test-token",
+        CACHE_DIR=str(tmp_path / ".cache"),
+        USER_NAME_MAPPINGS={},
+        MAX_CONCURRENCY=4,
+        HTTP_BACKOFF_BASE=0.01,
+        HTTP_BACKOFF_MAX=0.05,
+    )
+    monkeypatch.setattr(gitlab_statistics, "config", settings)
+    return gitlab_statistics
+
+
+@pytest.fixture
+def fake_gitlab(gs):
+    """A fake GitLab with 2 projects of 2 branches each, configured as GITLAB_URL"""
+    dataset = SyntheticDataset(commits=400, projects=2, branches=2, authors=6)
+    server, url, stats = start_server(dataset)
+    gs.config.GITLAB_URL = url
+    yield SimpleNamespace(dataset=dataset, url=url, stats=stats)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def scan(gs, fake_gitlab):
+    """Run ``get_commit_statistics`` in batch mode against the fake GitLab"""
+    def run(**kwargs):
+        options = dict(max_branches=2, interactive=False, resolve_identities=False)
+        options.update(kwargs)
+        user_names = options.pop("user_names", fake_gitlab.dataset.tracked_users(3))
+        return gs.get_commit_statistics(fake_gitlab.url, "test-token", fake_gitlab.dataset.project_paths(),
+                                        user_names, START_DATE, END_DATE, **options)
+    return run
@@ -0,0 +1,66 @@
+"""Author matching precedence and the cached ``is_name_match`` wrapper"""
+
+
+def test_precedence(gs):
+    matcher = gs.AuthorMatcher(["张三", "Bob", "Alice"], name_mappings={"robert": "Alice"},
+                               email_mappings={"zs@corp.com": "张三"},
+                               identities={"bob@example.com": "Bob", "left@example.com": "Carol"},
+                               email_local_part=True)
+    # Identity table first, even over a name mapping
+    assert matcher.match("robert", "bob@example.com") == "Bob"
+    # An identity of an untracked user blocks every other rule
+    assert matcher.match("Alice", "left@example.com") is None
+    assert matcher.match("robert") == "Alice"
+    assert matcher.match("Bob", "nobody@example.com") == "Bob"
+    assert matcher.match("zhang", "ZS@corp.com") == "张三"
+    assert matcher.match("someone", "alice@example.com") == "Alice"
+    # Fuzzy: containment, then the first character of Chinese names
+    assert matcher.match("bob smith") == "Bob"
+    assert matcher.match("张小三") == "张三"
+    assert matcher.match("unknown") is None
+
+
+def test_fuzzy_match_can_be_disabled(gs):
+    matcher = gs.AuthorMatcher(["Bob"], fuzzy_match=False, name_mappings={})
+    assert matcher.match("bob smith") is None
+    assert matcher.match("Bob") == "Bob"
+
+
+def test_email_local_part_needs_identity_resolution(gs):
+    matcher = gs.AuthorMatcher(["Alice"], fuzzy_match=False, name_mappings={}, email_mappings={"a@corp.com": "Alice"})
+    assert matcher.match("someone", "alice@example.com") is None
+    # Configured email mappings always apply
+    assert matcher.match("someone", "A@corp.com") == "Alice"
+    matcher = gs.AuthorMatcher(["Alice"], fuzzy_match=False, name_mappings={}, email_local_part=True)
+    assert matcher.match("someone", "alice@example.com") == "Alice"
+
+
+def test_identity_matches_record_the_rule(gs):
+    matcher = gs.AuthorMatcher(["Bob"], name_mappings={})
+    matcher.match("bob smith", "Bob.Smith@example.com")
+    matcher.match("Bob", None)
+    assert matcher.identity_matches == {"bob.smith@example.com": ("bob smith", "Bob", "fuzzy")}
+    assert matcher.author_matches == {"bob smith": "Bob", "Bob": "Bob"}
+
+
+def test_is_name_match_reuses_the_matcher(gs, monkeypatch):
+    built = []
+    original = gs.AuthorMatcher
+
+    class CountingMatcher(original):
+        def __init__(self, *args, **kwargs):
+            built.append(args)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(gs, "AuthorMatcher", CountingMatcher)
+    monkeypatch.setattr(gs, "_name_matchers", {})
+    users = ["张三", "Bob"]
+    assert gs.is_name_match("bob smith", users) == (True, "Bob")
+    assert gs.is_name_match("张小三", users) == (True, "张三")
+    assert gs.is_name_match("bob smith", users, fuzzy_match=False) == (False, None)
+    assert len(built) == 2
+
+    # Another configuration brings its own name mappings
+    monkeypatch.setattr(gs, "config", type(gs.config)(USER_NAME_MAPPINGS={"robert": "Bob"}))
+    assert gs.is_name_match("robert", users) == (True, "Bob")
+    assert len(built) == 3
@@ -0,0 +1,95 @@
+"""Batch mode: choosing among project search results and run parameters from flags and the environment"""
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import END_DATE, START_DATE
+
+
+def project(path_with_namespace, name=None):
+    path = path_with_namespace.split("/")[-1]
+    return SimpleNamespace(path_with_namespace=path_with_namespace, path=path, name=name or path)
+
+
+def paths(projects):
+    return [p.path_with_namespace for p in projects]
+
+
+def test_exact_path_is_preferred(gs):
+    projects = [project("team/api-gateway"), project("team/api"), project("other/team/api")]
+    assert gs._pick_search_result("Team/API", projects).path_with_namespace == "team/api"
+    assert gs._pick_search_result("/team/api/", projects).path_with_namespace == "team/api"
+
+
+def test_unique_suffix_or_name_is_picked(gs):
+    projects = [project("a/backend/api"), project("b/frontend/api"), project("b/frontend/web", name="Web UI")]
+    assert gs._pick_search_result("backend/api", projects).path_with_namespace == "a/backend/api"
+    assert gs._pick_search_result("web ui", projects).path_with_namespace == "b/frontend/web"
+    # A single search result is taken even if its path differs
+    assert gs._pick_search_result("gateway", [project("x/api-gateway")]).path_with_namespace == "x/api-gateway"
+
+
+def test_ambiguous_matches_raise(gs):
+    projects = [project("a/backend/api"), project("b/backend/api")]
+    with pytest.raises(gs.ProjectResolutionError, match="2 个仓库"):
+        gs._pick_search_result("backend/api", projects)
+    # A tie on a closer rule is not broken by a looser one
+    with pytest.raises(gs.ProjectResolutionError):
+        gs._pick_search_result("api", projects + [project("c/api-docs", name="api")])
+    with pytest.raises(gs.ProjectResolutionError):
+        gs._pick_search_result("tools", [project("a/tooling"), project("b/toolbox")])
+
+
+def test_batch_scan_resolves_short_paths(gs, fake_gitlab):
+    scan_errors = []
+    stats = gs.get_commit_statistics(fake_gitlab.url, "test-token", ["project0002"], ["Developer 000"],
+                                     START_DATE, END_DATE, max_branches=1, interactive=False,
+                                     resolve_identities=False, scan_errors=scan_errors)
+    assert list(stats["Developer 000"]["repos"]) == ["bench/project0002"]
+    # "project000" matches both projects of the fake GitLab
+    assert gs.get_commit_statistics(fake_gitlab.url, "test-token", ["project000"], ["Developer 000"],
+                                    START_DATE, END_DATE, max_branches=1, interactive=False,
+                                    resolve_identities=False) is None
+
+
+def batch_args(gs, *argv):
+    return gs.apply_config_defaults(gs.parse_args(["--batch", *argv]))
+
+
+def test_token_is_read_from_the_named_variable(gs, monkeypatch):
+    monkeypatch.setenv("CI_GITLAB_TOKEN", "from-ci")
+    monkeypatch.setenv("GITLAB_TOKEN", "from-default")
+    args = batch_args(gs, "--url", "https://gitlab.example.com", "--repos", "g/a, g/b,", "--users", "Alice",
+                      "--token-env", "CI_GITLAB_TOKEN")
+    params = gs.get_batch_params(args)
+    assert params["gitlab_token"] == "from-ci"
+    assert params["repo_paths"] == ["g/a", "g/b"]
+
+    # Without the variable the configuration's token is used
+    monkeypatch.delenv("CI_GITLAB_TOKEN")
+    assert gs.get_batch_params(args)["gitlab_token"] == "test-token"
+    del gs.config.GITLAB_TOKEN
+    with pytest.raises(ValueError, match="CI_GITLAB_TOKEN"):
+        gs.get_batch_params(args)
+
+
+def test_extra_tokens_come_from_the_plural_variable(gs, monkeypatch):
+    monkeypatch.setenv("CI_GITLAB_TOKEN", "first")
+    monkeypatch.setenv("CI_GITLAB_TOKENS", "second, first,third")
+    args = batch_args(gs, "--repos", "g/a", "--users", "Alice", "--token-env", "CI_GITLAB_TOKEN")
+    instances = gs.get_scan_instances(gs.get_batch_params(args), args)
+    assert instances[0]["tokens"] == ["first", "second", "third"]
+
+
+def test_batch_params_are_validated(gs, monkeypatch):
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    with pytest.raises(ValueError, match="日期格式错误"):
+        gs.get_batch_params(batch_args(gs, "--repos", "g/a", "--users", "Alice", "--start-date", "2024/01/01"))
+    with pytest.raises(ValueError, match="DEFAULT_USERS"):
+        gs.get_batch_params(batch_args(gs, "--repos", "g/a"))
+    with pytest.raises(ValueError, match="--max-branches"):
+        gs.get_batch_params(batch_args(gs, "--repos", "g/a", "--users", "Alice", "--max-branches", "0"))
+    gs.config.DEFAULT_REPOSITORIES = "g/a,g/b"
+    gs.config.DEFAULT_USERS = "Alice"
+    params = gs.get_batch_params(batch_args(gs, "--users", "Bob"))
+    assert (params["repo_paths"], params["user_names"]) == (["g/a", "g/b"], ["Bob"])
@@ -0,0 +1,103 @@
+"""Active branch selection: early stop on sorted listings, the unsorted fallback and the branch cache"""
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+SINCE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class StubBranches:
+    """``project.branches`` answering from a fixed list; ``sorted_by_server`` honours sort=updated_desc"""
+
+    def __init__(self, branches, sorted_by_server=True):
+        self.branches = branches
+        self.sorted_by_server = sorted_by_server
+        self.calls = []
+
+    def list(self, sort=None, page=1, per_page=20, get_all=True, all=False):
+        if all:
+            self.calls.append("all")
+            return list(self.branches)
+        self.calls.append(page)
+        branches = self.branches
+        if sort == 'updated_desc' and self.sorted_by_server:
+            branches = sorted(branches, key=lambda branch: branch.commit["committed_date"], reverse=True)
+        return branches[(page - 1) * per_page:page * per_page]
+
+
+def project(days_ago, sorted_by_server=True):
+    """A project with one branch per entry of ``days_ago`` (days before 2024-07-01)"""
+    start = datetime(2024, 7, 1, tzinfo=timezone.utc)
+    branches = [SimpleNamespace(name=f"b{index:03d}",
+                                commit={"committed_date": (start - timedelta(days=days)).isoformat()})
+                for index, days in enumerate(days_ago)]
+    return SimpleNamespace(id=1, branches=StubBranches(branches, sorted_by_server))
+
+
+def names(branches):
+    return [branch.name for branch in branches]
+
+
+def test_sorted_listing_stops_at_max_branches(gs):
+    stub = project(range(250))
+    assert names(gs._list_active_branches(stub, 3, SINCE)) == ["b000", "b001", "b002"]
+    assert stub.branches.calls == [1]
+
+    stub = project(range(150))
+    assert len(gs._list_active_branches(stub, 120, SINCE)) == 120
+    assert stub.branches.calls == [1, 2]
+
+
+def test_branches_older_than_the_period_are_pruned(gs):
+    # Ten branches in the period, then 240 from before 2024
+    stub = project(list(range(10)) + list(range(400, 640)))
+    assert len(gs._list_active_branches(stub, 50, SINCE)) == 10
+    assert stub.branches.calls == [1]
+    assert len(gs._list_active_branches(project(range(400, 640)), 5, SINCE)) == 0
+
+
+def test_unsorted_server_falls_back_to_the_full_list(gs):
+    days = list(range(5)) + list(range(400, 405))
+    random.Random(1).shuffle(days)
+    stub = project(days, sorted_by_server=False)
+    selected = gs._list_active_branches(stub, 3, SINCE)
+    assert stub.branches.calls == [1, "all"]
+    assert [branch.commit["committed_date"][:10] for branch in selected] == ["2024-07-01", "2024-06-30", "2024-06-29"]
+    assert len(gs._list_active_branches(project(days, sorted_by_server=False), 10, SINCE)) == 5
+
+
+def test_order_is_checked_across_pages(gs):
+    # Each page is sorted, but the second page starts with a newer branch
+    stub = project(list(range(10, 110)) + [0, 1, 2], sorted_by_server=False)
+    selected = gs._list_active_branches(stub, 105, SINCE)
+    assert stub.branches.calls == [1, 2, "all"]
+    assert names(selected[:3]) == ["b100", "b101", "b102"]
+
+
+def test_selection_is_cached_for_the_ttl(gs, tmp_path, monkeypatch):
+    cache = gs.CommitCache(str(tmp_path / "commits.sqlite3"))
+    gs.config.BRANCH_CACHE_TTL = 600
+    stub = project(range(20))
+    first = gs._list_active_branches(stub, 3, SINCE, commit_cache=cache)
+    cached = gs._list_active_branches(stub, 3, SINCE, commit_cache=cache)
+    assert stub.branches.calls == [1]
+    assert names(cached) == names(first)
+    assert cached[0].commit == first[0].commit
+
+    # Another selection is cached separately
+    gs._list_active_branches(stub, 5, SINCE, commit_cache=cache)
+    assert stub.branches.calls == [1, 1]
+
+    # Expired after BRANCH_CACHE_TTL seconds
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 601)
+    gs._list_active_branches(stub, 3, SINCE, commit_cache=cache)
+    assert stub.branches.calls == [1, 1, 1]
+
+    # A TTL of 0 disables the cache
+    gs.config.BRANCH_CACHE_TTL = 0
+    gs._list_active_branches(stub, 3, SINCE, commit_cache=cache)
+    gs._list_active_branches(stub, 3, SINCE, commit_cache=cache)
+    assert stub.branches.calls == [1, 1, 1, 1, 1]
+    cache.close()
@@ -0,0 +1,125 @@
+"""Scan checkpoint journal and resuming an interrupted scan"""
+import sys
+
+import pytest
+
+
+def records(gs, start, count):
+    return [gs.CommitRecord(f"{index:040x}", "Alice", "alice@example.com", "2024-01-02T00:00:00Z", index, 0)
+            for index in range(start, start + count)]
+
+
+def test_completed_units_are_read_back_from_the_journal(gs, tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    checkpoint = gs.ScanCheckpoint(path, "key")
+    checkpoint.record_branches("group/alpha", ["main", "feature"])
+    unit_id = checkpoint.new_unit()
+    checkpoint.record_page(unit_id, records(gs, 0, 2), {"x": 1})
+    checkpoint.record_page(unit_id, records(gs, 2, 1))
+    checkpoint.record_unit("group/alpha", "main", unit_id)
+    # Pages of a unit that never completed
+    checkpoint.record_page(checkpoint.new_unit(), records(gs, 10, 3))
+    checkpoint.close()
+
+    resumed = gs.ScanCheckpoint(path, "key", resume=True)
+    assert resumed.resumed
+    assert resumed.branches("group/alpha") == ["main", "feature"]
+    assert resumed.has_unit("group/alpha", "main")
+    assert not resumed.has_unit("group/alpha", "feature")
+    assert resumed.completed_units == 1
+    # Only page offsets are held in memory
+    assert all(isinstance(offset, int) for offset in resumed._units[("group/alpha", "main")])
+    assert list(resumed.unit_pages("group/alpha", "main")) == [(records(gs, 0, 2), {"x": 1}),
+                                                               (records(gs, 2, 1), None)]
+    resumed.close()
+
+
+def test_torn_last_line_and_other_parameters(gs, tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    checkpoint = gs.ScanCheckpoint(path, "key")
+    unit_id = checkpoint.new_unit()
+    checkpoint.record_page(unit_id, records(gs, 0, 1))
+    checkpoint.record_unit("repo", "main", unit_id)
+    checkpoint.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "unit", "repo"')
+
+    resumed = gs.ScanCheckpoint(path, "key", resume=True)
+    assert resumed.completed_units == 1
+    resumed.close()
+    with open(path, encoding="utf-8") as f:
+        assert f.read().endswith("\n")
+
+    # A journal of other parameters is started over
+    other = gs.ScanCheckpoint(path, "other", resume=True)
+    assert not other.resumed
+    assert other.completed_units == 0
+    other.close()
+
+
+def read_dataset(path):
+    import pyarrow.dataset
+
+    return pyarrow.dataset.dataset(path, format="parquet", partitioning="hive").to_table().to_pandas()
+
+
+def test_resumed_scan_writes_each_parquet_row_once(scan, gs, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+
+    def run(parquet_dir, resume=False, interrupt_after=None):
+        checkpoint = gs.ScanCheckpoint(str(tmp_path / f"{parquet_dir}.jsonl"), "key", resume=resume)
+        sink = gs.ParquetSink(str(tmp_path / parquet_dir), chunk_size=7)
+        sink.stage(checkpoint.key, checkpoint.parquet_files)
+        if interrupt_after is not None:
+            finish = gs.BranchMerger.finish
+            merged = []
+
+            def interrupting(self):
+                finish(self)
+                merged.append(self.branch_name)
+                if len(merged) == interrupt_after:
+                    raise KeyboardInterrupt
+
+            monkeypatch.setattr(gs.BranchMerger, "finish", interrupting)
+            with pytest.raises(KeyboardInterrupt):
+                scan(checkpoint=checkpoint, raw_sink=sink)
+            monkeypatch.setattr(gs.BranchMerger, "finish", finish)
+            # The process dies: the sink is never closed
+            checkpoint.close()
+            return None
+        stats = scan(checkpoint=checkpoint, raw_sink=sink)
+        sink.close()
+        checkpoint.close()
+        return stats
+
+    expected_stats = run("full")
+    run("resumed", interrupt_after=3)
+    assert run("resumed", resume=True) == expected_stats
+
+    expected, actual = read_dataset(str(tmp_path / "full")), read_dataset(str(tmp_path / "resumed"))
+    key = ["sha", "project", "branch"]
+    assert not actual.duplicated(key).any()
+    assert sorted(map(tuple, actual[key].values)) == sorted(map(tuple, expected[key].values))
+    assert not list((tmp_path / "resumed").rglob("_pending-*"))
+
+
+def test_checkpoints_are_opt_in(gs, fake_gitlab, monkeypatch, tmp_path):
+    monkeypatch.setitem(sys.modules, "config", None)
+    monkeypatch.setenv("GITLAB_TOKEN", "test-token")
+    monkeypatch.delenv("GITLAB_TOKENS", raising=False)
+    opened = []
+    open_checkpoint = gs.open_checkpoint
+    monkeypatch.setattr(gs, "open_checkpoint", lambda *args: opened.append(args) or open_checkpoint(*args))
+    argv = ["--batch", "--url", fake_gitlab.url, "--start-date", "2024-01-01", "--end-date", "2024-12-31",
+            "--repos", ",".join(fake_gitlab.dataset.project_paths()), "--users", "Developer 000",
+            "--output", str(tmp_path / "report.xlsx")]
+
+    assert gs.main(argv) == 0
+    assert opened == []
+    assert not (tmp_path / ".cache" / "checkpoints").exists()
+
+    assert gs.main(argv + ["--checkpoint"]) == 0
+    assert gs.main(argv + ["--resume"]) == 0
+    assert [resume for _, resume in opened] == [False, True]
+    # Deleted after the successful runs
+    assert not list((tmp_path / ".cache" / "checkpoints").iterdir())
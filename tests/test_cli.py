@@ -0,0 +1,67 @@
+"""Command line parsing and the configuration file"""
+import os
+import subprocess
+import sys
+import types
+
+import pandas as pd
+import pytest
+
+from conftest import END_DATE, START_DATE
+
+
+@pytest.fixture
+def no_config(monkeypatch):
+    """Make ``import config`` fail as if there were no config.py"""
+    monkeypatch.setitem(sys.modules, "config", None)
+
+
+def test_help_without_config(gs, no_config, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        gs.main(["--help"])
+    assert exit_info.value.code == 0
+    assert "--batch" in capsys.readouterr().out
+
+
+def test_interactive_run_needs_config(gs, no_config, capsys):
+    assert gs.main([]) == 1
+    assert "config.py" in capsys.readouterr().out
+
+
+def test_batch_run_from_flags_and_environment(gs, no_config, fake_gitlab, monkeypatch, tmp_path):
+    monkeypatch.setenv("GITLAB_TOKEN", "test-token")
+    monkeypatch.delenv("GITLAB_TOKENS", raising=False)
+    output = tmp_path / "report.xlsx"
+    exit_code = gs.main(["--batch", "--url", fake_gitlab.url, "--start-date", START_DATE, "--end-date", END_DATE,
+                         "--repos", ",".join(fake_gitlab.dataset.project_paths()),
+                         "--users", ",".join(fake_gitlab.dataset.tracked_users(2)),
+                         "--max-branches", "1", "--output", str(output)])
+    assert exit_code == 0
+    assert len(pd.read_excel(output, sheet_name="用户汇总")) == 2
+
+
+def test_batch_run_without_url(gs, no_config, monkeypatch, capsys):
+    monkeypatch.setenv("GITLAB_TOKEN", "test-token")
+    assert gs.main(["--batch", "--repos", "group/project", "--users", "Alice"]) == 2
+    assert "GITLAB_URL" in capsys.readouterr().out
+
+
+def test_config_only_fills_options_not_given(gs):
+    settings = types.SimpleNamespace(GITLAB_URL="https://gitlab.example.com", GITLAB_TOKEN="token",
+                                     EXCEL_ENGINE="streaming", SERVICE_PORT=9000, INCREMENTAL=True)
+    gs.load_config(settings)
+    args = gs.apply_config_defaults(gs.parse_args(["--port", "8081", "--excel-engine", "pandas"]))
+    assert (args.port, args.excel_engine) == (8081, "pandas")
+    assert args.incremental is True
+    assert (args.backend, args.host, args.identity_resolution) == ("api", "127.0.0.1", False)
+
+
+def test_help_and_import_leave_heavy_modules_unloaded(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    check = ("import sys, gitlab_statistics\n"
+             "{}\n"
+             "print(sorted(name for name in ('requests', 'urllib3', 'pandas', 'numpy', 'gitlab') if name in sys.modules))")
+    for code in ("pass", "sys.argv[1:] = ['--help']\ntry:\n    gitlab_statistics.main()\nexcept SystemExit:\n    pass"):
+        result = subprocess.run([sys.executable, "-c", check.format(code)], cwd=str(tmp_path), capture_output=True,
+                                text=True, env=dict(os.environ, PYTHONPATH=root), check=True)
+        assert result.stdout.splitlines()[-1] == "[]"
@@ -0,0 +1,120 @@
+"""Commit cache round trips and cached/incremental scans against the fake GitLab"""
+from collections import Counter
+
+
+def record(gs, sha, date, additions=1, deletions=0, author="Alice"):
+    return gs.CommitRecord(sha, author, f"{author.lower()}@example.com", date, additions, deletions)
+
+
+def expected_totals(dataset, user_names, max_branches=2):
+    """Per-user commit totals computed from the synthetic data, each commit counted once per project"""
+    totals = Counter()
+    for project_id in range(1, dataset.projects + 1):
+        seen = set()
+        for name in dataset.branch_names(project_id)[:max_branches]:
+            for position in range(dataset.branch_length(project_id, name)):
+                commit = dataset.branch_commit(project_id, name, position)
+                if commit["id"] not in seen and commit["author_name"] in user_names:
+                    seen.add(commit["id"])
+                    totals[commit["author_name"]] += 1
+    return totals
+
+
+def totals(stats):
+    return {user: (user_stats["total_commits"], user_stats["total_additions"], user_stats["total_deletions"])
+            for user, user_stats in stats.items()}
+
+
+def test_commit_records_survive_reopening(gs, tmp_path):
+    path = str(tmp_path / "commits.sqlite3")
+    records = [record(gs, "a" * 40, "2024-01-02T00:00:00Z", 5, 1), record(gs, "b" * 40, "2024-01-03T00:00:00Z")]
+    cache = gs.CommitCache(path)
+    cache.put_many(7, records)
+    cache.close()
+
+    cache = gs.CommitCache(path)
+    found = cache.get_many(7, ["a" * 40, "b" * 40, "c" * 40])
+    assert found == {record.id: record for record in records}
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.get_many(8, ["a" * 40]) == {}
+    cache.close()
+
+
+def test_full_branch_scan_replaces_membership(gs, tmp_path):
+    cache = gs.CommitCache(str(tmp_path / "commits.sqlite3"))
+    old = [record(gs, "a" * 40, "2024-01-02T00:00:00Z"), record(gs, "b" * 40, "2024-01-03T00:00:00Z")]
+    new = [record(gs, "a" * 40, "2024-01-02T00:00:00Z"), record(gs, "c" * 40, "2024-01-04T00:00:00Z")]
+    cache.put_many(1, old + new)
+
+    cache.save_branch_scan(1, "main", "2024-01-01", old)
+    cache.save_branch_scan(1, "main", "2024-01-01", new)
+    assert sorted(r.id for r in cache.get_branch_records(1, "main")) == ["a" * 40, "c" * 40]
+    assert cache.get_watermark(1, "main") == {
+        "scanned_since": "2024-01-01", "last_committed_date": "2024-01-04T00:00:00Z", "last_sha": "c" * 40}
+    cache.close()
+
+
+def test_staged_branch_scan_is_atomic(gs, tmp_path):
+    cache = gs.CommitCache(str(tmp_path / "commits.sqlite3"))
+    first = [record(gs, "a" * 40, "2024-01-02T00:00:00Z")]
+    cache.put_many(1, first + [record(gs, "b" * 40, "2024-01-03T00:00:00Z")])
+    cache.save_branch_scan(1, "main", "2024-01-01", first)
+
+    # An abandoned scan leaves the stored branch untouched
+    scan_id = cache.begin_branch_scan()
+    cache.add_branch_scan(scan_id, [record(gs, "b" * 40, "2024-01-03T00:00:00Z")])
+    cache.discard_branch_scan(scan_id)
+    assert [r.id for r in cache.get_branch_records(1, "main")] == ["a" * 40]
+
+    scan_id = cache.begin_branch_scan()
+    cache.add_branch_scan(scan_id, [record(gs, "b" * 40, "2024-01-03T00:00:00Z")])
+    cache.finish_branch_scan(scan_id, 1, "main", "2024-01-01", "2024-01-03T00:00:00Z", "b" * 40)
+    assert [r.id for r in cache.get_branch_records(1, "main")] == ["b" * 40]
+    assert cache.get_watermark(1, "main")["last_sha"] == "b" * 40
+    cache.close()
+
+
+def test_branch_records_are_paged(gs, tmp_path):
+    cache = gs.CommitCache(str(tmp_path / "commits.sqlite3"))
+    records = [record(gs, f"{index:040x}", "2024-01-02T00:00:00Z") for index in range(25)]
+    cache.put_many(1, records)
+    cache.save_branch_scan(1, "main", "2024-01-01", records)
+    pages = list(cache.iter_branch_records(1, "main", page_size=10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [r for page in pages for r in page] == sorted(records)
+    cache.close()
+
+
+def test_scan_matches_the_repository(scan, fake_gitlab):
+    user_names = fake_gitlab.dataset.tracked_users(3)
+    stats = scan(user_names=user_names, fuzzy_match=False, use_cache=False)
+    expected = expected_totals(fake_gitlab.dataset, user_names)
+    assert {user: stats[user]["total_commits"] for user in user_names} == dict(expected)
+
+
+def test_cached_and_incremental_scans_match_a_cold_scan(scan, fake_gitlab):
+    cold = scan(fuzzy_match=False)
+    cold_requests = fake_gitlab.stats.count
+
+    warm = scan(fuzzy_match=False, incremental=True)
+    warm_requests = fake_gitlab.stats.count - cold_requests
+
+    assert totals(warm) == totals(cold)
+    assert warm == cold
+    # Only the newest page of each branch and the count checks are requested again
+    assert warm_requests < cold_requests
+
+
+def test_scan_errors_keep_cached_commits(scan, fake_gitlab, gs, monkeypatch):
+    cold = scan(fuzzy_match=False)
+
+    # Every commit newer than the high-water mark fails; the cached commits are still reported
+    def failing(project, branch_name, since, until, batch_size, commit_index, executor, errors):
+        errors.append("处理提交 0000000 时出错: boom")
+        return iter(())
+
+    monkeypatch.setattr(gs, "_iter_branch_records", failing)
+    scan_errors = []
+    warm = scan(fuzzy_match=False, incremental=True, scan_errors=scan_errors)
+    assert scan_errors
+    assert totals(warm) == totals(cold)
@@ -0,0 +1,105 @@
+"""Per-file statistics: glob filters, diff batching and caching, oversized commits"""
+
+
+def commit(gs, index, author="Alice", additions=10, deletions=2):
+    return gs.CommitRecord(f"{index:040x}", author, f"{author.lower()}@example.com", "2024-02-01T00:00:00Z",
+                           additions, deletions)
+
+
+def test_globs_match_across_directories(gs):
+    file_filter = gs.FileFilter(include=["src/*.py", "*.md"], exclude=["vendor/**", "*.lock", "src/gen/*"])
+    assert file_filter.matches("src/app/main.py")
+    assert file_filter.matches("docs/guide/index.md")
+    assert not file_filter.matches("src/gen/models.py")
+    assert not file_filter.matches("lib/main.py")
+    assert not gs.FileFilter(exclude=["*.lock"]).matches("deep/dir/Cargo.lock")
+    assert not gs.FileFilter(exclude=["vendor/**"]).matches("vendor/pkg/a/b.js")
+    assert gs.FileFilter(exclude=["vendor/**"]).matches("src/vendor.js")
+    assert gs.FileFilter().matches("anything/at/all")
+
+
+def test_prepare_loads_diffs_in_batches(gs):
+    requested = []
+
+    def load_files(commit_ids):
+        requested.append(list(commit_ids))
+        files = {commit_id: [("src/a.py", 6, 1), ("vendor/x.js", 4, 1)] for commit_id in commit_ids}
+        return files, []
+
+    diff_filter = gs.DiffFilter(gs.FileFilter(exclude=["vendor/**"]), batch_size=2, path_depth=1)
+    matcher = gs.AuthorMatcher(["Alice"], fuzzy_match=False, name_mappings={})
+    commits = [commit(gs, index) for index in range(5)] + [commit(gs, 9, author="Mallory")]
+    assert diff_filter.prepare("group/repo", commits, matcher, load_files) == []
+    # Only the tracked users' commits, at most batch_size per request
+    assert [len(batch) for batch in requested] == [2, 2, 1]
+
+    # Commits shared with another branch of the repository are not loaded again
+    diff_filter.prepare("group/repo", commits[:3] + [commit(gs, 5)], matcher, load_files)
+    assert requested[-1] == [commit(gs, 5).id]
+
+    adjusted = diff_filter.adjust(commits[0])
+    assert (adjusted.additions, adjusted.deletions) == (6, 1)
+    assert diff_filter.adjust(commits[-1]) is commits[-1]
+    diff_filter.record_paths("Alice", "group/repo", commits[0].id)
+    assert diff_filter.path_stats == {("Alice", "group/repo", "src"): [1, 6, 1]}
+
+
+def test_files_without_counts_share_the_rest_of_the_commit(gs):
+    diff_filter = gs.DiffFilter(gs.FileFilter(exclude=["*.lock"]))
+    matcher = gs.AuthorMatcher(["Alice"], fuzzy_match=False, name_mappings={})
+    big = commit(gs, 1, additions=103, deletions=0)
+    files = {big.id: [("src/a.py", 3, 0), ("yarn.lock", None, None), ("src/b.py", None, None)]}
+    diff_filter.prepare("repo", [big], matcher, lambda commit_ids: (files, []))
+    # 100 unknown lines over two files: 50 go to the excluded lock file
+    assert diff_filter.adjust(big).additions == 53
+
+
+def test_oversized_commits_are_left_out(gs):
+    diff_filter = gs.DiffFilter(max_commit_lines=100, per_file=False)
+    matcher = gs.AuthorMatcher(["Alice"], fuzzy_match=False, name_mappings={})
+    small, large = commit(gs, 1, additions=90, deletions=10), commit(gs, 2, additions=90, deletions=11)
+    diff_filter.prepare("repo", [small, large], matcher)
+    assert diff_filter.adjust(small) == small
+    assert diff_filter.adjust(large) is None
+    assert [outlier[1] for outlier in diff_filter.outliers] == [large.id]
+
+
+def test_scan_excludes_oversized_commits_from_the_totals(scan, gs, fake_gitlab):
+    users = fake_gitlab.dataset.tracked_users(3)
+    plain = scan(fuzzy_match=False)
+    diff_filter = gs.DiffFilter(max_commit_lines=1000, per_file=False)
+    filtered = scan(fuzzy_match=False, diff_filter=diff_filter)
+
+    # Every 97th commit of the fake dataset adds 5000 lines
+    assert diff_filter.outliers
+    assert all(outlier[5] + outlier[6] > 1000 for outlier in diff_filter.outliers)
+    for user in users:
+        outliers = [outlier for outlier in diff_filter.outliers if outlier[3] == user]
+        assert filtered[user]["total_commits"] == plain[user]["total_commits"] - len(outliers)
+        assert filtered[user]["total_additions"] == plain[user]["total_additions"] - sum(o[5] for o in outliers)
+
+
+def test_scan_caches_diffs(scan, gs, fake_gitlab, monkeypatch):
+    fetched = []
+    fetch_commit_files = gs.fetch_commit_files
+    monkeypatch.setattr(gs, "fetch_commit_files",
+                        lambda project, commit_id: fetched.append(commit_id) or fetch_commit_files(project, commit_id))
+
+    def per_file_scan():
+        diff_filter = gs.DiffFilter(gs.FileFilter(exclude=["vendor/**", "package-lock.json"]), batch_size=7)
+        return scan(fuzzy_match=False, diff_filter=diff_filter), diff_filter
+
+    plain = scan(fuzzy_match=False)
+    first, first_filter = per_file_scan()
+    assert fetched and len(fetched) == len(set(fetched))
+    # Only the large commits touch the excluded files
+    assert (sum(stats["total_additions"] for stats in first.values())
+            < sum(stats["total_additions"] for stats in plain.values()))
+    assert not any(path.startswith("vendor") for _, _, path in first_filter.path_stats)
+
+    # The second scan reads every diff from the commit cache
+    fetched.clear()
+    second, second_filter = per_file_scan()
+    assert fetched == []
+    assert second == first
+    assert second_filter.path_stats == first_filter.path_stats
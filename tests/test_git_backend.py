@@ -0,0 +1,134 @@
+"""Local clone backend (``--backend git``) against a repository created on the fly"""
+import os
+import subprocess
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+USERS = ["Alice", "Bob"]
+
+
+def git(repo, *args, date=None, author=("Alice", "alice@example.com")):
+    env = dict(os.environ, GIT_AUTHOR_NAME=author[0], GIT_AUTHOR_EMAIL=author[1],
+               GIT_COMMITTER_NAME=author[0], GIT_COMMITTER_EMAIL=author[1])
+    if date:
+        env.update(GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    subprocess.run(["git", "-C", str(repo)] + list(args), env=env, check=True, capture_output=True)
+
+
+def commit(repo, path, lines, message, date, author=("Alice", "alice@example.com")):
+    (repo / path).write_text("".join(f"{line}\n" for line in lines))
+    git(repo, "add", path)
+    git(repo, "commit", "-q", "-m", message, date=date, author=author)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """
+    main:    old (Alice, before the range) - c1 (Alice +3) - c2 (Bob +1 -1) - c3 (Alice +1 -3)
+    feature: branched at c1, then f1 (Bob +4)
+    """
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "main")
+    commit(repo, "old.txt", ["x"], "old", "2023-06-01T12:00:00+00:00")
+    commit(repo, "a.txt", ["1", "2", "3"], "c1", "2024-02-01T12:00:00+00:00")
+    git(repo, "checkout", "-q", "-b", "feature")
+    commit(repo, "b.txt", ["1", "2", "3", "4"], "f1", "2024-02-03T12:00:00+00:00", ("Bob", "bob@example.com"))
+    git(repo, "checkout", "-q", "main")
+    commit(repo, "a.txt", ["1", "2", "three"], "c2", "2024-02-05T12:00:00+00:00", ("Bob", "bob@example.com"))
+    commit(repo, "a.txt", ["four"], "c3", "2024-02-07T12:00:00+00:00")
+    return repo
+
+
+def scan_repo(gs, repo, **kwargs):
+    return gs.get_commit_statistics(gs.config.GITLAB_URL, "test-token", [str(repo)], USERS, "2024-01-01",
+                                    "2024-12-31", fuzzy_match=False, max_branches=5, use_cache=False, interactive=False,
+                                    backend="git", resolve_identities=False, **kwargs)
+
+
+def test_git_log_records(gs, repo):
+    records = list(gs.iter_git_log_records(str(repo / ".git"), "main", "2024-01-01T00:00:00+00:00",
+                                           "2024-12-31T23:59:59+00:00"))
+    assert [(record.author_name, record.additions, record.deletions) for record in records] == [
+        ("Alice", 1, 3), ("Bob", 1, 1), ("Alice", 3, 0)]
+    assert records[0].author_email == "alice@example.com"
+    assert records[0].committed_date.startswith("2024-02-07T12:00:00")
+
+
+def test_git_branch_pages(gs, repo):
+    pages = list(gs.iter_git_branch_pages(str(repo / ".git"), "main", "2024-01-01", "2024-12-31", page_size=2))
+    assert [len(page) for page in pages] == [2, 1]
+
+
+def test_statistics_from_local_repository(gs, repo):
+    stats = scan_repo(gs, repo)
+    repo_path = str(repo)
+
+    alice, bob = stats["Alice"], stats["Bob"]
+    # c1 is on both branches but counts once in the totals
+    assert (alice["total_commits"], alice["total_additions"], alice["total_deletions"]) == (2, 4, 3)
+    assert (bob["total_commits"], bob["total_additions"], bob["total_deletions"]) == (2, 5, 1)
+    assert alice["repos"][repo_path]["branches"]["main"]["commits"] == 2
+    assert alice["repos"][repo_path]["branches"]["feature"]["commits"] == 1
+    assert bob["repos"][repo_path]["branches"]["feature"] == {"commits": 1, "additions": 4, "deletions": 0}
+
+
+def test_git_commit_files(gs, repo):
+    git_dir = str(repo / ".git")
+    records = list(gs.iter_git_log_records(git_dir, "main", "2024-01-01", "2024-12-31"))
+    files, errors = gs.load_git_commit_files(git_dir, [record.id for record in records])
+    assert errors == []
+    for record in records:
+        assert sum(added for _, added, _ in files[record.id]) == record.additions
+        assert sum(deleted for _, _, deleted in files[record.id]) == record.deletions
+
+
+def test_mirror_repository_updates(gs, repo, tmp_path):
+    git_dir = str(tmp_path / "mirror.git")
+    gs.mirror_repository(str(repo), git_dir)
+    assert [branch.name for branch in gs.list_git_branches(git_dir, 5)] == ["main", "feature"]
+
+    commit(repo, "c.txt", ["new"], "c4", "2024-03-01T12:00:00+00:00")
+    gs.mirror_repository(str(repo), git_dir)
+    records = list(gs.iter_git_log_records(git_dir, "main", "2024-01-01", "2024-12-31"))
+    assert len(records) == 4
+
+
+@pytest.mark.parametrize("engine", ["pandas", "streaming"])
+def test_export_matches_statistics(gs, repo, tmp_path, engine):
+    commit_table = gs.CommitTable()
+    stats = scan_repo(gs, repo, commit_table=commit_table)
+    output = gs.export_to_excel(stats, str(tmp_path / f"{engine}.xlsx"), commit_table=commit_table,
+                                engine=engine)
+
+    sheets = pd.read_excel(output, sheet_name=None)
+    summary = sheets["用户汇总"].set_index("用户")
+    assert summary.loc["Alice", "总提交次数"] == 2
+    assert summary.loc["Bob", "总增加行数"] == 5
+    branches = sheets["分支详情"]
+    assert sorted(branches[branches["用户"] == "Bob"]["分支"]) == ["feature", "main"]
+
+
+def test_export_engines_write_the_same_sheets(gs, repo, tmp_path):
+    commit_table = gs.CommitTable()
+    stats = scan_repo(gs, repo, commit_table=commit_table)
+    outputs = [gs.export_to_excel(stats, str(tmp_path / f"{engine}.xlsx"), commit_table=commit_table,
+                                  time_bucket="week", engine=engine, repo_pivot=True)
+               for engine in ("pandas", "streaming")]
+
+    expected, actual = (pd.read_excel(output, sheet_name=None) for output in outputs)
+    assert list(expected) == list(actual)
+    for name in expected:
+        pd.testing.assert_frame_equal(expected[name], actual[name])
+
+
+def test_clones_of_different_instances_do_not_collide(gs, repo):
+    project = SimpleNamespace(path_with_namespace="group/repo", http_url_to_repo=str(repo))
+    first, branches = gs._prepare_git_repository(project, 5, "https://gitlab.example.com")
+    second, _ = gs._prepare_git_repository(project, 5, "http://gitlab.internal:8080/")
+    assert first != second
+    assert first.endswith(os.path.join("gitlab.example.com", "group", "repo.git"))
+    assert second.endswith(os.path.join("gitlab.internal_8080", "group", "repo.git"))
+    assert [branch.name for branch in branches] == ["main", "feature"]
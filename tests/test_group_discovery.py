@@ -0,0 +1,51 @@
+"""Listing the active projects of a group and its subgroups"""
+from datetime import datetime, timezone
+
+import pytest
+
+from fake_gitlab import SyntheticDataset, start_server
+
+
+@pytest.fixture
+def group_server(gs):
+    """2 active projects in ``bench`` and 150 dormant ones in its subgroup ``bench/archive``"""
+    server, url, stats = start_server(SyntheticDataset(commits=40, projects=2, dormant_projects=150))
+    gl = gs.gitlab.Gitlab(url, private_token="test-token", session=gs.create_gitlab_session(2))
+    yield gl, stats
+    server.shutdown()
+    server.server_close()
+
+
+def paths(projects):
+    return sorted(project.path_with_namespace for project in projects)
+
+
+def test_dormant_projects_are_pruned(gs, group_server):
+    gl, stats = group_server
+    requests_before = stats.count
+    projects, total = gs.discover_group_projects(gl, "bench", datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert paths(projects) == ["bench/project0001", "bench/project0002"]
+    assert total == 152
+    # The first page ends with dormant projects, so the second page is never requested
+    assert stats.count - requests_before == 1
+
+
+def test_subgroups_are_included(gs, group_server):
+    gl, _ = group_server
+    since = datetime(2019, 1, 1, tzinfo=timezone.utc)
+    projects, total = gs.discover_group_projects(gl, "bench", since)
+    assert total == len(projects) == 152
+    assert sum(project.path_with_namespace.startswith("bench/archive/") for project in projects) == 150
+    # Newest activity first
+    assert paths(projects[:2]) == ["bench/project0001", "bench/project0002"]
+    # Lazy project objects carry the index fields
+    assert projects[0].id in (1, 2)
+
+    projects, _ = gs.discover_group_projects(gl, "/bench/archive/", since)
+    assert len(projects) == 150
+
+
+def test_unknown_group(gs, group_server):
+    gl, _ = group_server
+    with pytest.raises(gs.ProjectResolutionError):
+        gs.discover_group_projects(gl, "nobody", datetime(2024, 1, 1, tzinfo=timezone.utc))
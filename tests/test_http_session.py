@@ -0,0 +1,159 @@
+"""RateLimitedSession retries, backoff and throttling against a local stub server"""
+import io
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+
+class StubServer:
+    """Answers with scripted (status, headers) responses, then 200"""
+
+    def __init__(self):
+        self.script = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                stub.requests.append((self.command, time.monotonic()))
+                status, headers = stub.script.pop(0) if stub.script else (200, {})
+                body = json.dumps({"status": status}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = respond
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v4/projects"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def session(gs):
+    session = gs.RateLimitedSession(pool_size=2, max_retries=3, backoff_base=0.01, backoff_max=0.05)
+    yield session
+    session.close()
+
+
+def test_retries_server_errors(stub, session):
+    stub.script = [(503, {}), (502, {})]
+    response = session.get(stub.url)
+    assert response.status_code == 200
+    assert session.retries == 2
+    assert len(stub.requests) == 3
+
+
+def test_honours_retry_after(stub, gs):
+    stub.script = [(429, {"Retry-After": "0.3"})]
+    with gs.RateLimitedSession(pool_size=2, max_retries=3, backoff_base=0.01, backoff_max=1.0) as session:
+        response = session.get(stub.url)
+    assert response.status_code == 200
+    (_, first), (_, second) = stub.requests
+    assert second - first >= 0.25
+
+
+def test_retry_after_is_capped_by_backoff_max(stub, session):
+    stub.script = [(429, {"Retry-After": "3600"}), (503, {"Retry-After": "120"})]
+    started = time.monotonic()
+    response = session.get(stub.url)
+    assert response.status_code == 200
+    assert session.retries == 2
+    assert time.monotonic() - started < 1
+
+
+def test_gives_up_after_max_retries(stub, session):
+    stub.script = [(500, {})] * 10
+    response = session.get(stub.url)
+    assert response.status_code == 500
+    assert len(stub.requests) == session.max_retries + 1
+
+
+def test_does_not_retry_post(stub, session):
+    stub.script = [(503, {})]
+    response = session.post(stub.url, data=b"{}")
+    assert response.status_code == 503
+    assert len(stub.requests) == 1
+    assert session.retries == 0
+
+
+def test_retries_connection_errors(session):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get(f"http://127.0.0.1:{port}/api/v4/projects")
+    assert session.retries == session.max_retries
+
+
+def test_waits_for_an_exhausted_rate_limit(stub, session):
+    reset = time.time() + 0.5
+    stub.script = [(200, {"RateLimit-Limit": "100", "RateLimit-Remaining": "0", "RateLimit-Reset": str(reset)})]
+    session.get(stub.url)
+    session.get(stub.url)
+    (_, first), (_, second) = stub.requests
+    assert second - first >= 0.3
+    assert session.throttled_seconds > 0
+
+
+def test_spreads_requests_when_the_budget_runs_low(stub, session):
+    headers = {"RateLimit-Limit": "100", "RateLimit-Remaining": "5", "RateLimit-Reset": str(time.time() + 1)}
+    stub.script = [(200, headers)]
+    for _ in range(3):
+        session.get(stub.url)
+    # About one second left for five requests: later requests are paced
+    times = [at for _, at in stub.requests]
+    assert times[2] - times[1] >= 0.1
+    assert session.throttled_seconds > 0
+
+
+def test_scan_survives_transient_errors(scan, fake_gitlab, gs, monkeypatch):
+    expected = scan(fuzzy_match=False, use_cache=False)
+
+    # Every third request fails with 502 before it reaches the fake GitLab
+    original = requests.Session.request
+    calls = []
+
+    def flaky(self, method, url, *args, **kwargs):
+        calls.append(url)
+        if len(calls) % 3 == 0:
+            response = requests.Response()
+            response.status_code = 502
+            response.url = url
+            response.raw = io.BytesIO(b"")
+            return response
+        return original(self, method, url, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "request", flaky)
+    scan_errors = []
+    assert scan(fuzzy_match=False, use_cache=False, scan_errors=scan_errors) == expected
+    assert scan_errors == []
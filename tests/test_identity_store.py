@@ -0,0 +1,53 @@
+"""Author resolution by email through the identity table and GitLab's user search"""
+from conftest import END_DATE, START_DATE
+
+
+def test_authors_are_resolved_by_email(scan, gs, fake_gitlab):
+    # The GitLab usernames match neither the author names nor their emails, only the accounts connect them
+    by_name = scan(fuzzy_match=False, user_names=fake_gitlab.dataset.tracked_users(2))
+    usernames = ["user000", "user001"]
+    assert scan(fuzzy_match=False, user_names=usernames)["user000"]["total_commits"] == 0
+
+    stats = scan(fuzzy_match=False, user_names=usernames, resolve_identities=True)
+    for username, name in zip(usernames, fake_gitlab.dataset.tracked_users(2)):
+        assert stats[username]["total_commits"] == by_name[name]["total_commits"] > 0
+        assert stats[username]["total_additions"] == by_name[name]["total_additions"]
+
+    store = gs.IdentityStore()
+    identities = store.resolved()
+    store.close()
+    assert identities["dev000@example.com"] == "user000"
+    assert identities["dev001@example.com"] == "user001"
+    assert "dev002@example.com" not in identities
+
+
+def test_user_search(fake_gitlab):
+    dataset = fake_gitlab.dataset
+    assert [user["username"] for user in dataset.search_users("dev001@")] == ["user001"]
+    assert [user["name"] for user in dataset.search_users("developer 00")] == dataset.tracked_users(6)
+
+
+def test_stores_are_closed_when_resolution_fails(gs, fake_gitlab, monkeypatch):
+    closed = []
+    for store_class in (gs.IdentityStore, gs.CommitCache):
+        def close(self, original=store_class.close):
+            closed.append(type(self).__name__)
+            original(self)
+        monkeypatch.setattr(store_class, "close", close)
+
+    stats = gs.get_commit_statistics(fake_gitlab.url, "test-token", ["bench/missing"], ["user000"], START_DATE,
+                                     END_DATE, interactive=False, resolve_identities=True)
+    assert stats is None
+    assert sorted(closed) == ["CommitCache", "IdentityStore"]
+
+
+def test_identity_resolution_is_opt_in(scan, gs, monkeypatch):
+    def no_store(self, *args, **kwargs):
+        raise AssertionError("the identity table is opened")
+
+    monkeypatch.setattr(gs.IdentityStore, "__init__", no_store)
+    # Off by default, and then authors do not match by their email's local part either
+    stats = scan(fuzzy_match=False, user_names=["dev000"], resolve_identities=None)
+    assert stats["dev000"]["total_commits"] == 0
+    # The table lives in the cache directory, so --no-cache turns it off
+    assert scan(fuzzy_match=False, user_names=["dev000"], resolve_identities=True, use_cache=False) is not None
@@ -0,0 +1,38 @@
+"""Project index built from the fake GitLab"""
+import os
+import threading
+
+
+def test_refresh_and_load(gs, fake_gitlab, tmp_path):
+    gl = gs.gitlab.Gitlab(fake_gitlab.url, private_token="test-token")
+    path = str(tmp_path / "projects.json")
+    index = gs.ProjectIndex(gl, fake_gitlab.url, path=path)
+    index.refresh()
+    assert [p.path_with_namespace for p in index.projects] == fake_gitlab.dataset.project_paths()
+
+    loaded = gs.ProjectIndex(gl, fake_gitlab.url, path=path)
+    assert loaded.load()
+    assert loaded.find("BENCH/project0002").id == 2
+    assert not gs.ProjectIndex(gl, "https://other.example.com", path=path).load()
+
+
+def test_concurrent_refreshes_use_their_own_temporary_files(gs, fake_gitlab, tmp_path):
+    path = str(tmp_path / "projects.json")
+    errors = []
+
+    def refresh():
+        try:
+            gl = gs.gitlab.Gitlab(fake_gitlab.url, private_token="test-token")
+            gs.ProjectIndex(gl, fake_gitlab.url, path=path).refresh()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=refresh) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    assert gs.ProjectIndex(None, fake_gitlab.url, path=path).load()
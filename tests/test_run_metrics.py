@@ -0,0 +1,94 @@
+"""Run metrics: phase timing, counters, endpoint latencies, merging shards and the metrics file"""
+import json
+import pickle
+from datetime import timedelta
+from types import SimpleNamespace
+
+
+def response(method, url, status=200, ms=30):
+    """The parts of a ``requests`` response the response hook reads"""
+    return SimpleNamespace(request=SimpleNamespace(method=method, url=url), status_code=status,
+                           elapsed=timedelta(milliseconds=ms))
+
+
+def test_counters_phases_and_endpoints_add_up(gs, monkeypatch):
+    metrics = gs.RunMetrics()
+    clock = iter([10.0, 10.5, 20.0, 20.25])
+    monkeypatch.setattr(gs.time, "perf_counter", lambda: next(clock))
+    with metrics.phase("fetch_commits"):
+        pass
+    with metrics.phase("fetch_commits"):
+        pass
+    monkeypatch.undo()
+    metrics.add_phase_time("merge", 0.125)
+    assert metrics.phases == {"fetch_commits": 0.75, "merge": 0.125}
+
+    metrics.count("branches", 3)
+    metrics.count("branches")
+    metrics.count("projects")
+    assert metrics.counters == {"branches": 4, "projects": 1}
+
+    base = "http://gitlab.example.com/api/v4"
+    metrics(response("GET", f"{base}/projects/bench%2Fone/repository/commits/{'a' * 40}", ms=30))
+    metrics(response("GET", f"{base}/projects/7/repository/commits/{'b' * 40}", status=429, ms=700))
+    metrics(response("GET", f"{base}/groups/bench/projects?page=2"))
+    endpoints = metrics.summary()["api"]["endpoints"]
+    assert list(endpoints) == ["GET /groups/:id/projects", "GET /projects/:id/repository/commits/:sha"]
+    commits = endpoints["GET /projects/:id/repository/commits/:sha"]
+    assert (commits["requests"], commits["errors"], commits["mean_ms"], commits["max_ms"]) == (2, 1, 365.0, 700.0)
+    assert commits["histogram"]["<=50ms"] == 1 and commits["histogram"]["<=1000ms"] == 1
+    assert sum(commits["histogram"].values()) == 2
+
+
+def test_merge_adds_shard_metrics(gs):
+    total = gs.RunMetrics()
+    total.count("shards", 2)
+    total.set_cache("commits", 5, 5)
+    for hits in (10, 30):
+        shard = gs.RunMetrics()
+        shard.add_phase_time("fetch_commits", 1.5)
+        shard.count("commits_scanned", 100)
+        shard.set_cache("commits", hits, 10)
+        shard(response("GET", "http://gitlab.example.com/api/v4/projects/1/repository/branches", ms=hits))
+        # Shards come back from worker processes pickled
+        total.merge(pickle.loads(pickle.dumps(shard)))
+
+    summary = total.summary()
+    assert summary["phases"] == {"fetch_commits": 3.0}
+    assert summary["counters"] == {"shards": 2, "commits_scanned": 200}
+    assert summary["caches"]["commits"] == {"hits": 45, "misses": 25, "hit_rate": round(45 / 70, 4)}
+    branches = summary["api"]["endpoints"]["GET /projects/:id/repository/branches"]
+    assert (branches["requests"], branches["mean_ms"], branches["max_ms"]) == (2, 20.0, 30.0)
+    assert summary["api"]["requests"] == 2
+
+
+def test_metrics_file_of_a_scan(scan, gs, fake_gitlab, tmp_path):
+    metrics = gs.RunMetrics()
+    metrics.parameters = {"max_branches": 2}
+    fake_gitlab.stats.count = 0
+    scan(fuzzy_match=False, metrics=metrics)
+    path = tmp_path / "out" / "metrics.json"
+    metrics.write(str(path), exit_code=0)
+    summary = json.loads(path.read_text(encoding="utf-8"))
+
+    assert list(summary) == ["started_at", "wall_seconds", "exit_code", "parameters", "phases", "counters", "api",
+                             "caches"]
+    assert summary["exit_code"] == 0 and summary["parameters"] == {"max_branches": 2}
+    assert {"connect", "resolve_projects", "list_branches", "fetch_commits", "merge"} <= set(summary["phases"])
+    assert summary["wall_seconds"] >= sum(summary["phases"].values()) - 0.01
+
+    dataset = fake_gitlab.dataset
+    counters = summary["counters"]
+    assert counters["projects"] == dataset.projects
+    assert counters["branches"] == dataset.projects * dataset.branches
+    assert counters["scan_errors"] == 0
+    # Commits are counted once per branch they are listed on
+    branch_length = dataset.commits_per_project // 2 + dataset.branch_commits
+    assert counters["commits_scanned"] == dataset.projects * (dataset.commits_per_project + branch_length)
+    # Every request the fake answered is counted once, under its endpoint
+    assert summary["api"]["requests"] == fake_gitlab.stats.count
+    assert summary["api"]["requests"] == sum(entry["requests"] for entry in summary["api"]["endpoints"].values())
+    for entry in summary["api"]["endpoints"].values():
+        assert sum(entry["histogram"].values()) == entry["requests"]
+    for values in summary["caches"].values():
+        assert set(values) == {"hits", "misses", "hit_rate"}
@@ -0,0 +1,30 @@
+"""Streaming branch pipeline: page hand-off between fetch workers and the merge"""
+import threading
+
+
+def test_failed_merge_releases_the_branch_worker(scan, gs, monkeypatch):
+    # One page of read-ahead: the worker blocks while it still has pages of the failed branch
+    gs.config.BRANCH_READ_AHEAD_PAGES = 1
+    add = gs.BranchMerger.add
+    failed = []
+
+    def failing_add(self, commits):
+        if not failed:
+            failed.append(self.branch_name)
+            raise OSError("disk full")
+        return add(self, commits)
+
+    monkeypatch.setattr(gs.BranchMerger, "add", failing_add)
+    result = {}
+
+    def run():
+        scan_errors = []
+        result["stats"] = scan(use_cache=False, scan_errors=scan_errors)
+        result["errors"] = scan_errors
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "the scan hangs on the worker of the failed branch"
+    assert result["stats"] is not None
+    assert len(result["errors"]) == 1 and "disk full" in result["errors"][0]
@@ -0,0 +1,127 @@
+"""Report service endpoints (/health, /stats, /webhook) against the fake GitLab"""
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from conftest import END_DATE, START_DATE
+
+
+@pytest.fixture
+def serve(gs, fake_gitlab):
+    """Start a loaded ReportService over HTTP; returns its base URL"""
+    servers = []
+
+    def start(**kwargs):
+        params = {
+            "gitlab_url": fake_gitlab.url,
+            "gitlab_token": "test-token",
+            "repo_paths": fake_gitlab.dataset.project_paths(),
+            "group_paths": [],
+            "user_names": fake_gitlab.dataset.tracked_users(3),
+            "start_date": START_DATE,
+            "end_date": END_DATE,
+            "fuzzy_match": False,
+            "max_branches": 1,
+        }
+        service = gs.ReportService(params, **kwargs)
+        assert service.load()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), gs._make_service_handler(service))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service))
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server, service in servers:
+        server.shutdown()
+        server.server_close()
+        service.executor.shutdown()
+        if service.commit_cache is not None:
+            service.commit_cache.close()
+
+
+def request(url, payload=None, token=None):
+    """Return (status, JSON body)"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, method="POST" if data is not None else "GET")
+    if token is not None:
+        req.add_header("X-Gitlab-Token", token)
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def push_event(project_path, branch):
+    return {"object_kind": "push", "ref": f"refs/heads/{branch}", "before": "0" * 40, "after": "1" * 40,
+            "project": {"path_with_namespace": project_path}}
+
+
+def test_health_and_stats(serve, fake_gitlab):
+    url = serve()
+    status, health = request(f"{url}/health")
+    assert status == 200
+    assert health["status"] == "ok"
+    assert health["repositories"] == 2
+
+    status, result = request(f"{url}/stats?group_by=repo")
+    assert status == 200
+    assert {row["repo"] for row in result["rows"]} == set(fake_gitlab.dataset.project_paths())
+    user = fake_gitlab.dataset.tracked_users(1)[0]
+    status, result = request(f"{url}/stats?users={user.replace(' ', '%20')}")
+    assert [row["user"] for row in result["rows"]] == [user]
+
+    status, result = request(f"{url}/stats?group_by=nothing")
+    assert status == 400
+
+
+def test_webhooks_are_rejected_without_a_secret(serve, fake_gitlab):
+    url = serve()
+    event = push_event(fake_gitlab.dataset.project_paths()[0], "feature-1")
+    status, result = request(f"{url}/webhook", event)
+    assert status == 403
+    assert request(f"{url}/health")[1]["events"] == 0
+
+
+def test_webhook_token_is_checked(serve, fake_gitlab):
+    url = serve(webhook_secret="s3cret")
+    event = push_event(fake_gitlab.dataset.project_paths()[0], "feature-1")
+    assert request(f"{url}/webhook", event)[0] == 401
+    assert request(f"{url}/webhook", event, token="wrong")[0] == 401
+
+    before = request(f"{url}/stats")[1]["totals"]
+    status, result = request(f"{url}/webhook", event, token="s3cret")
+    assert status == 200
+    # feature-1 was not selected by the scan (max_branches=1) and joins with all its commits
+    assert result["new_commits"] == fake_gitlab.dataset.branch_length(1, "feature-1")
+    after = request(f"{url}/stats")[1]["totals"]
+    assert after["commits"] > before["commits"]
+
+    # The same push again adds nothing
+    assert request(f"{url}/webhook", event, token="s3cret")[1]["new_commits"] == 0
+
+
+def test_insecure_webhooks(serve, fake_gitlab):
+    url = serve(insecure_webhooks=True)
+    status, result = request(f"{url}/webhook", push_event("unknown/project", "main"))
+    assert status == 200
+    assert result["status"] == "ignored"
+
+
+def test_unexpected_errors_return_json(serve, gs, monkeypatch):
+    url = serve()
+
+    def broken_query(self, **kwargs):
+        raise KeyError("repos")
+
+    monkeypatch.setattr(gs.ReportService, "query", broken_query)
+    status, result = request(f"{url}/stats")
+    assert status == 500
+    assert result == {"error": "'repos'"}
+    # The server keeps answering
+    assert request(f"{url}/health")[0] == 200
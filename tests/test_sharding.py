@@ -0,0 +1,96 @@
+"""Sharded scans: merging the partial results of worker processes"""
+from conftest import END_DATE, START_DATE
+
+
+def repo(commits, additions, deletions):
+    return {"commits": commits, "additions": additions, "deletions": deletions}
+
+
+def shard_result(gs, prefix, repos, errors=()):
+    """A ``_scan_shard`` result: ``repos`` maps repository -> user -> (commits, additions, deletions)"""
+    users = ["Alice", "Bob"]
+    stats = {user: {"total_commits": 0, "total_additions": 0, "total_deletions": 0, "repos": {}} for user in users}
+    commit_table = gs.CommitTable()
+    path_stats = {}
+    outliers = []
+    for repo_path, per_user in repos.items():
+        for user in users:
+            commits, additions, deletions = per_user.get(user, (0, 0, 0))
+            stats[user]["repos"][repo_path] = repo(commits, additions, deletions)
+            stats[user]["total_commits"] += commits
+            for index in range(commits):
+                record = gs.CommitRecord(f"{prefix}{repo_path}{user}{index}", user, "", "2024-02-01T00:00:00Z",
+                                         additions, deletions)
+                commit_table.append(record, user, repo_path, "main", 0, True)
+            if commits:
+                path_stats[(user, repo_path, "src")] = [commits, additions, deletions]
+        outliers.append((repo_path, "f" * 40, "2024-02-01T00:00:00Z", "Alice", "Alice", 9000, 0))
+    return {"prefix": prefix, "stats": stats, "scan_errors": list(errors), "commit_table": commit_table,
+            "path_stats": path_stats, "outliers": outliers, "metrics": gs.RunMetrics(), "checkpoint_path": None}
+
+
+def test_merge_combines_shards(gs):
+    results = [
+        shard_result(gs, "", {"g/one": {"Alice": (2, 20, 4), "Bob": (1, 5, 1)}}, errors=["g/gone: 404"]),
+        # g/one again on the same instance is skipped; on another instance it is a different repository
+        shard_result(gs, "", {"g/one": {"Alice": (7, 70, 7)}, "g/two": {"Bob": (3, 30, 3)}}),
+        shard_result(gs, "mirror/", {"g/one": {"Alice": (1, 10, 0)}}),
+    ]
+    commit_table = gs.CommitTable()
+    scan_errors = []
+    diff_filter = gs.DiffFilter()
+    stats = gs.merge_statistics(results, ["Alice", "Bob", "Carol"], commit_table, scan_errors, diff_filter)
+
+    assert list(stats["Alice"]["repos"]) == ["g/one", "g/two", "mirror/g/one"]
+    assert stats["Alice"]["repos"]["g/one"] == repo(2, 20, 4)
+    assert stats["Alice"]["repos"]["mirror/g/one"] == repo(1, 10, 0)
+    assert (stats["Alice"]["total_commits"], stats["Alice"]["total_additions"], stats["Alice"]["total_deletions"]) \
+        == (3, 30, 4)
+    assert (stats["Bob"]["total_commits"], stats["Bob"]["total_additions"]) == (4, 35)
+    assert stats["Carol"] == {"total_commits": 0, "total_additions": 0, "total_deletions": 0, "repos": {}}
+    assert scan_errors == ["g/gone: 404"]
+
+    frame = commit_table.to_frame()
+    assert len(frame) == 2 + 1 + 3 + 1
+    assert list(frame["repo"].cat.categories) == ["g/one", "g/two", "mirror/g/one"]
+    assert diff_filter.path_stats == {("Alice", "g/one", "src"): [2, 20, 4], ("Bob", "g/one", "src"): [1, 5, 1],
+                                      ("Bob", "g/two", "src"): [3, 30, 3],
+                                      ("Alice", "mirror/g/one", "src"): [1, 10, 0]}
+    assert [outlier[0] for outlier in diff_filter.outliers] == ["g/one", "g/two", "mirror/g/one"]
+
+
+def test_merge_prefixes_errors_and_skips_failed_shards(gs):
+    failed = shard_result(gs, "b/", {}, errors=["g/x: timeout"])
+    failed["stats"] = None
+    scan_errors = []
+    stats = gs.merge_statistics([shard_result(gs, "a/", {"g/x": {"Bob": (1, 1, 1)}}), failed], ["Alice", "Bob"],
+                                scan_errors=scan_errors)
+    assert list(stats["Bob"]["repos"]) == ["a/g/x"]
+    assert scan_errors == ["b/g/x: timeout"]
+
+
+def test_sharded_scan_matches_single_process(scan, gs, fake_gitlab):
+    users = fake_gitlab.dataset.tracked_users(3)
+    single_table = gs.CommitTable()
+    single = scan(use_cache=False, fuzzy_match=False, commit_table=single_table)
+
+    params = {"user_names": users, "start_date": START_DATE, "end_date": END_DATE, "fuzzy_match": False,
+              "max_branches": 2}
+    options = {"max_concurrency": 4, "use_cache": False, "incremental": False, "allow_missing": False,
+               "list_projects": False, "backend": "api", "parquet_dir": None, "parquet_chunk_size": 0,
+               "checkpoint_key": None, "resume": False, "resolve_identities": False}
+    instances = [{"url": fake_gitlab.url, "prefix": "", "tokens": ["token-1", "token-2"],
+                  "repo_paths": fake_gitlab.dataset.project_paths(), "group_paths": []}]
+    scan_errors = []
+    sharded_table = gs.CommitTable()
+    metrics = gs.RunMetrics()
+    sharded = gs.scan_sharded(params, options, instances, scan_errors, sharded_table, metrics=metrics)
+
+    assert scan_errors == []
+    assert sharded == single
+    assert metrics.counters["shards"] == 2
+    single_frames = gs.build_report_frames(single, commit_table=single_table)
+    sharded_frames = gs.build_report_frames(sharded, commit_table=sharded_table)
+    assert list(sharded_frames) == list(single_frames)
+    for name, frame in single_frames.items():
+        assert sharded_frames[name].equals(frame), name